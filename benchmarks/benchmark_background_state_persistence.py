@@ -0,0 +1,74 @@
+"""
+Benchmark durability against throughput when every task saves state to a SqliteStatePersistence.
+
+Each task saves its own object and a shared progress object. The state is persisted after every task, either
+synchronously, or through a BackgroundStatePersistence that waits for durability at every flush ("Flush") or only when
+the run completes ("EndOfRun"). Every combination is run with SQLite synchronous set to NORMAL and FULL.
+
+Usage:
+
+    python3 benchmarks/benchmark_background_state_persistence.py
+"""
+import sys
+import os
+import time
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from pytaskflow.models.Task import *
+
+
+class QuietLogger(LoggerWrapper):
+
+    def info(self, message: str):
+        pass
+
+
+class StatefulProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='Stateful', kind_versions=['v1'], supported_commands=['apply',], logger=QuietLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        state_persistence.save_object_state(object_identifier=task.task_id, data={'ResourcesCreated': True, 'Spec': task.spec})
+        state_persistence.save_object_state(object_identifier='progress', data={'LastTask': task.task_id})
+        return key_value_store
+
+
+def run(task_count: int, synchronous: str, mode: str):
+    logger = QuietLogger()
+    database_path = os.path.join(tempfile.mkdtemp(), 'state.db')
+    sqlite_state_persistence = SqliteStatePersistence(database_path=database_path, logger=logger, synchronous=synchronous)
+    state_persistence = sqlite_state_persistence
+    durability_barrier = 'EndOfRun'
+    if mode != 'Synchronous':
+        state_persistence = BackgroundStatePersistence(state_persistence=sqlite_state_persistence, logger=logger)
+        durability_barrier = mode
+    configuration = {'Executor': {'Mode': 'Serial', 'RecordTaskDurations': False}, 'StatePersistence': {'FlushPolicy': 'EveryTask', 'DurabilityBarrier': durability_barrier}}
+    tasks = Tasks(logger=logger, key_value_store=KeyValueStore(), hooks=Hooks(), state_persistence=state_persistence, configuration=configuration)
+    tasks.register_task_processor(processor=StatefulProcessor())
+    for i in range(0, task_count):
+        metadata = {'identifiers': [{'type': 'ManifestName', 'key': 'task-{}'.format(i)},]}
+        tasks.add_task(task=Task(kind='Stateful', version='v1', spec={'index': i}, metadata=metadata, logger=logger))
+    start = time.perf_counter()
+    tasks.process_context(command='apply', context='default')
+    elapsed = time.perf_counter() - start
+    if mode != 'Synchronous':
+        state_persistence.close()
+    sqlite_state_persistence.close()
+    print(
+        'tasks={:<6} synchronous={:<7} mode={:<12} elapsed={:8.3f}s throughput={:8.0f} tasks/s'.format(
+            task_count,
+            synchronous,
+            mode,
+            elapsed,
+            task_count / elapsed
+        )
+    )
+
+
+if __name__ == '__main__':
+    for synchronous in ('NORMAL', 'FULL'):
+        for mode in ('Synchronous', 'Flush', 'EndOfRun'):
+            run(task_count=2000, synchronous=synchronous, mode=mode)
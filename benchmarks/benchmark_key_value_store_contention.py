@@ -0,0 +1,74 @@
+"""
+Benchmark concurrent writes to the store, from 1 to 64 writer threads.
+
+Every thread saves its own keys and increments a shared counter with compare-and-set. A KeyValueStore guarded by one
+global lock is compared with a ShardedKeyValueStore, which only locks the shard holding the key. With the global
+interpreter lock, both are bounded by the interpreter itself, and the difference mostly shows on free-threaded builds
+or when writers hold the lock longer. The counter is verified, so lost updates are reported in any case.
+
+Usage:
+
+    python3 benchmarks/benchmark_key_value_store_contention.py
+"""
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from pytaskflow.models.Task import *
+
+
+class GlobalLockKeyValueStore(KeyValueStore):
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def save(self, key: str, value: object):
+        with self.lock:
+            self.store[key] = value
+
+    def compare_and_set(self, key: str, expected: object, value: object, expect_missing: bool=False)->bool:
+        with self.lock:
+            return super().compare_and_set(key=key, expected=expected, value=value, expect_missing=expect_missing)
+
+
+def writer(key_value_store: KeyValueStore, thread_number: int, writes: int):
+    for i in range(0, writes):
+        key_value_store.save(key='writer-{}:key-{}'.format(thread_number, i), value=i)
+        if i % 10 == 0:
+            while True:
+                current = key_value_store.store.get('counter', 0)
+                if key_value_store.compare_and_set(key='counter', expected=current, value=current + 1) is True:
+                    break
+
+
+def run(key_value_store: KeyValueStore, thread_count: int, total_writes: int)->float:
+    key_value_store.save(key='counter', value=0)
+    threads = [threading.Thread(target=writer, args=(key_value_store, thread_number, total_writes // thread_count)) for thread_number in range(0, thread_count)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    expected_count = thread_count * len(range(0, total_writes // thread_count, 10))
+    if key_value_store.store['counter'] != expected_count:
+        raise Exception('Lost updates: counter={} expected={}'.format(key_value_store.store['counter'], expected_count))
+    return elapsed
+
+
+if __name__ == '__main__':
+    total_writes = 128000
+    for thread_count in (1, 2, 4, 8, 16, 32, 64):
+        global_lock_seconds = run(key_value_store=GlobalLockKeyValueStore(), thread_count=thread_count, total_writes=total_writes)
+        sharded_seconds = run(key_value_store=ShardedKeyValueStore(), thread_count=thread_count, total_writes=total_writes)
+        print(
+            'threads={:<4} global_lock={:10.0f} writes/s sharded={:10.0f} writes/s'.format(
+                thread_count,
+                total_writes / global_lock_seconds,
+                total_writes / sharded_seconds
+            )
+        )
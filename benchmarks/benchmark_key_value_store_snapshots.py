@@ -0,0 +1,59 @@
+"""
+Benchmark taking a copy of the store, as done for every hook call and every task, with copy.deepcopy() of a plain dict
+against CopyOnWriteMapping.snapshot(), followed by a few writes and the delta of the changes.
+
+Usage:
+
+    python3 benchmarks/benchmark_key_value_store_snapshots.py
+"""
+import sys
+import os
+import time
+import copy
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from pytaskflow.models.Task import *
+
+
+def build_data(key_count: int)->dict:
+    data = dict()
+    for i in range(0, key_count):
+        data['Processor:Output:{}'.format(i)] = {'id': i, 'values': list(range(0, 10))}
+    return data
+
+
+def run_deepcopy(data: dict, iterations: int)->float:
+    start = time.perf_counter()
+    for i in range(0, iterations):
+        working_store = copy.deepcopy(data)
+        working_store['Processor:Output:{}'.format(i)] = i
+        working_store['New:{}'.format(i)] = True
+        build_key_value_store_delta(before=data, after=working_store)
+    return (time.perf_counter() - start) / iterations
+
+
+def run_snapshot(data: dict, iterations: int)->float:
+    mapping = CopyOnWriteMapping(data=data)
+    start = time.perf_counter()
+    for i in range(0, iterations):
+        working_store = mapping.snapshot()
+        working_store['Processor:Output:{}'.format(i)] = i
+        working_store['New:{}'.format(i)] = True
+        build_key_value_store_delta(before=mapping, after=working_store)
+    return (time.perf_counter() - start) / iterations
+
+
+if __name__ == '__main__':
+    for key_count, iterations in ((1000, 200), (10000, 20), (100000, 5)):
+        data = build_data(key_count=key_count)
+        deepcopy_seconds = run_deepcopy(data=data, iterations=iterations)
+        snapshot_seconds = run_snapshot(data=data, iterations=iterations * 10)
+        print(
+            'keys={:<8} deepcopy={:10.6f}s snapshot={:10.6f}s speedup={:8.1f}x'.format(
+                key_count,
+                deepcopy_seconds,
+                snapshot_seconds,
+                deepcopy_seconds / snapshot_seconds
+            )
+        )
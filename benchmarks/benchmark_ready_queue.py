@@ -0,0 +1,83 @@
+"""
+Benchmark the event driven ready queue against a wave barrier, on a layered graph with skewed task durations.
+
+Every task depends on two tasks of the previous layer. Most tasks sleep briefly, while a few stragglers sleep much
+longer. With a wave barrier, every layer waits for its slowest task, leaving workers idle. With the event driven ready
+queue, a task starts as soon as the two tasks it depends on have completed.
+
+Usage:
+
+    python3 benchmarks/benchmark_ready_queue.py
+"""
+import sys
+import os
+import time
+import random
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from pytaskflow.models.Task import *
+
+
+class QuietLogger(LoggerWrapper):
+
+    def info(self, message: str):
+        pass
+
+
+class SleepProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='Sleep', kind_versions=['v1'], supported_commands=['apply',], logger=QuietLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        time.sleep(task.spec['sleep'])
+        return key_value_store
+
+
+def build_tasks(layers: int, width: int, straggler_ratio: float, wave_barrier: bool, max_workers: int)->Tasks:
+    logger = QuietLogger()
+    configuration = {'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': max_workers, 'WaveBarrier': wave_barrier, 'RecordTaskDurations': False}}
+    tasks = Tasks(logger=logger, key_value_store=KeyValueStore(), hooks=Hooks(), state_persistence=StatePersistence(logger=logger), configuration=configuration)
+    tasks.register_task_processor(processor=SleepProcessor())
+    durations = random.Random(42)
+    for layer in range(0, layers):
+        for i in range(0, width):
+            metadata = {
+                'identifiers': [{'type': 'ManifestName', 'key': 'task-{}-{}'.format(layer, i)},],
+                'dependencies': list(),
+            }
+            if layer > 0:
+                metadata['dependencies'].append(
+                    {
+                        'identifierType': 'ManifestName',
+                        'identifiers': [{'key': 'task-{}-{}'.format(layer - 1, i)}, {'key': 'task-{}-{}'.format(layer - 1, (i + 1) % width)},]
+                    }
+                )
+            sleep = 0.005
+            if durations.random() < straggler_ratio:
+                sleep = 0.1
+            tasks.add_task(task=Task(kind='Sleep', version='v1', spec={'sleep': sleep}, metadata=metadata, logger=logger))
+    return tasks
+
+
+def run(layers: int, width: int, straggler_ratio: float, max_workers: int):
+    for wave_barrier in (True, False):
+        tasks = build_tasks(layers=layers, width=width, straggler_ratio=straggler_ratio, wave_barrier=wave_barrier, max_workers=max_workers)
+        tasks.process_context(command='apply', context='default')
+        print(
+            'layers={:<4} width={:<4} stragglers={:<5} workers={:<4} wave_barrier={:<6} elapsed={:8.3f}s utilization={:6.1%}'.format(
+                layers,
+                width,
+                straggler_ratio,
+                max_workers,
+                str(wave_barrier),
+                tasks.run_statistics['ElapsedSeconds'],
+                tasks.run_statistics['WorkerUtilization']
+            )
+        )
+
+
+if __name__ == '__main__':
+    for layers, width, straggler_ratio, max_workers in ((10, 8, 0.1, 8), (10, 32, 0.05, 8), (20, 16, 0.1, 16)):
+        run(layers=layers, width=width, straggler_ratio=straggler_ratio, max_workers=max_workers)
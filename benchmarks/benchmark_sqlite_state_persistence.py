@@ -0,0 +1,57 @@
+"""
+Benchmark SqliteStatePersistence with 10k, 100k and 1M objects.
+
+Every object is saved (written in batches of upserts), persisted, and then read back with a new instance, which reads
+every object lazily from the database.
+
+Usage:
+
+    python3 benchmarks/benchmark_sqlite_state_persistence.py
+"""
+import sys
+import os
+import time
+import random
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from pytaskflow.models.Task import *
+
+
+class QuietLogger(LoggerWrapper):
+
+    def info(self, message: str):
+        pass
+
+
+def run(object_count: int, batch_size: int):
+    database_path = os.path.join(tempfile.mkdtemp(), 'state.db')
+    state_persistence = SqliteStatePersistence(database_path=database_path, logger=QuietLogger(), batch_size=batch_size)
+    start = time.perf_counter()
+    for i in range(0, object_count):
+        state_persistence.save_object_state(object_identifier='object-{}'.format(i), data={'TaskChecksum': i, 'Durations': [0.1, 0.2, 0.3]})
+    state_persistence.close()
+    save_seconds = time.perf_counter() - start
+    state_persistence = SqliteStatePersistence(database_path=database_path, logger=QuietLogger(), batch_size=batch_size)
+    object_identifiers = ['object-{}'.format(i) for i in range(0, object_count)]
+    random.Random(42).shuffle(object_identifiers)
+    start = time.perf_counter()
+    for object_identifier in object_identifiers:
+        state_persistence.get_object_state(object_identifier=object_identifier)
+    get_seconds = time.perf_counter() - start
+    state_persistence.close()
+    print(
+        'objects={:<9} batch_size={:<6} save={:10.0f} objects/s get={:10.0f} objects/s database={:8.1f} MB'.format(
+            object_count,
+            batch_size,
+            object_count / save_seconds,
+            object_count / get_seconds,
+            os.path.getsize(database_path) / 1048576
+        )
+    )
+
+
+if __name__ == '__main__':
+    for object_count in (10000, 100000, 1000000):
+        run(object_count=object_count, batch_size=1000)
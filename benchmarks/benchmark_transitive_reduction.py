@@ -0,0 +1,87 @@
+"""
+Benchmark the planner on dense label fan-in graphs, with and without the transitive reduction pass.
+
+Every "app" task depends on the labels tier=db and tier=base, while every "db" task depends on tier=base. All the
+app -> base edges are therefore redundant. Each combination is also run with and without Label group nodes.
+
+Usage:
+
+    python3 benchmarks/benchmark_transitive_reduction.py
+"""
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
+
+from pytaskflow.models.Task import *
+
+
+class QuietLogger(LoggerWrapper):
+
+    def info(self, message: str):
+        pass
+
+
+class NoOpProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='NoOp', kind_versions=['v1'], supported_commands=['apply',], logger=QuietLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        return key_value_store
+
+
+def build_tasks(base_count: int, db_count: int, app_count: int, transitive_reduction: bool, label_group_nodes: bool)->Tasks:
+    logger = QuietLogger()
+    tasks = Tasks(logger=logger, key_value_store=KeyValueStore(), hooks=Hooks(), state_persistence=StatePersistence(logger=logger), configuration={'Planner': {'TransitiveReduction': transitive_reduction, 'LabelGroupNodes': label_group_nodes}})
+    tasks.register_task_processor(processor=NoOpProcessor())
+    layers = (
+        ('base', base_count, list()),
+        ('db', db_count, [{'key': 'tier', 'value': 'base'},]),
+        ('app', app_count, [{'key': 'tier', 'value': 'db'}, {'key': 'tier', 'value': 'base'},]),
+    )
+    for tier, count, label_dependencies in layers:
+        for i in range(0, count):
+            metadata = {
+                'identifiers': [
+                    {'type': 'ManifestName', 'key': '{}-{}'.format(tier, i)},
+                    {'type': 'Label', 'key': 'tier', 'value': tier},
+                ],
+                'dependencies': list(),
+            }
+            if len(label_dependencies) > 0:
+                metadata['dependencies'].append({'identifierType': 'Label', 'identifiers': label_dependencies})
+            tasks.add_task(task=Task(kind='NoOp', version='v1', spec={}, metadata=metadata, logger=logger))
+    return tasks
+
+
+def run(base_count: int, db_count: int, app_count: int):
+    for label_group_nodes in (False, True):
+        for transitive_reduction in (False, True):
+            tasks = build_tasks(base_count=base_count, db_count=db_count, app_count=app_count, transitive_reduction=transitive_reduction, label_group_nodes=label_group_nodes)
+            start = time.perf_counter()
+            graph = tasks.build_dependency_graph()
+            graph_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            for i in range(0, 10):
+                tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='apply', context='default'))
+            planning_seconds = (time.perf_counter() - start) / 10
+            print(
+                'base={:<5} db={:<5} app={:<5} groups={:<5} reduction={:<5} edges={:<8} removed={:<8} graph_build={:8.4f}s plan={:8.4f}s'.format(
+                    base_count,
+                    db_count,
+                    app_count,
+                    str(label_group_nodes),
+                    str(transitive_reduction),
+                    graph.edge_count(),
+                    graph.edges_removed_by_reduction,
+                    graph_seconds,
+                    planning_seconds
+                )
+            )
+
+
+if __name__ == '__main__':
+    for base_count, db_count, app_count in ((20, 50, 100), (50, 100, 300), (100, 300, 300)):
+        run(base_count=base_count, db_count=db_count, app_count=app_count)
@@ -1,8 +1,26 @@
+import os
+import sys
 import json
 import hashlib
+import time
 import copy
+import random
+import uuid
+import heapq
+import asyncio
+import inspect
+import functools
+import concurrent.futures
 from collections.abc import Sequence
 
+from pytaskflow.models.logger import LoggerWrapper
+from pytaskflow.models.key_value_store import CopyOnWriteMapping, ShardedMapping, SpilledBlobFile, SpilledValue, SpillingMemoryAccount, InMemoryValue, SpillingMapping, KeyValueStore, ShardedKeyValueStore, SpillingKeyValueStore, KeyValueStoreNamespace, KeyValueStoreDelta, merge_key_value_store_result, build_key_value_store_delta
+from pytaskflow.models.state_persistence import StatePersistence, SqliteStatePersistence, BackgroundStatePersistence, ProcessPoolWorkerStatePersistence
+from pytaskflow.models.executors import run_coroutine, run_steps, run_steps_async, wait_for_first_completed, wait_for_first_completed_async, shutdown_executor
+from pytaskflow.models.planner import parse_resource_quantity, TaskDependencyGraph, TaskReadyQueue, TaskWorkerSlots
+from pytaskflow.models.result_cache import TaskResultCache
+from pytaskflow.models.journal import build_task_run_journal_file_path, read_task_run_journal, TaskRunJournal, TaskRunHistory
+
 
 def keys_to_lower(data: dict):
     final_data = dict()
@@ -14,40 +32,6 @@ def keys_to_lower(data: dict):
     return final_data
 
 
-class KeyValueStore:
-
-    def __init__(self):
-        self.store = dict()
-
-    def save(self, key: str, value: object):
-        self.store[key] = value
-
-
-class LoggerWrapper:    # pragma: no cover
-
-    def __init__(self):
-        pass
-
-    def info(self, message: str):
-        if isinstance(message, str):
-            print(message)
-
-    def warn(self, message: str):
-        self.info(message=message)
-
-    def warning(self, message: str):
-        self.info(message=message)
-
-    def debug(self, message: str):
-        self.info(message=message)
-
-    def critical(self, message: str):
-        self.info(message=message)
-
-    def error(self, message: str):
-        self.info(message=message)
-
-
 class IdentifierContext:
 
     def __init__(self, context_type: str, context_name: str):
@@ -296,30 +280,6 @@ class Identifiers(Sequence):
         return len(self.identifiers)
 
 
-class StatePersistence:
-
-    def __init__(self, logger: LoggerWrapper=LoggerWrapper(), configuration: dict=dict()):
-        self.logger = logger
-        self.state_cache = self.retrieve_all_state_from_persistence()
-        self.configuration = configuration
-
-    def retrieve_all_state_from_persistence(self)->dict:
-        self.logger.warning(message='StatePersistence.retrieve_all_state_from_persistence() NOT IMPLEMENTED. Override this function in your own class for long term state storage.')
-        return dict()
-
-    def get_object_state(self, object_identifier: str)->dict:
-        if object_identifier in self.state_cache:
-            return copy.deepcopy(self.state_cache[object_identifier])
-        return dict()
-
-    def save_object_state(self, object_identifier: str, data: dict):
-        self.state_cache[object_identifier] = copy.deepcopy(data)
-
-    def persist_all_state(self):
-        self.logger.warning(message='StatePersistence.persist_all_state() NOT IMPLEMENTED. Override this function in your own class for long term state storage.')
-
-
-
 class TaskLifecycleStage:
     TASK_PRE_REGISTER                       = 1
     TASK_PRE_REGISTER_ERROR                 = -1
@@ -354,6 +314,29 @@ class TaskLifecycleStages:
         return False
 
 
+class TaskProcessingStatus:
+    """
+        Values of the "PROCESSING_TASK:<task_id>:<command>:<context>" keys in the KeyValueStore.
+    """
+    PENDING                                 = 1
+    DONE                                    = 2
+    UNCHANGED                               = 3
+    FAILED                                  = -1
+    SKIPPED                                 = -2    # Not processed, because a task it depends on failed, or after FailFast stopped the run
+    CANCELLED                               = -3    # Still in progress when FailFast stopped the run. Its result was discarded
+
+
+def describe_task_processing_exception(exception: BaseException)->dict:
+    """
+        Describes an exception raised by a task processor, for the "PROCESSING_TASK_ERROR:<task_id>:<command>:<context>"
+        key in the KeyValueStore. ExceptionTypes lists the names of the exception class and all its base classes.
+    """
+    return {
+        'ExceptionTypes': [exception_class.__name__ for exception_class in type(exception).__mro__],
+        'Message': str(exception),
+    }
+
+
 class Hook:
 
     def __init__(
@@ -365,6 +348,10 @@ class Hook:
             function_impl: object,  # callable object, like a function
             logger: LoggerWrapper=LoggerWrapper()
         ):
+        """
+            function_impl may return the KeyValueStore it was given (or a replacement), or only the changes it made as
+            a KeyValueStoreDelta. See merge_key_value_store_result().
+        """
         self.name = name
         self.logger = logger
         self.commands = commands
@@ -372,9 +359,16 @@ class Hook:
         self.task_life_cycle_stages = task_life_cycle_stages
         self.function_impl = function_impl
 
-    def process_hook(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters:dict=dict(), logger: LoggerWrapper=LoggerWrapper())->KeyValueStore:
+    def _process_hook_steps(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object, task_id: str, extra_parameters: dict, undo_on_failure: bool=True)->KeyValueStore:
+        """
+            The hook as a generator of steps (see run_steps()), shared by process_hook() and process_hook_async().
+            Hooks passes undo_on_failure=False, as it undoes the changes of all the hooks of the stage at once.
+        """
         if command not in self.commands or context not in self.contexts or self.task_life_cycle_stages.stage_registered(stage=task_life_cycle_stage) is False:
             return key_value_store
+        before = None
+        if undo_on_failure is True:
+            before = key_value_store.store.snapshot()
         try:
             self.logger.debug(
                 'Hook "{}" executed on stage "{}" for task "{}" for command "{}" in context "{}"'.format(
@@ -385,7 +379,8 @@ class Hook:
                     context
                 )
             )
-            result = self.function_impl(
+            result = yield functools.partial(
+                self.function_impl,
                 hook_name=self.name,
                 task=task,
                 key_value_store=key_value_store,
@@ -395,10 +390,10 @@ class Hook:
                 extra_parameters=extra_parameters,
                 logger=self.logger
             )
-            if result is not None:
-                if isinstance(result, KeyValueStore):
-                    key_value_store.store = copy.deepcopy(result.store)
+            key_value_store = merge_key_value_store_result(key_value_store=key_value_store, result=result)
         except:
+            if before is not None:
+                key_value_store.store = before      # Undo any change made by the failed hook function
             exception_message = 'Hook "{}" failed to execute during command "{}" in context "{}" in task life cycle stage "{}"'.format(
                 self.name,
                 command,
@@ -409,6 +404,16 @@ class Hook:
             raise Exception(exception_message)
         return key_value_store
 
+    def process_hook(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters:dict=dict(), logger: LoggerWrapper=LoggerWrapper())->KeyValueStore:
+        return run_steps(steps=self._process_hook_steps(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=key_value_store, task=task, task_id=task_id, extra_parameters=extra_parameters))
+
+    async def process_hook_async(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters:dict=dict(), logger: LoggerWrapper=LoggerWrapper())->KeyValueStore:
+        """
+            Same as process_hook(), but awaits function_impl when it is an async function. Plain functions run in the
+            default executor of the event loop.
+        """
+        return await run_steps_async(steps=self._process_hook_steps(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=key_value_store, task=task, task_id=task_id, extra_parameters=extra_parameters))
+
 
 class Hooks:
 
@@ -431,26 +436,39 @@ class Hooks:
                     if stage not in self.hooks[context][command][hook.name]:
                         self.hooks[context][command][hook.name].append(stage)
 
-    def process_hook(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters:dict=dict(), logger: LoggerWrapper=LoggerWrapper())->KeyValueStore:
-        if context in self.hooks:
-            if command in self.hooks[context]:
-                for hook_name, stages in self.hooks[context][command].items():
-                    if hook_name in self.hook_registrar and task_life_cycle_stage in stages:
-                        result = self.hook_registrar[hook_name].process_hook(
-                            command=command,
-                            context=context,
-                            task_life_cycle_stage=task_life_cycle_stage,
-                            key_value_store=key_value_store,
-                            task=task,
-                            task_id=task_id,
-                            extra_parameters=extra_parameters,
-                            logger=logger
-                        )
-                        if result is not None:
-                            if isinstance(result, KeyValueStore):
-                                key_value_store.store = copy.deepcopy(result.store)
+    def _process_hook_steps(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters: dict=dict())->KeyValueStore:
+        """
+            When a hook fails, the changes of all the hooks of the stage are undone, from one snapshot of the store
+            taken before the first of them.
+        """
+        if self.any_hook_exists(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage) is False:
+            return key_value_store
+        before = key_value_store.store.snapshot()
+        try:
+            for hook_name, stages in self.hooks[context][command].items():
+                if hook_name in self.hook_registrar and task_life_cycle_stage in stages:
+                    result = yield from self.hook_registrar[hook_name]._process_hook_steps(
+                        command=command,
+                        context=context,
+                        task_life_cycle_stage=task_life_cycle_stage,
+                        key_value_store=key_value_store,
+                        task=task,
+                        task_id=task_id,
+                        extra_parameters=extra_parameters,
+                        undo_on_failure=False
+                    )
+                    key_value_store = merge_key_value_store_result(key_value_store=key_value_store, result=result)
+        except:
+            key_value_store.store = before
+            raise
         return key_value_store
-    
+
+    def process_hook(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters:dict=dict(), logger: LoggerWrapper=LoggerWrapper())->KeyValueStore:
+        return run_steps(steps=self._process_hook_steps(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=key_value_store, task=task, task_id=task_id, extra_parameters=extra_parameters))
+
+    async def process_hook_async(self, command: str, context: str, task_life_cycle_stage: int, key_value_store: KeyValueStore, task: object=None, task_id: str=None, extra_parameters:dict=dict(), logger: LoggerWrapper=LoggerWrapper())->KeyValueStore:
+        return await run_steps_async(steps=self._process_hook_steps(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=key_value_store, task=task, task_id=task_id, extra_parameters=extra_parameters))
+
     def any_hook_exists(self, command: str, context: str, task_life_cycle_stage: int)->bool:
         if context in self.hooks:
             if command in self.hooks[context]:
@@ -587,6 +605,17 @@ class Task:
                     - key: STRING
                       value: STRING                         # Optional - required for identifierType "Label"
 
+                  resources:                                # Optional. Resources held while the task is processed concurrently
+                    STRING: NUMBER|STRING                   # Example: "api-x: 1" or "memory: 2G"
+                  timeoutSeconds: NUMBER                    # Optional. The task fails when it is not processed within this time by a concurrent executor
+                  retryPolicy:                              # Optional. Overrides the RetryPolicies configuration of Tasks for this kind. See TaskRetryPolicy
+                    maxAttempts: INTEGER
+                    backoffSeconds: NUMBER
+                    backoffMultiplier: NUMBER
+                    maxBackoffSeconds: NUMBER
+                    jitter: NUMBER
+                    retryableExceptions: LIST
+
 
                   # DEPRECATED...
                   name: STRING                                                                  # [optional]
@@ -613,12 +642,14 @@ class Task:
         self.kind = kind
         self.version = version
         self.metadata = dict()
+        self.original_metadata = dict()
         self.identifiers = build_contextual_identifiers(
             metadata=metadata,
             current_identifiers=build_non_contextual_identifiers(metadata=metadata)
         )
         if metadata is not None:
             if isinstance(metadata, dict):
+                self.original_metadata = copy.deepcopy(metadata)
                 self.metadata = keys_to_lower(data=metadata)
         self.spec = dict()
         if spec is not None:
@@ -629,6 +660,11 @@ class Task:
         self.task_as_dict = dict()
         self._register_annotations()
         self._register_dependencies()
+        self.resource_requirements = dict()
+        self._register_resource_requirements()
+        self.timeout_seconds = None
+        if 'timeoutseconds' in self.metadata:
+            self.timeout_seconds = float(self.metadata['timeoutseconds'])
         self.task_checksum = None
         self.task_id = self._determine_task_id()
         logger.info('Task "{}" registered. Task checksum: {}'.format(self.task_id, self.task_checksum))
@@ -787,6 +823,20 @@ class Task:
                                             )
                                         )
 
+    def _register_resource_requirements(self):
+        """
+              metadata:
+                resources:
+                  api-x: 1
+                  memory: 2G
+        """
+        if 'resources' not in self.metadata:
+            return
+        if isinstance(self.metadata['resources'], dict) is False:
+            return
+        for resource_name, quantity in self.metadata['resources'].items():
+            self.resource_requirements[resource_name] = parse_resource_quantity(value=quantity)
+
     def _calculate_task_checksum(self)->str:
         data = dict()
         data['kind'] = self.kind
@@ -829,13 +879,71 @@ class Task:
             yield (k, v)
 
 
+class TaskRetryPolicy:
+
+    def __init__(self, max_attempts: int=1, backoff_seconds: float=1.0, backoff_multiplier: float=2.0, max_backoff_seconds: float=60.0, jitter: float=0.1, retryable_exceptions: list=list()):
+        """
+            A failed task is processed again, up to max_attempts attempts in total, when its exception matches one of the
+            retryable_exceptions class names (any exception when none are given). The delay grows by backoff_multiplier per
+            attempt, up to max_backoff_seconds, minus a random jitter fraction.
+        """
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_multiplier = backoff_multiplier
+        self.max_backoff_seconds = max_backoff_seconds
+        self.jitter = jitter
+        self.retryable_exceptions = retryable_exceptions
+
+    def should_retry(self, attempt: int, error: dict)->bool:
+        """
+            attempt is the number of attempts made so far, and error is the description of the last failure (see
+            describe_task_processing_exception()).
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if len(self.retryable_exceptions) == 0:
+            return True
+        for exception_type in error.get('ExceptionTypes', list()):
+            if exception_type in self.retryable_exceptions:
+                return True
+        return False
+
+    def calculate_delay(self, attempt: int)->float:
+        delay = min(self.backoff_seconds * (self.backoff_multiplier ** (attempt - 1)), self.max_backoff_seconds)
+        return delay * (1.0 - self.jitter * random.random())
+
+
+def build_task_retry_policy(data: dict)->TaskRetryPolicy:
+    """
+        Builds a TaskRetryPolicy from a manifest "retryPolicy" or a RetryPolicies configuration entry. Keys are not case
+        sensitive.
+    """
+    data = keys_to_lower(data=data)
+    return TaskRetryPolicy(
+        max_attempts=int(data.get('maxattempts', 1)),
+        backoff_seconds=float(data.get('backoffseconds', 1.0)),
+        backoff_multiplier=float(data.get('backoffmultiplier', 2.0)),
+        max_backoff_seconds=float(data.get('maxbackoffseconds', 60.0)),
+        jitter=float(data.get('jitter', 0.1)),
+        retryable_exceptions=list(data.get('retryableexceptions', list()))
+    )
+
+
 class TaskProcessor:
 
-    def __init__(self, kind: str, kind_versions: list, supported_commands: list=['apply', 'get', 'delete', 'describe'], logger: LoggerWrapper=LoggerWrapper()):
+    def __init__(self, kind: str, kind_versions: list, supported_commands: list=['apply', 'get', 'delete', 'describe'], logger: LoggerWrapper=LoggerWrapper(), cacheable_commands: list=list(), processor_version: str='1'):
+        """
+            cacheable_commands lists the commands, typically read-only ones like "get" and "describe", for which the
+            changes this processor makes to the KeyValueStore depend only on the task and the context. Results of these
+            commands may be replayed from the TaskResultCache without calling process_task(). Change processor_version
+            whenever a change to the processor invalidates previously cached results.
+        """
         self.logger = logger
         self.kind = kind
         self.versions = kind_versions
         self.supported_commands = supported_commands
+        self.cacheable_commands = cacheable_commands
+        self.processor_version = processor_version
 
     def task_pre_processing_check(
         self,
@@ -849,6 +957,12 @@ class TaskProcessor:
         """
         Checks if the task can be run.
         """
+        return run_steps(steps=self._task_pre_processing_check_steps(task=task, command=command, context=context, key_value_store=key_value_store, call_process_task_if_check_pass=call_process_task_if_check_pass, state_persistence=state_persistence))
+
+    def _task_pre_processing_check_steps(self, task: Task, command: str, context: str, key_value_store: KeyValueStore, call_process_task_if_check_pass: bool, state_persistence: StatePersistence)->KeyValueStore:
+        """
+            task_pre_processing_check() as a generator of steps (see run_steps()), shared with AsyncTaskProcessor.
+        """
         task_run_id = 'PROCESSING_TASK:{}:{}:{}'.format(
             task.task_id,
             command,
@@ -859,17 +973,124 @@ class TaskProcessor:
         if key_value_store.store[task_run_id] == 1:
             try:
                 if call_process_task_if_check_pass is True:
-                    key_value_store = self.process_task(task=task, command=command, context=context, key_value_store=key_value_store, state_persistence=state_persistence)
+                    key_value_store = merge_key_value_store_result(
+                        key_value_store=key_value_store,
+                        result=(yield functools.partial(self.process_task, task=task, command=command, context=context, key_value_store=key_value_store, state_persistence=state_persistence))
+                    )
                     key_value_store.store[task_run_id] = 2
-            except: # pragma: no cover
+            except:
                 key_value_store.store[task_run_id] = -1
+                key_value_store.store['PROCESSING_TASK_ERROR:{}:{}:{}'.format(task.task_id, command, context)] = describe_task_processing_exception(exception=sys.exc_info()[1])
         else:
             self.logger.warning(message='Appears task was already previously validated and/or executed')
         return key_value_store
 
     def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        """
+            Override to process the task. Return the KeyValueStore, or only the changes made as a KeyValueStoreDelta
+            (see merge_key_value_store_result()).
+        """
+        raise Exception('Not implemented')  # pragma: no cover
+
+    def tasks_batch_pre_processing_check(
+        self,
+        tasks: list,
+        command: str,
+        context: str='default',
+        key_value_store: KeyValueStore=KeyValueStore(),
+        call_process_tasks_batch_if_check_pass: bool=False,
+        state_persistence: StatePersistence=StatePersistence()
+    )->KeyValueStore:
+        """
+        Checks which of the tasks can be run, and processes those with one call to process_tasks_batch(). When the
+        batch fails, every task in the batch is marked as failed.
+        """
+        tasks_to_process = list()
+        for task in tasks:
+            task_run_id = 'PROCESSING_TASK:{}:{}:{}'.format(
+                task.task_id,
+                command,
+                context
+            )
+            if task_run_id not in key_value_store.store:
+                key_value_store.save(key=task_run_id, value=1)
+            if key_value_store.store[task_run_id] == 1:
+                tasks_to_process.append(task)
+            else:
+                self.logger.warning(message='Appears task was already previously validated and/or executed')
+        if len(tasks_to_process) > 0 and call_process_tasks_batch_if_check_pass is True:
+            try:
+                key_value_store = merge_key_value_store_result(
+                    key_value_store=key_value_store,
+                    result=self.process_tasks_batch(tasks=tasks_to_process, command=command, context=context, key_value_store=key_value_store, state_persistence=state_persistence)
+                )
+                for task in tasks_to_process:
+                    key_value_store.store['PROCESSING_TASK:{}:{}:{}'.format(task.task_id, command, context)] = 2
+            except:
+                error = describe_task_processing_exception(exception=sys.exc_info()[1])
+                for task in tasks_to_process:
+                    key_value_store.store['PROCESSING_TASK:{}:{}:{}'.format(task.task_id, command, context)] = -1
+                    key_value_store.store['PROCESSING_TASK_ERROR:{}:{}:{}'.format(task.task_id, command, context)] = error
+        return key_value_store
+
+    def process_tasks_batch(self, tasks: list, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        """
+            Optional. Override to process several tasks of this kind and version in one go, for example with one bulk
+            API request or in one transaction. The tasks in a batch never depend on each other. Processors that do not
+            override this method are called with process_task() for every task.
+        """
+        for task in tasks:
+            key_value_store = merge_key_value_store_result(
+                key_value_store=key_value_store,
+                result=self.process_task(task=task, command=command, context=context, key_value_store=key_value_store, state_persistence=state_persistence)
+            )
+        return key_value_store
+
+    def supports_batch_processing(self)->bool:
+        return type(self).process_tasks_batch is not TaskProcessor.process_tasks_batch
+
+
+class AsyncTaskProcessor(TaskProcessor):
+
+    def __init__(self, kind: str, kind_versions: list, supported_commands: list=['apply', 'get', 'delete', 'describe'], logger: LoggerWrapper=LoggerWrapper(), cacheable_commands: list=list(), processor_version: str='1'):
+        """
+            Task processor for I/O bound work implemented with asyncio. Override the async process_task() method.
+            Tasks.process_context_async() awaits these processors directly on its event loop. The other execution modes
+            run them to completion on an event loop of their own (see run_coroutine()).
+        """
+        super().__init__(kind=kind, kind_versions=kind_versions, supported_commands=supported_commands, logger=logger, cacheable_commands=cacheable_commands, processor_version=processor_version)
+
+    async def task_pre_processing_check(
+        self,
+        task: Task,
+        command: str,
+        context: str='default',
+        key_value_store: KeyValueStore=KeyValueStore(),
+        call_process_task_if_check_pass: bool=False,
+        state_persistence: StatePersistence=StatePersistence()
+    )->KeyValueStore:
+        """
+        Checks if the task can be run.
+        """
+        return await run_steps_async(steps=self._task_pre_processing_check_steps(task=task, command=command, context=context, key_value_store=key_value_store, call_process_task_if_check_pass=call_process_task_if_check_pass, state_persistence=state_persistence))
+
+    async def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
         raise Exception('Not implemented')  # pragma: no cover
 
+    def supports_batch_processing(self)->bool:
+        return False
+
+
+def call_task_pre_processing_check(task_processor: TaskProcessor, task: Task, command: str, context: str, key_value_store: KeyValueStore, state_persistence: StatePersistence)->KeyValueStore:
+    """
+        Calls task_pre_processing_check() (and therefore process_task()) of any kind of task processor from synchronous
+        code.
+    """
+    result = task_processor.task_pre_processing_check(task=task, command=command, context=context, key_value_store=key_value_store, call_process_task_if_check_pass=True, state_persistence=state_persistence)
+    if inspect.iscoroutine(result) is True:
+        result = run_coroutine(result)
+    return result
+
 
 def hook_function_always_throw_exception(
     hook_name:str,
@@ -898,6 +1119,54 @@ def hook_function_always_throw_exception(
     raise Exception(exception_message)
 
 
+def build_task_processing_payload(task: Task)->dict:
+    """
+        A picklable description of a task, from which build_task_from_processing_payload() creates an equivalent Task
+        in another process.
+    """
+    payload = dict()
+    payload['TaskId'] = task.task_id
+    payload['Kind'] = task.kind
+    payload['Version'] = task.version
+    payload['Metadata'] = task.original_metadata
+    payload['Spec'] = task.spec
+    payload['Checksum'] = task.task_checksum
+    payload['Identifiers'] = task.identifiers.to_metadata_dict()
+    return payload
+
+
+def build_task_from_processing_payload(payload: dict, logger: LoggerWrapper=LoggerWrapper())->Task:
+    task = Task(kind=payload['Kind'], version=payload['Version'], spec=payload['Spec'], metadata=payload['Metadata'], logger=logger)
+    if task.task_checksum != payload['Checksum'] or task.task_id != payload['TaskId']:
+        raise Exception('Task "{}" could not be rebuilt from its processing payload - checksum mismatch'.format(payload['TaskId']))
+    if 'Identifiers' in payload and task.identifiers.to_metadata_dict() != payload['Identifiers']:
+        raise Exception('Task "{}" could not be rebuilt from its processing payload - identifiers mismatch'.format(payload['TaskId']))
+    return task
+
+
+_PROCESS_POOL_WORKER_TASK_PROCESSORS = dict()
+
+
+def _process_pool_worker_initializer(task_processor_register: dict, task_processors_executors: dict):
+    _PROCESS_POOL_WORKER_TASK_PROCESSORS.clear()
+    for processor_id, executor_id in task_processor_register.items():
+        if executor_id in task_processors_executors:
+            _PROCESS_POOL_WORKER_TASK_PROCESSORS[processor_id] = task_processors_executors[executor_id]
+
+
+def _process_pool_worker_process_task(payload: dict, command: str, context: str, base_store: CopyOnWriteMapping, object_states: dict)->tuple:
+    processor_id = '{}:{}'.format(payload['Kind'], payload['Version'])
+    if processor_id not in _PROCESS_POOL_WORKER_TASK_PROCESSORS:
+        raise Exception('No task processor registered in the worker process for "{}"'.format(processor_id))
+    task_processor = _PROCESS_POOL_WORKER_TASK_PROCESSORS[processor_id]
+    task = build_task_from_processing_payload(payload=payload, logger=task_processor.logger)
+    state_persistence = ProcessPoolWorkerStatePersistence(object_states=object_states, logger=task_processor.logger)
+    key_value_store = KeyValueStore()
+    key_value_store.store = base_store.snapshot()
+    key_value_store = call_task_pre_processing_check(task_processor=task_processor, task=task, command=command, context=context, key_value_store=key_value_store, state_persistence=state_persistence)
+    return (build_key_value_store_delta(before=base_store, after=key_value_store.store), state_persistence.saved_object_states)
+
+
 def build_command_identifier(command: str, context: str)->Identifier:
     processing_contexts = IdentifierContexts()
     processing_contexts.add_identifier_context(
@@ -920,6 +1189,10 @@ def build_command_identifier(command: str, context: str)->Identifier:
     return processing_target_identifier
 
 
+def build_task_result_cache_key(task: Task, task_processor: TaskProcessor, command: str, context: str)->str:
+    return hashlib.sha256('{}:{}:{}:{}:{}'.format(task.task_checksum, command, context, task_processor.kind, task_processor.processor_version).encode('utf-8')).hexdigest()
+
+
 class Tasks:
 
     """
@@ -935,9 +1208,56 @@ class Tasks:
         TASK_PROCESSING_PRE_START_ERROR         = -5
         TASK_PROCESSING_POST_DONE               = 6
         TASK_PROCESSING_POST_DONE_ERROR         = -6
+
+        Configuration (all optional):
+
+            Planner:
+              TransitiveReduction: BOOLEAN      # Remove redundant dependency edges from the cached dependency graph
+              LabelGroupNodes: BOOLEAN          # Default True. Label dependencies matching several tasks point at one virtual group node
+              ReverseOrderCommands: LIST        # Commands, like "delete", for which dependants are processed before their dependencies
+
+            Executor:
+              Mode: STRING                      # "Serial" (default), "ThreadPool" or "ProcessPool"
+              MaxWorkers: INTEGER               # Default 4. Maximum number of tasks processed at the same time, across all contexts of process_contexts()
+              MaxConcurrency: INTEGER           # Default 64. Maximum number of tasks in progress in process_context_async()
+              ResourceCapacities: DICT          # Example: {"api-x": 1, "memory": "8G"}. Limits concurrent tasks by their metadata.resources
+              RecordTaskDurations: BOOLEAN      # Default True. Keep the recent processing durations of every task in the state persistence
+              CriticalPathScheduling: BOOLEAN   # Default True. Start the ready tasks heading the longest remaining chain of work first
+              WaveBarrier: BOOLEAN              # Only start a wave of tasks once the whole previous wave completed. For comparison only
+              BatchSize: INTEGER                # Default 50. Maximum number of tasks passed to TaskProcessor.process_tasks_batch() at once
+              BatchLingerSeconds: FLOAT         # Default 0. How long the ThreadPool mode waits for more ready tasks to fill a batch
+              Incremental: BOOLEAN              # Skip tasks that, like everything they depend on, are unchanged since their last successful run
+              UnchangedTaskHooks: BOOLEAN       # Default True. Fire the lifecycle hooks for tasks skipped by the Incremental mode
+              IncrementalMaxOutputBytes: INTEGER  # Default 65536. Tasks whose store changes are larger, or not plain JSON data, are always processed
+              FailFast: BOOLEAN                 # Stop the run at the first failed task, cancel queued work and raise an exception
+              TaskTimeoutSeconds: FLOAT         # Default timeout of tasks without metadata.timeoutSeconds. Concurrent executors only
+
+            ResultCache:                        # Results of commands listed in TaskProcessor.cacheable_commands
+              Enabled: BOOLEAN                  # Default True
+              MaxMemoryEntries: INTEGER         # Default 1024
+              Directory: STRING                 # Also keep results on disk in this directory
+              MaxDiskEntries: INTEGER           # Default 10000
+
+            RetryPolicies:                      # Retry policies per task kind. A task manifest "retryPolicy" takes precedence
+              STRING:                           # The task kind
+                MaxAttempts: INTEGER            # See TaskRetryPolicy for all options
+
+            Journal:                            # Record completed tasks, so that an interrupted run can be resumed
+              Directory: STRING                 # The journal of every run is kept in <Directory>/<run_id>.journal
+              GroupCommitRecords: INTEGER       # Default 64. Write the journal after this number of records...
+              GroupCommitSeconds: FLOAT         # Default 0.5. ...or once the oldest unwritten record is this old
+              Fsync: BOOLEAN                    # Default True. Sync every journal write to disk
+
+            StatePersistence:
+              FlushPolicy: STRING               # When to call persist_all_state(): "EveryTask" (default), "Batched" or "EndOfRun"
+              FlushEveryTasks: INTEGER          # Default 100. Batched: persist after this number of tasks...
+              FlushIntervalSeconds: FLOAT       # Default 5. ...or once this time passed since the previous flush
+              DurabilityBarrier: STRING         # When to wait until the persisted state is durable, for a StatePersistence
+                                                # that commits in the background: "EndOfRun" (default) or "Flush", which
+                                                # also waits at every flush of the FlushPolicy
     """
 
-    def __init__(self, logger: LoggerWrapper=LoggerWrapper(), key_value_store: KeyValueStore=KeyValueStore(), hooks: Hooks=Hooks(), state_persistence: StatePersistence=StatePersistence()):
+    def __init__(self, logger: LoggerWrapper=LoggerWrapper(), key_value_store: KeyValueStore=KeyValueStore(), hooks: Hooks=Hooks(), state_persistence: StatePersistence=StatePersistence(), configuration: dict=dict()):
         self.logger = logger
         self.tasks = dict()
         self.task_processors_executors = dict()
@@ -945,9 +1265,42 @@ class Tasks:
         self.key_value_store = key_value_store
         self.hooks = hooks
         self.state_persistence = state_persistence
+        self.configuration = configuration
+        self.task_registration_sequence = dict()    # task_id -> order in which the task was added
+        self.task_name_index = dict()       # ManifestName key -> list of task_id
+        self.task_label_index = dict()      # (Label key, Label value) -> list of task_id
+        self.dependency_graph = None        # Cached graph of all registered tasks, reset when a task is added
+        self.task_run_history = TaskRunHistory(state_persistence=state_persistence)
+        self.task_upstream_digests = dict()     # task_id -> digest of everything the task depends on, for the current run
+        self.unchanged_task_ids = dict()        # Ordered set of the tasks skipped by the Incremental mode in the current run
+        self.task_output_deltas = dict()        # task_id -> KeyValueStoreDelta of the task processor, for the current Incremental run
+        self.run_statistics = dict()            # Statistics of the last run of a concurrent executor
+        self.failed_task_ids = dict()           # Ordered set of the tasks that failed in the current run
+        self.skipped_task_ids = dict()          # Ordered set of the tasks not processed in the current run because of a failure
+        self.run_id = None                      # Identifier of the current or last run, to pass as resume_run_id
+        self.run_journal = None                 # TaskRunJournal of the current run, when Journal.Directory is configured
+        self.resumed_task_ids = dict()          # Ordered set of the tasks completed by the run that is being resumed
+        self.shared_thread_pool = None          # Thread pool shared by all the contexts processed by process_contexts()
+        self.worker_slots = None                # TaskWorkerSlots shared by all the contexts processed by process_contexts()
+        self.context_key_value_stores = dict()  # context -> KeyValueStore, of the last process_contexts() call
+        self.tasks_since_state_flush = 0
+        self.last_state_flush = time.monotonic()
+        self.result_cache = TaskResultCache(
+            max_memory_entries=int(self._get_configuration_value(section='ResultCache', key='MaxMemoryEntries', default=1024)),
+            directory=self._get_configuration_value(section='ResultCache', key='Directory', default=None),
+            max_disk_entries=int(self._get_configuration_value(section='ResultCache', key='MaxDiskEntries', default=10000)),
+            logger=logger
+        )
         self.state_persistence.retrieve_all_state_from_persistence()
         self._register_task_registration_failure_exception_throwing_hook()
 
+    def _get_configuration_value(self, section: str, key: str, default: object=None)->object:
+        if section in self.configuration:
+            if isinstance(self.configuration[section], dict):
+                if key in self.configuration[section]:
+                    return self.configuration[section][key]
+        return default
+
     def _register_task_registration_failure_exception_throwing_hook(self):
         required_task_life_cycle_stages = TaskLifecycleStages(init_default_stages=False)
         required_task_life_cycle_stages.register_lifecycle_stage(task_life_cycle_stage=TaskLifecycleStage.TASK_REGISTERED_ERROR)
@@ -970,7 +1323,7 @@ class Tasks:
             command='NOT_APPLICABLE',
             context='ALL',
             task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_REGISTER,
-            key_value_store=copy.deepcopy(self.key_value_store),
+            key_value_store=self.key_value_store.snapshot(),
             task=task,
             task_id=task.task_id
         )
@@ -987,11 +1340,14 @@ class Tasks:
                 logger=self.logger
             )
         self.tasks[task.task_id] = task
+        self.task_registration_sequence[task.task_id] = len(self.task_registration_sequence)
+        self._index_task(task=task)
+        self.dependency_graph = None
         self.key_value_store = self.hooks.process_hook(
             command='NOT_APPLICABLE',
             context='ALL',
             task_life_cycle_stage=TaskLifecycleStage.TASK_REGISTERED,
-            key_value_store=copy.deepcopy(self.key_value_store),
+            key_value_store=self.key_value_store.snapshot(),
             task=task,
             task_id=task.task_id
         )
@@ -1031,98 +1387,1274 @@ class Tasks:
                 tasks_found.append(task.task_id)
         return tasks_found
 
-    def _order_tasks(self, ordered_list: list, candidate_task: Task, processing_target_identifier: Identifier)->list:
-        new_ordered_list = copy.deepcopy(ordered_list)
+    def _index_task(self, task: Task):
+        identifier: Identifier
+        for identifier in task.identifiers:
+            if identifier.is_contextual_identifier is True:
+                continue
+            if identifier.identifier_type == 'ManifestName':
+                index = self.task_name_index
+                index_key = identifier.key
+            elif identifier.identifier_type == 'Label':
+                index = self.task_label_index
+                index_key = (identifier.key, identifier.val)
+            else:
+                continue
+            if index_key not in index:
+                index[index_key] = list()
+            if task.task_id not in index[index_key]:
+                index[index_key].append(task.task_id)
+
+    def find_task_ids_by_dependency_identifier(self, identifier: Identifier)->list:
+        """
+            Index based lookup of the tasks referenced by a ManifestName or Label dependency identifier.
+        """
+        if identifier.identifier_type == 'ManifestName':
+            return list(self.task_name_index.get(identifier.key, list()))
+        if identifier.identifier_type == 'Label':
+            return list(self.task_label_index.get((identifier.key, identifier.val), list()))
+        return list()
+
+    def _add_task_dependencies_to_graph(self, graph: TaskDependencyGraph, task: Task, use_group_nodes: bool=True):
+        graph.add_node(node_id=task.task_id)
         task_dependency_identifier: Identifier
-        for task_dependency_identifier in candidate_task.task_dependencies:
-            candidate_dependant_tasks_as_list = self.find_tasks_matching_identifier_and_return_list_of_task_ids(identifier=task_dependency_identifier)
-            if task_dependency_identifier.identifier_type == 'ManifestName' and len(candidate_dependant_tasks_as_list) == 0:
-                raise Exception('Dependant task "{}" required, but NOT FOUND'.format(task_dependency_identifier.key))
-            candidate_dependant_task_id: str
-            for candidate_dependant_task_id in candidate_dependant_tasks_as_list:
-                if candidate_dependant_task_id not in new_ordered_list:
-                    dependant_candidate_task = self.get_task_by_task_id(task_id=candidate_dependant_task_id)
-                    if dependant_candidate_task.task_qualifies_for_processing(processing_target_identifier=processing_target_identifier) is True:
-                        if dependant_candidate_task not in new_ordered_list:
-                            new_ordered_list.append(candidate_dependant_task_id)
-                    else:
-                        raise Exception('Dependant task "{}" has Task "{}" as dependency, but the dependant task is not in scope for processing - cannot proceed. Either remove the task dependency or adjust the execution scope of the dependant task.'.format(candidate_task.task_id, candidate_dependant_task_id))
-        if candidate_task.task_id not in new_ordered_list:
-            new_ordered_list.append(candidate_task.task_id)
-        return new_ordered_list
+        for task_dependency_identifier in task.task_dependencies:
+            dependency_task_ids = self.find_task_ids_by_dependency_identifier(identifier=task_dependency_identifier)
+            if task_dependency_identifier.identifier_type == 'ManifestName' and len(dependency_task_ids) == 0:
+                if task.task_id not in graph.missing_dependencies:
+                    graph.missing_dependencies[task.task_id] = list()
+                graph.missing_dependencies[task.task_id].append(task_dependency_identifier.key)
+            if task_dependency_identifier.identifier_type == 'Label' and len(dependency_task_ids) > 1 and task.task_id not in dependency_task_ids and use_group_nodes is True:
+                group_node_id = 'LABEL_GROUP:{}:{}'.format(task_dependency_identifier.key, task_dependency_identifier.val)
+                if graph.is_group_node(node_id=group_node_id) is False:
+                    graph.add_group_node(node_id=group_node_id, required_node_ids=dependency_task_ids)
+                graph.add_edge(node_id=task.task_id, required_node_id=group_node_id)
+                continue
+            for dependency_task_id in dependency_task_ids:
+                graph.add_edge(node_id=task.task_id, required_node_id=dependency_task_id)
+
+    def _build_graph_for_task_ids(self, task_ids: list)->TaskDependencyGraph:
+        graph = TaskDependencyGraph()
+        for task_id in task_ids:
+            graph.add_node(node_id=task_id)
+        use_group_nodes = self._get_configuration_value(section='Planner', key='LabelGroupNodes', default=True)
+        for task_id in task_ids:
+            self._add_task_dependencies_to_graph(graph=graph, task=self.tasks[task_id], use_group_nodes=use_group_nodes)
+        if self._get_configuration_value(section='Planner', key='TransitiveReduction', default=False) is True:
+            edge_count = graph.edge_count()
+            edges_removed = graph.transitive_reduction()
+            self.logger.info('Transitive reduction removed {} of {} dependency edges'.format(edges_removed, edge_count))
+        return graph
+
+    def build_dependency_graph(self)->TaskDependencyGraph:
+        """
+            Returns the dependency graph of all registered tasks. The graph is cached until the next task is added.
+        """
+        if self.dependency_graph is None:
+            self.dependency_graph = self._build_graph_for_task_ids(task_ids=list(self.tasks.keys()))
+        return self.dependency_graph
+
+    def find_task_ids_by_selectors(self, target_identifiers: list)->list:
+        task_ids = dict()
+        target_identifier: Identifier
+        for target_identifier in target_identifiers:
+            for task_id in self.find_task_ids_by_dependency_identifier(identifier=target_identifier):
+                task_ids[task_id] = True
+        return list(task_ids.keys())
+
+    def find_upstream_task_ids(self, task_ids: list)->list:
+        """
+            Returns task_ids plus every task they depend on, directly or indirectly. When the full dependency graph is
+            not cached, the walk resolves dependencies through the name and label indexes, so only the tasks in the
+            closure are visited.
+        """
+        if self.dependency_graph is not None:
+            closure = dict()
+            pending = list(task_ids)
+            while len(pending) > 0:
+                node_id = pending.pop()
+                if node_id not in closure:
+                    closure[node_id] = True
+                    pending += list(self.dependency_graph.requires[node_id].keys())
+            return [node_id for node_id in closure if self.dependency_graph.is_group_node(node_id=node_id) is False]
+        closure = dict()
+        pending = list(task_ids)
+        while len(pending) > 0:
+            task_id = pending.pop()
+            if task_id not in closure:
+                closure[task_id] = True
+                task_dependency_identifier: Identifier
+                for task_dependency_identifier in self.tasks[task_id].task_dependencies:
+                    pending += self.find_task_ids_by_dependency_identifier(identifier=task_dependency_identifier)
+        return list(closure.keys())
+
+    def _verify_planned_task_dependencies(self, graph: TaskDependencyGraph, planned_task_ids: dict)->list:
+        """
+            Ensures every dependency of the planned tasks is itself planned, and returns the group nodes the planned
+            tasks depend on.
+        """
+        planned_group_node_ids = dict()
+        for task_id in planned_task_ids:
+            if task_id in graph.missing_dependencies:
+                raise Exception('Dependant task "{}" required, but NOT FOUND'.format(graph.missing_dependencies[task_id][0]))
+            for required_node_id in graph.requires[task_id]:
+                if graph.is_group_node(node_id=required_node_id) is True:
+                    planned_group_node_ids[required_node_id] = True
+            for required_task_id in graph.task_requirements(node_id=task_id):
+                if required_task_id not in planned_task_ids:
+                    raise Exception('Dependant task "{}" has Task "{}" as dependency, but the dependant task is not in scope for processing - cannot proceed. Either remove the task dependency or adjust the execution scope of the dependant task.'.format(task_id, required_task_id))
+        return list(planned_group_node_ids.keys())
+
+    def command_uses_reverse_order(self, command: str)->bool:
+        reverse_order_commands = self._get_configuration_value(section='Planner', key='ReverseOrderCommands', default=list())
+        if isinstance(reverse_order_commands, list) is True:
+            return command in reverse_order_commands
+        return False
 
-    def calculate_current_task_order(self, processing_target_identifier: Identifier)->list:
-        task_order = list()
-        task_id: str
-        task: Task
-        for task_id, task in self.tasks.items():
+    def plan_dependency_graph(self, processing_target_identifier: Identifier, target_identifiers: list=None)->TaskDependencyGraph:
+        """
+            Returns the dependency graph of the tasks qualifying for processing, limited to target_identifiers and their
+            dependencies when given, and reversed for the Planner.ReverseOrderCommands.
+        """
+        if target_identifiers is None:
+            candidate_task_ids = list(self.tasks.keys())
+        else:
+            selected_task_ids = list()
+            for task_id in self.find_task_ids_by_selectors(target_identifiers=target_identifiers):
+                if self.tasks[task_id].task_qualifies_for_processing(processing_target_identifier=processing_target_identifier) is True:
+                    selected_task_ids.append(task_id)
+            upstream_task_ids = dict.fromkeys(self.find_upstream_task_ids(task_ids=selected_task_ids))
+            candidate_task_ids = sorted(upstream_task_ids, key=lambda x: self.task_registration_sequence[x])
+        planned_task_ids = dict()
+        for task_id in candidate_task_ids:
+            task = self.tasks[task_id]
             self.logger.debug('calculate_current_task_order(): Considering task "{}"'.format(task.task_id))
             if task.task_qualifies_for_processing(processing_target_identifier=processing_target_identifier) is True:
-                if task.task_id not in task_order:
-                    task_order = self._order_tasks(ordered_list=task_order, candidate_task=task, processing_target_identifier=processing_target_identifier)
-        return task_order
+                planned_task_ids[task_id] = True
+        if target_identifiers is None or self.dependency_graph is not None:
+            graph = self.build_dependency_graph()
+        else:
+            graph = self._build_graph_for_task_ids(task_ids=candidate_task_ids)
+        planned_group_node_ids = self._verify_planned_task_dependencies(graph=graph, planned_task_ids=planned_task_ids)
+        plan = graph.subgraph(node_ids=list(planned_task_ids.keys()) + planned_group_node_ids)
+        processing_target_context: IdentifierContext
+        for processing_target_context in processing_target_identifier.identifier_contexts:
+            if processing_target_context.context_type == 'Command':
+                if self.command_uses_reverse_order(command=processing_target_context.context_name) is True:
+                    plan = plan.reversed()
+        return plan
 
-    def process_context(self, command: str, context: str):
-        # First, build the processing identifier object
-        processing_target_identifier = build_command_identifier(command=command, context=context)
+    def calculate_current_task_order(self, processing_target_identifier: Identifier, target_identifiers: list=None)->list:
+        return self.plan_dependency_graph(processing_target_identifier=processing_target_identifier, target_identifiers=target_identifiers).topological_order()
 
-        # Determine the order based on task dependencies
-        task_order = self.calculate_current_task_order(processing_target_identifier=processing_target_identifier)
-        task_order = list(dict.fromkeys(task_order))    # de-duplicate
-        self.logger.debug('task_order={}'.format(task_order))
+    def calculate_current_task_waves(self, processing_target_identifier: Identifier, target_identifiers: list=None)->list:
+        """
+            Returns the planned tasks as a list of waves. Tasks in the same wave do not depend on each other.
+        """
+        return self.plan_dependency_graph(processing_target_identifier=processing_target_identifier, target_identifiers=target_identifiers).waves()
+
+    def get_task_processor_for_task(self, task: Task)->TaskProcessor:
+        target_task_processor_id = '{}:{}'.format(task.kind, task.version)
+        if target_task_processor_id in self.task_processor_register:
+            target_task_processor_executor_id = self.task_processor_register[target_task_processor_id]
+            if target_task_processor_executor_id in self.task_processors_executors:
+                target_task_processor_executor = self.task_processors_executors[target_task_processor_executor_id]
+                if isinstance(target_task_processor_executor, TaskProcessor):
+                    return target_task_processor_executor
+        return None
 
-        # Process tasks in order, with the available task processor registered for this task kind and version
-        for task_id in task_order:
-            if task_id in self.tasks:
-                task = self.tasks[task_id]
+    def calculate_task_upstream_digests(self, plan: TaskDependencyGraph, command: str, context: str)->dict:
+        """
+            Returns, for every planned task, a digest of the checksums of all the tasks it depends on, directly or
+            indirectly, and of the dependency structure between them.
+        """
+        run_digests = dict()
+        upstream_digests = dict()
+        for task_id in plan.topological_order():
+            if task_id not in self.tasks:
+                continue
+            upstream_digest = hashlib.sha256()
+            for required_task_id in sorted(plan.task_requirements(node_id=task_id)):
+                if required_task_id in run_digests:
+                    upstream_digest.update('{}:{}\n'.format(required_task_id, run_digests[required_task_id]).encode('utf-8'))
+            upstream_digests[task_id] = upstream_digest.hexdigest()
+            run_digests[task_id] = hashlib.sha256('{}:{}:{}:{}'.format(self.tasks[task_id].task_checksum, command, context, upstream_digests[task_id]).encode('utf-8')).hexdigest()
+        return upstream_digests
+
+    def _build_task_run_record_identifier(self, task_id: str, command: str, context: str)->str:
+        return 'TASK_RUN_RECORD:{}:{}:{}'.format(task_id, command, context)
+
+    def _prepare_incremental_run(self, plan: TaskDependencyGraph, command: str, context: str):
+        """
+            A task is unchanged when its checksum and upstream digest match those recorded after its last successful
+            run for the same command and context, and all the tasks it requires are unchanged as well. The store
+            changes its task processor made in that run are applied again when the unchanged task is skipped, so a
+            task whose changes could not be recorded (see _build_task_output_record()) is always processed.
+        """
+        self.task_upstream_digests = dict()
+        self.unchanged_task_ids = dict()
+        self.task_output_deltas = dict()
+        if self._get_configuration_value(section='Executor', key='Incremental', default=False) is not True:
+            return
+        self.task_upstream_digests = self.calculate_task_upstream_digests(plan=plan, command=command, context=context)
+        for task_id in plan.topological_order():
+            if task_id not in self.tasks:
+                continue
+            run_record = self.state_persistence.get_object_state(object_identifier=self._build_task_run_record_identifier(task_id=task_id, command=command, context=context))
+            if run_record.get('TaskChecksum') != self.tasks[task_id].task_checksum or run_record.get('UpstreamDigest') != self.task_upstream_digests[task_id]:
+                continue
+            if isinstance(run_record.get('SetValues'), dict) is False or isinstance(run_record.get('DeletedKeys'), list) is False:
+                continue
+            requirements_unchanged = True
+            for required_task_id in plan.task_requirements(node_id=task_id):
+                if required_task_id in self.tasks and required_task_id not in self.unchanged_task_ids:
+                    requirements_unchanged = False
+            if requirements_unchanged is True:
+                self.unchanged_task_ids[task_id] = True
+        self.logger.info('Incremental run: {} of {} planned tasks are unchanged'.format(len(self.unchanged_task_ids), len(self.task_upstream_digests)))
+
+    def _record_successful_task_run(self, task_id: str, command: str, context: str):
+        if task_id not in self.task_upstream_digests:
+            return
+        if self.key_value_store.store.get('PROCESSING_TASK:{}:{}:{}'.format(task_id, command, context)) != TaskProcessingStatus.DONE:
+            return
+        run_record = {
+            'TaskChecksum': self.tasks[task_id].task_checksum,
+            'Command': command,
+            'Context': context,
+            'UpstreamDigest': self.task_upstream_digests[task_id],
+        }
+        output_record = self._build_task_output_record(delta=self.task_output_deltas.pop(task_id, KeyValueStoreDelta()))
+        if output_record is not None:
+            run_record.update(output_record)
+        self.state_persistence.save_object_state(
+            object_identifier=self._build_task_run_record_identifier(task_id=task_id, command=command, context=context),
+            data=run_record
+        )
+
+    def _build_task_output_record(self, delta: KeyValueStoreDelta)->dict:
+        """
+            Returns the store changes of a task processor as plain JSON data, or None when they do not survive a JSON
+            round trip unchanged or are larger than Executor.IncrementalMaxOutputBytes (default 65536).
+        """
+        output_record = {'SetValues': dict(delta.set_values), 'DeletedKeys': list(delta.deleted_keys)}
+        try:
+            serialized_output_record = json.dumps(output_record)
+        except (TypeError, ValueError):
+            return None
+        if len(serialized_output_record) > self._get_configuration_value(section='Executor', key='IncrementalMaxOutputBytes', default=65536):
+            return None
+        if json.loads(serialized_output_record) != output_record:
+            return None
+        return output_record
+
+    def _keep_task_output_delta(self, task_ids: list, before: CopyOnWriteMapping, key_value_store: KeyValueStore):
+        """
+            In an Incremental run, keeps the store changes of the task processor until the run of the task is recorded.
+        """
+        if len(self.task_upstream_digests) == 0:
+            return
+        delta = build_key_value_store_delta(before=before, after=key_value_store.store)
+        for task_id in task_ids:
+            self.task_output_deltas[task_id] = delta
+
+    def _get_unchanged_task_lifecycle_stages(self)->tuple:
+        if self._get_configuration_value(section='Executor', key='UnchangedTaskHooks', default=True) is True:
+            return (TaskLifecycleStage.TASK_PRE_PROCESSING_START, TaskLifecycleStage.TASK_PRE_PROCESSING_COMPLETED, TaskLifecycleStage.TASK_PROCESSING_PRE_START, TaskLifecycleStage.TASK_PROCESSING_POST_DONE)
+        return tuple()
+
+    def _unchanged_task_lifecycle_steps(self, task: Task, command: str, context: str, key_value_store: KeyValueStore)->KeyValueStore:
+        self.logger.info('Task "{}" is unchanged since its last successful run - skipping'.format(task.task_id))
+        run_record = self.state_persistence.get_object_state(object_identifier=self._build_task_run_record_identifier(task_id=task.task_id, command=command, context=context))
+        delta = KeyValueStoreDelta()
+        for key in run_record['DeletedKeys']:
+            delta.delete(key=key)
+        for key, value in run_record['SetValues'].items():
+            delta.set(key=key, value=value)
+        key_value_store = delta.apply(key_value_store=key_value_store)
+        key_value_store.save(key='PROCESSING_TASK:{}:{}:{}'.format(task.task_id, command, context), value=TaskProcessingStatus.UNCHANGED)
+        for task_life_cycle_stage in self._get_unchanged_task_lifecycle_stages():
+            key_value_store = yield from self.hooks._process_hook_steps(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=key_value_store, task=task, task_id=task.task_id)
+        return key_value_store
+
+    def get_task_result_cache_key(self, task: Task, task_processor: TaskProcessor, command: str, context: str)->str:
+        """
+            Returns the result cache key when the result of the task processor for this command may be cached, or None.
+        """
+        if self._get_configuration_value(section='ResultCache', key='Enabled', default=True) is not True:
+            return None
+        if command not in task_processor.cacheable_commands:
+            return None
+        return build_task_result_cache_key(task=task, task_processor=task_processor, command=command, context=context)
+
+    def _replay_cached_task_result(self, task: Task, cache_key: str, key_value_store: KeyValueStore)->KeyValueStore:
+        """
+            Returns the store with the cached result applied, or None when there is no cached result.
+        """
+        if cache_key is None:
+            return None
+        cached_delta = self.result_cache.get(key=cache_key)
+        if cached_delta is None:
+            return None
+        self.logger.info('Task "{}" result replayed from the result cache'.format(task.task_id))
+        return cached_delta.apply(key_value_store=key_value_store)
+
+    def _cache_task_result(self, task: Task, command: str, context: str, cache_key: str, before: CopyOnWriteMapping, key_value_store: KeyValueStore):
+        if cache_key is None:
+            return
+        if key_value_store.store.get('PROCESSING_TASK:{}:{}:{}'.format(task.task_id, command, context)) != TaskProcessingStatus.DONE:
+            return
+        self.result_cache.put(key=cache_key, delta=build_key_value_store_delta(before=before, after=key_value_store.store))
 
-                self.key_value_store = self.key_value_store = self.hooks.process_hook(
+    def _task_lifecycle_steps(self, task: Task, command: str, context: str, key_value_store: KeyValueStore)->KeyValueStore:
+        """
+            The lifecycle of a task as a generator of steps (see run_steps()), run by every executor.
+        """
+        task_id = task.task_id
+        if task_id in self.unchanged_task_ids:
+            return (yield from self._unchanged_task_lifecycle_steps(task=task, command=command, context=context, key_value_store=key_value_store))
+        key_value_store = yield from self.hooks._process_hook_steps(
+            command=command,
+            context=context,
+            task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START,
+            key_value_store=key_value_store,
+            task=task,
+            task_id=task_id
+        )
+
+        target_task_processor_executor = self.get_task_processor_for_task(task=task)
+        if target_task_processor_executor is not None:
+            cache_key = self.get_task_result_cache_key(task=task, task_processor=target_task_processor_executor, command=command, context=context)
+            before = None
+            if cache_key is not None or len(self.task_upstream_digests) > 0:
+                before = key_value_store.store.snapshot()   # Only the result cache and Incremental runs need the changes
+            cached_key_value_store = self._replay_cached_task_result(task=task, cache_key=cache_key, key_value_store=key_value_store)
+            if cached_key_value_store is not None:
+                key_value_store = cached_key_value_store
+            else:
+                key_value_store = yield functools.partial(
+                    target_task_processor_executor.task_pre_processing_check,
+                    task=task,
                     command=command,
                     context=context,
-                    task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START,
-                    key_value_store=self.key_value_store,
+                    key_value_store=key_value_store,
+                    call_process_task_if_check_pass=True,
+                    state_persistence=self.state_persistence
+                )
+                self._cache_task_result(task=task, command=command, context=context, cache_key=cache_key, before=before, key_value_store=key_value_store)
+            self._keep_task_output_delta(task_ids=[task_id,], before=before, key_value_store=key_value_store)
+
+            for task_life_cycle_stage in (TaskLifecycleStage.TASK_PRE_PROCESSING_COMPLETED, TaskLifecycleStage.TASK_PROCESSING_PRE_START):
+                key_value_store = yield from self.hooks._process_hook_steps(
+                    command=command,
+                    context=context,
+                    task_life_cycle_stage=task_life_cycle_stage,
+                    key_value_store=key_value_store,
                     task=task,
-                    task_id=task_id,
-                    logger=self.logger
+                    task_id=task_id
+                )
+
+            yield self._task_state_changed
+
+            key_value_store = yield from self.hooks._process_hook_steps(
+                command=command,
+                context=context,
+                task_life_cycle_stage=TaskLifecycleStage.TASK_PROCESSING_POST_DONE,
+                key_value_store=key_value_store,
+                task=task,
+                task_id=task_id
+            )
+        return key_value_store
+
+    def _process_task_lifecycle(self, task: Task, command: str, context: str, key_value_store: KeyValueStore)->KeyValueStore:
+        return run_steps(steps=self._task_lifecycle_steps(task=task, command=command, context=context, key_value_store=key_value_store))
+
+    def _lifecycle_in_isolation_steps(self, task_ids: list, command: str, context: str, base_store: CopyOnWriteMapping)->KeyValueStoreDelta:
+        """
+            Runs the lifecycle of the task, or of the batch of tasks, against a private copy of the store and returns
+            only the changes, so tasks running concurrently never see each other's partial results.
+        """
+        key_value_store = KeyValueStore()
+        key_value_store.store = base_store.snapshot()
+        if self.get_task_batch_key(task_id=task_ids[0]) is None:
+            key_value_store = yield from self._task_lifecycle_steps(task=self.tasks[task_ids[0]], command=command, context=context, key_value_store=key_value_store)
+        else:
+            key_value_store = yield from self._batch_lifecycle_steps(tasks=[self.tasks[task_id] for task_id in task_ids], command=command, context=context, key_value_store=key_value_store)
+        return build_key_value_store_delta(before=base_store, after=key_value_store.store)
+
+    def _process_lifecycle_in_isolation(self, task_ids: list, command: str, context: str, base_store: CopyOnWriteMapping)->KeyValueStoreDelta:
+        return run_steps(steps=self._lifecycle_in_isolation_steps(task_ids=task_ids, command=command, context=context, base_store=base_store))
+
+    def get_task_batch_key(self, task_id: str)->str:
+        """
+            Returns the "kind:version" of the task when its task processor implements process_tasks_batch(), or None
+            when the task must be processed on its own.
+        """
+        if task_id not in self.tasks or task_id in self.unchanged_task_ids:
+            return None
+        task = self.tasks[task_id]
+        task_processor = self.get_task_processor_for_task(task=task)
+        if task_processor is None:
+            return None
+        if task_processor.supports_batch_processing() is False:
+            return None
+        return '{}:{}'.format(task.kind, task.version)
+
+    def _batch_lifecycle_steps(self, tasks: list, command: str, context: str, key_value_store: KeyValueStore)->KeyValueStore:
+        """
+            The lifecycle of a batch of tasks of the same kind and version. Every hook still fires for every task, but
+            the task processor is called only once for the whole batch.
+        """
+        for task in tasks:
+            key_value_store = yield from self.hooks._process_hook_steps(command=command, context=context, task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START, key_value_store=key_value_store, task=task, task_id=task.task_id)
+        target_task_processor_executor = self.get_task_processor_for_task(task=tasks[0])
+        before = None
+        if len(self.task_upstream_digests) > 0:
+            before = key_value_store.store.snapshot()
+        key_value_store = yield functools.partial(target_task_processor_executor.tasks_batch_pre_processing_check, tasks=tasks, command=command, context=context, key_value_store=key_value_store, call_process_tasks_batch_if_check_pass=True, state_persistence=self.state_persistence)
+        self._keep_task_output_delta(task_ids=[task.task_id for task in tasks], before=before, key_value_store=key_value_store)
+        for task in tasks:
+            for task_life_cycle_stage in (TaskLifecycleStage.TASK_PRE_PROCESSING_COMPLETED, TaskLifecycleStage.TASK_PROCESSING_PRE_START):
+                key_value_store = yield from self.hooks._process_hook_steps(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=key_value_store, task=task, task_id=task.task_id)
+        yield self._task_state_changed
+        for task in tasks:
+            key_value_store = yield from self.hooks._process_hook_steps(command=command, context=context, task_life_cycle_stage=TaskLifecycleStage.TASK_PROCESSING_POST_DONE, key_value_store=key_value_store, task=task, task_id=task.task_id)
+        return key_value_store
+
+    def _process_batch_lifecycle(self, tasks: list, command: str, context: str, key_value_store: KeyValueStore)->KeyValueStore:
+        return run_steps(steps=self._batch_lifecycle_steps(tasks=tasks, command=command, context=context, key_value_store=key_value_store))
+
+    def _record_task_durations(self, task_ids: list, command: str, context: str, seconds: float):
+        """
+            The tasks were processed together, so each task is recorded with an even share of the duration.
+        """
+        if self._get_configuration_value(section='Executor', key='RecordTaskDurations', default=True) is True:
+            for task_id in task_ids:
+                self.task_run_history.record_duration(task_id=task_id, command=command, context=context, seconds=seconds / len(task_ids))
+
+    def calculate_task_priorities(self, plan: TaskDependencyGraph, command: str, context: str)->dict:
+        """
+            Returns the critical path length of every planned task: the expected duration of the task plus that of the
+            longest chain of tasks depending on it. Tasks without a recorded duration are expected to take the average
+            of the recorded durations. When no task in the plan has any history, every task weighs 1, so the priority
+            is the depth of the remaining chain of dependants.
+        """
+        durations = dict()
+        for task_id in plan.nodes:
+            if task_id in self.tasks:
+                duration = self.task_run_history.get_average_duration(task_id=task_id, command=command, context=context)
+                if duration is not None:
+                    durations[task_id] = duration
+        default_duration = 1.0
+        if len(durations) > 0:
+            default_duration = sum(durations.values()) / len(durations)
+        node_weights = dict()
+        for task_id in plan.nodes:
+            if task_id in self.tasks:
+                node_weights[task_id] = durations.get(task_id, default_duration)
+        return plan.critical_path_lengths(node_weights=node_weights)
+
+    def _split_wave_into_batches(self, wave: list, batch_size: int)->list:
+        """
+            Groups the tasks of one wave by kind and version, in chunks of at most batch_size tasks. A batch takes the
+            position of its first task, and tasks that can not be batched remain batches of one.
+        """
+        batches = list()
+        open_batches = dict()
+        for task_id in wave:
+            batch_key = None
+            if batch_size > 1:
+                batch_key = self.get_task_batch_key(task_id=task_id)
+            if batch_key is None:
+                batches.append([task_id,])
+                continue
+            if batch_key not in open_batches or len(open_batches[batch_key]) >= batch_size:
+                open_batches[batch_key] = list()
+                batches.append(open_batches[batch_key])
+            open_batches[batch_key].append(task_id)
+        return batches
+
+    def _task_state_changed(self):
+        """
+            Called once a task processor returned, to persist the state according to StatePersistence.FlushPolicy.
+        """
+        flush_policy = self._get_configuration_value(section='StatePersistence', key='FlushPolicy', default='EveryTask')
+        if flush_policy == 'EveryTask':
+            self._persist_state()
+            return
+        if flush_policy != 'Batched':
+            return
+        with self.state_persistence.persist_lock:
+            self.tasks_since_state_flush += 1
+            flush_every_tasks = int(self._get_configuration_value(section='StatePersistence', key='FlushEveryTasks', default=100))
+            flush_interval_seconds = float(self._get_configuration_value(section='StatePersistence', key='FlushIntervalSeconds', default=5.0))
+            if self.tasks_since_state_flush < flush_every_tasks and time.monotonic() - self.last_state_flush < flush_interval_seconds:
+                return
+            self.tasks_since_state_flush = 0
+            self.last_state_flush = time.monotonic()
+            self._persist_state()
+
+    def _persist_state(self):
+        self.state_persistence.persist_all_state()
+        if self._get_configuration_value(section='StatePersistence', key='DurabilityBarrier', default='EndOfRun') == 'Flush':
+            self.state_persistence.wait_until_durable()
+
+    def _flush_state(self):
+        """
+            Persists all remaining state at the end of a run, whatever the flush policy, and waits until it is durable.
+        """
+        with self.state_persistence.persist_lock:
+            self.tasks_since_state_flush = 0
+            self.last_state_flush = time.monotonic()
+            self.state_persistence.persist_all_state()
+            self.state_persistence.wait_until_durable()
+
+    def _reset_failure_tracking(self):
+        self.failed_task_ids = dict()
+        self.skipped_task_ids = dict()
+
+    def _task_failed(self, task_id: str, command: str, context: str)->bool:
+        if self.key_value_store.store.get('PROCESSING_TASK:{}:{}:{}'.format(task_id, command, context)) == TaskProcessingStatus.FAILED:
+            return True
+        return False
+
+    def _set_task_status(self, task_ids: list, command: str, context: str, status: int)->dict:
+        """
+            Sets the processing status of the tasks in the store, and returns the change as a KeyValueStoreDelta per
+            task, for the concurrent executors to replay.
+        """
+        deltas = dict()
+        for task_id in task_ids:
+            deltas[task_id] = KeyValueStoreDelta()
+            deltas[task_id].set(key='PROCESSING_TASK:{}:{}:{}'.format(task_id, command, context), value=status)
+            self.key_value_store = deltas[task_id].apply(key_value_store=self.key_value_store)
+        return deltas
+
+    def _fail_tasks(self, plan: TaskDependencyGraph, task_ids: list, command: str, context: str)->dict:
+        """
+            Registers the tasks as failed and marks every task depending on them, directly or indirectly, as skipped.
+            Returns the status changes as a KeyValueStoreDelta per task.
+        """
+        for task_id in task_ids:
+            self.failed_task_ids[task_id] = True
+        skipped_task_ids = list()
+        for task_id in plan.transitive_dependants(node_ids=task_ids):
+            if task_id in self.tasks and task_id not in self.skipped_task_ids and task_id not in self.failed_task_ids:
+                self.skipped_task_ids[task_id] = True
+                skipped_task_ids.append(task_id)
+        self.logger.error('Task(s) {} failed - skipping {} dependant task(s): {}'.format(task_ids, len(skipped_task_ids), skipped_task_ids))
+        return self._set_task_status(task_ids=skipped_task_ids, command=command, context=context, status=TaskProcessingStatus.SKIPPED)
+
+    def fail_fast_enabled(self)->bool:
+        return self._get_configuration_value(section='Executor', key='FailFast', default=False) is True
+
+    def get_task_timeout_seconds(self, task_ids: list)->float:
+        """
+            Returns the timeout of a task, or of a batch of tasks (the longest of their timeouts), or None when at least
+            one of the tasks has no timeout.
+        """
+        timeouts = list()
+        for task_id in task_ids:
+            timeout_seconds = self.tasks[task_id].timeout_seconds
+            if timeout_seconds is None:
+                timeout_seconds = self._get_configuration_value(section='Executor', key='TaskTimeoutSeconds', default=None)
+            if timeout_seconds is None:
+                return None
+            timeouts.append(float(timeout_seconds))
+        return max(timeouts)
+
+    def get_task_retry_policy(self, task: Task)->TaskRetryPolicy:
+        if isinstance(task.metadata.get('retrypolicy', None), dict):
+            return build_task_retry_policy(data=task.metadata['retrypolicy'])
+        kind_retry_policy = self._get_configuration_value(section='RetryPolicies', key=task.kind, default=None)
+        if isinstance(kind_retry_policy, dict):
+            return build_task_retry_policy(data=kind_retry_policy)
+        return TaskRetryPolicy()
+
+    def _calculate_retry_delay(self, task_ids: list, command: str, context: str, delta: KeyValueStoreDelta, attempts: dict)->float:
+        """
+            Returns the number of seconds to wait before processing the tasks again, or None when the attempt did not
+            fail or must not be retried. attempts holds the number of attempts made so far per task.
+        """
+        delays = list()
+        for task_id in task_ids:
+            if delta.set_values.get('PROCESSING_TASK:{}:{}:{}'.format(task_id, command, context)) != TaskProcessingStatus.FAILED:
+                continue
+            retry_policy = self.get_task_retry_policy(task=self.tasks[task_id])
+            error = delta.set_values.get('PROCESSING_TASK_ERROR:{}:{}:{}'.format(task_id, command, context), dict())
+            if retry_policy.should_retry(attempt=attempts[task_id], error=error) is False:
+                return None
+            delays.append(retry_policy.calculate_delay(attempt=attempts[task_id]))
+        if len(delays) == 0:
+            return None
+        self.logger.warning('Task(s) {} failed on attempt {} - retrying in {:.3f}s'.format(task_ids, attempts[task_ids[0]], max(delays)))
+        return max(delays)
+
+    def _raise_if_run_failed(self, command: str, context: str):
+        if len(self.failed_task_ids) == 0:
+            return
+        message = 'Processing of command "{}" in context "{}" failed. Failed tasks: {}. Tasks not processed: {}'.format(command, context, list(self.failed_task_ids.keys()), len(self.skipped_task_ids))
+        if self.fail_fast_enabled() is True:
+            raise Exception(message)
+        self.logger.error(message)
+
+    def _prepare_run_journal(self, plan: TaskDependencyGraph, command: str, context: str, resume_run_id: str=None):
+        """
+            Opens the journal of the run. When resuming a run, the store changes of every task completed by that run
+            are applied again and the task is not processed. A task is processed again when its checksum changed, or
+            when one of the tasks it requires is processed again.
+        """
+        self.run_id = resume_run_id
+        if self.run_id is None:
+            self.run_id = uuid.uuid4().hex
+        self.run_journal = None
+        self.resumed_task_ids = dict()
+        directory = self._get_configuration_value(section='Journal', key='Directory', default=None)
+        if directory is None:
+            if resume_run_id is not None:
+                raise Exception('A run can only be resumed with Journal.Directory configured')
+            return
+        file_path = build_task_run_journal_file_path(directory=directory, run_id=self.run_id)
+        truncate_at = None
+        if resume_run_id is not None:
+            if os.path.exists(file_path) is False:
+                raise Exception('No journal found for run "{}"'.format(resume_run_id))
+            records, truncate_at = read_task_run_journal(file_path=file_path)
+            if len(records) == 0 or records[0].get('Command') != command or records[0].get('Context') != context:
+                raise Exception('Run "{}" did not process command "{}" in context "{}"'.format(resume_run_id, command, context))
+            for record in records:
+                if record['Type'] != 'TasksCompleted':
+                    continue
+                resumable = True
+                for task_id, task_checksum in record['TaskChecksums'].items():
+                    if task_id not in plan.nodes or task_id not in self.tasks or self.tasks[task_id].task_checksum != task_checksum:
+                        resumable = False
+                        continue
+                    for required_task_id in plan.task_requirements(node_id=task_id):
+                        if required_task_id in self.tasks and required_task_id not in self.resumed_task_ids and required_task_id not in record['TaskChecksums']:
+                            resumable = False
+                if resumable is True:
+                    self.key_value_store = record['Delta'].apply(key_value_store=self.key_value_store)
+                    for task_id in record['TaskIds']:
+                        self.resumed_task_ids[task_id] = True
+            self.logger.info('Resuming run "{}": {} task(s) already completed'.format(self.run_id, len(self.resumed_task_ids)))
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.logger.info('Starting run "{}"'.format(self.run_id))
+        self.run_journal = TaskRunJournal(
+            file_path=file_path,
+            group_commit_records=int(self._get_configuration_value(section='Journal', key='GroupCommitRecords', default=64)),
+            group_commit_seconds=float(self._get_configuration_value(section='Journal', key='GroupCommitSeconds', default=0.5)),
+            fsync=self._get_configuration_value(section='Journal', key='Fsync', default=True),
+            truncate_at=truncate_at,
+            logger=self.logger
+        )
+        if resume_run_id is None:
+            self.run_journal.append(record={'Type': 'RunStarted', 'Command': command, 'Context': context, 'TaskIds': [task_id for task_id in plan.topological_order() if task_id in self.tasks]})
+        else:
+            self.run_journal.append(record={'Type': 'RunResumed', 'ResumedTaskIds': list(self.resumed_task_ids.keys())})
+        self.run_journal.flush()
+
+    def _close_run_journal(self):
+        if self.run_journal is not None:
+            self.run_journal.close()
+            self.run_journal = None
+
+    def _task_needs_processing(self, task_id: str)->bool:
+        return task_id in self.tasks and task_id not in self.skipped_task_ids and task_id not in self.resumed_task_ids
+
+    def _journal_completed_tasks(self, task_ids: list, command: str, context: str, delta: KeyValueStoreDelta):
+        """
+            Only tasks that completed successfully (or were unchanged) are recorded, so that resuming a run processes
+            failed tasks again.
+        """
+        if self.run_journal is None:
+            return
+        for task_id in task_ids:
+            if self.key_value_store.store.get('PROCESSING_TASK:{}:{}:{}'.format(task_id, command, context)) not in (TaskProcessingStatus.DONE, TaskProcessingStatus.UNCHANGED):
+                return
+        self.run_journal.append(
+            record={
+                'Type': 'TasksCompleted',
+                'TaskIds': task_ids,
+                'TaskChecksums': dict([(task_id, self.tasks[task_id].task_checksum) for task_id in task_ids]),
+                'Delta': delta,
+            }
+        )
+
+    def _process_plan_serially(self, plan: TaskDependencyGraph, command: str, context: str):
+        """
+            Processes the ready tasks in plan order and in batches. Retried tasks wait on a timer queue, and the store is
+            rolled back to the version taken before a task when one of its hooks fails.
+        """
+        task_order = plan.topological_order()
+        self.logger.debug('task_order={}'.format(task_order))
+        batch_size = int(self._get_configuration_value(section='Executor', key='BatchSize', default=50))
+        ready_queue = TaskReadyQueue(plan=plan)
+        processed_task_ids = dict()
+        attempts = dict()
+        retry_timers = list()       # heap of (time at which the tasks are ready again, plan sequence, list of task_id)
+        while len(self.failed_task_ids) == 0 or self.fail_fast_enabled() is False:
+            while len(retry_timers) > 0 and retry_timers[0][0] <= time.monotonic():
+                for task_id in heapq.heappop(retry_timers)[2]:
+                    ready_queue.resume(task_id=task_id)
+            ready_task_ids = list()
+            task_id = ready_queue.pop()
+            while task_id is not None:
+                ready_task_ids.append(task_id)
+                task_id = ready_queue.pop()
+            if len(ready_task_ids) == 0:
+                if len(retry_timers) == 0:
+                    break
+                if self.run_journal is not None:
+                    self.run_journal.flush()
+                time.sleep(max(0.0, retry_timers[0][0] - time.monotonic()))
+                continue
+            ready_task_ids.sort(key=lambda x: plan.nodes[x])
+            for task_id in ready_task_ids:
+                if self._task_needs_processing(task_id=task_id) is False:
+                    ready_queue.complete(node_id=task_id)
+            for batch in self._split_wave_into_batches(wave=[task_id for task_id in ready_task_ids if self._task_needs_processing(task_id=task_id) is True], batch_size=batch_size):
+                if len(self.failed_task_ids) > 0 and self.fail_fast_enabled() is True:
+                    break
+                if self.run_journal is not None:
+                    self.run_journal.flush_if_due()
+                start = time.monotonic()
+                versioned_store = self.key_value_store
+                version = versioned_store.create_version()
+                retry_delay = None
+                try:
+                    if max([self.get_task_retry_policy(task=self.tasks[task_id]).max_attempts for task_id in batch]) > 1:
+                        retry_delay = self._process_tasks_serially_in_isolation(task_ids=batch, command=command, context=context, attempts=attempts)
+                    elif self.get_task_batch_key(task_id=batch[0]) is None:
+                        self.key_value_store = self._process_task_lifecycle(task=self.tasks[batch[0]], command=command, context=context, key_value_store=self.key_value_store)
+                    else:
+                        self.key_value_store = self._process_batch_lifecycle(tasks=[self.tasks[task_id] for task_id in batch], command=command, context=context, key_value_store=self.key_value_store)
+                except:
+                    self.logger.error('Processing of task(s) {} raised an exception - rolling back the store'.format(batch))
+                    versioned_store.rollback(version=version)
+                    versioned_store.release_version(version=version)
+                    self.key_value_store = versioned_store
+                    raise
+                if retry_delay is not None:
+                    versioned_store.release_version(version=version)
+                    heapq.heappush(retry_timers, (time.monotonic() + retry_delay, plan.nodes[batch[0]], batch))
+                    continue
+                self._record_task_durations(task_ids=batch, command=command, context=context, seconds=time.monotonic() - start)
+                for task_id in batch:
+                    processed_task_ids[task_id] = True
+                    self._record_successful_task_run(task_id=task_id, command=command, context=context)
+                if self.run_journal is not None:
+                    self._journal_completed_tasks(task_ids=batch, command=command, context=context, delta=build_key_value_store_delta(before=versioned_store.versions[version], after=self.key_value_store.store))
+                versioned_store.release_version(version=version)
+                failed_task_ids = [task_id for task_id in batch if self._task_failed(task_id=task_id, command=command, context=context) is True]
+                if len(failed_task_ids) > 0:
+                    self._fail_tasks(plan=plan, task_ids=failed_task_ids, command=command, context=context)
+                for task_id in batch:
+                    ready_queue.complete(node_id=task_id)
+        self._skip_remaining_tasks(plan=plan, completed_task_ids=processed_task_ids, command=command, context=context)
+
+    def _process_tasks_serially_in_isolation(self, task_ids: list, command: str, context: str, attempts: dict)->float:
+        """
+            The attempt runs against a copy of the store, so that a failed attempt leaves no trace. Returns the delay
+            before the tasks must be processed again, or None when the result was applied to the store.
+        """
+        for task_id in task_ids:
+            attempts[task_id] = attempts.get(task_id, 0) + 1
+        delta = self._process_lifecycle_in_isolation(task_ids=task_ids, command=command, context=context, base_store=self.key_value_store.store.snapshot())
+        retry_delay = self._calculate_retry_delay(task_ids=task_ids, command=command, context=context, delta=delta, attempts=attempts)
+        if retry_delay is None:
+            self.key_value_store = delta.apply(key_value_store=self.key_value_store)
+        return retry_delay
+
+    def _skip_remaining_tasks(self, plan: TaskDependencyGraph, completed_task_ids: dict, command: str, context: str)->dict:
+        """
+            After FailFast stopped a run, marks every planned task that was not processed, and not skipped yet, as
+            skipped.
+        """
+        remaining_task_ids = list()
+        for task_id in plan.topological_order():
+            if self._task_needs_processing(task_id=task_id) is True and task_id not in completed_task_ids:
+                self.skipped_task_ids[task_id] = True
+                remaining_task_ids.append(task_id)
+        return self._set_task_status(task_ids=remaining_task_ids, command=command, context=context, status=TaskProcessingStatus.SKIPPED)
+
+    def _build_ready_queue(self, plan: TaskDependencyGraph, command: str, context: str)->TaskReadyQueue:
+        task_resource_requirements = dict()
+        for task_id in plan.nodes:
+            if task_id in self.tasks:
+                if len(self.tasks[task_id].resource_requirements) > 0:
+                    task_resource_requirements[task_id] = self.tasks[task_id].resource_requirements
+        task_priorities = dict()
+        if self._get_configuration_value(section='Executor', key='CriticalPathScheduling', default=True) is True:
+            task_priorities = self.calculate_task_priorities(plan=plan, command=command, context=context)
+        return TaskReadyQueue(
+            plan=plan,
+            resource_capacities=self._get_configuration_value(section='Executor', key='ResourceCapacities', default=dict()),
+            task_resource_requirements=task_resource_requirements,
+            task_priorities=task_priorities,
+            wave_barrier=self._get_configuration_value(section='Executor', key='WaveBarrier', default=False)
+        )
+
+    def _concurrent_plan_steps(self, plan: TaskDependencyGraph, command: str, context: str, max_workers: int, submit_tasks: object, collect_task_results: object, wait_for_futures: object, batch_size: int=1, batch_linger_seconds: float=0.0):
+        """
+            A generator of steps (see run_steps()) running the plan, shared by the ThreadPool, ProcessPool and async
+            executors. Ready tasks are submitted by critical path, in batches when batch_size is above 1, and the deltas of
+            all tasks are replayed in plan order when the run completes.
+        """
+        run_start = time.monotonic()
+        busy_seconds = 0.0
+        plan_order = plan.topological_order()
+        self.logger.debug('task_order={}'.format(plan_order))
+        initial_store = self.key_value_store.store.snapshot()
+        deltas = dict()
+        ready_queue = self._build_ready_queue(plan=plan, command=command, context=context)
+        in_flight = dict()
+        submitted_at = dict()
+        deadlines = dict()          # future -> time at which its tasks time out
+        open_batches = dict()       # batch key -> (time the first task became ready, list of task_id)
+        completed_task_ids = dict()
+        attempts = dict()
+        retry_timers = list()       # heap of (time at which the tasks are ready again, plan sequence, list of task_id)
+        abandoned_task_ids = list() # tasks that timed out or were cancelled while running
+        fail_fast = self.fail_fast_enabled()
+        run_token = object()        # identifies this run to the shared worker_slots
+
+        def take_worker_slot(task_id: str)->bool:
+            if self.worker_slots is None:
+                return True
+            return self.worker_slots.acquire(token=run_token, priority=ready_queue.task_priorities.get(task_id, 0))
+
+        def submit(task_ids: list):
+            task_ids.sort(key=lambda x: plan.nodes[x])
+            for task_id in task_ids:
+                attempts[task_id] = attempts.get(task_id, 0) + 1
+            submitted_at[task_ids[-1]] = time.monotonic()
+            future = submit_tasks(task_ids)
+            if self.worker_slots is not None:
+                future.add_done_callback(lambda x: self.worker_slots.release())
+            in_flight[future] = task_ids
+            timeout_seconds = self.get_task_timeout_seconds(task_ids=task_ids)
+            if timeout_seconds is not None:
+                deadlines[future] = submitted_at[task_ids[-1]] + timeout_seconds
+
+        def complete(task_ids: list, failed_task_ids: list):
+            for task_id in task_ids:
+                completed_task_ids[task_id] = True
+                ready_queue.complete(node_id=task_id)
+            if len(failed_task_ids) > 0:
+                deltas.update(self._fail_tasks(plan=plan, task_ids=failed_task_ids, command=command, context=context))
+
+        try:
+            while len(self.failed_task_ids) == 0 or fail_fast is False:
+                while len(retry_timers) > 0 and retry_timers[0][0] <= time.monotonic():
+                    for task_id in heapq.heappop(retry_timers)[2]:
+                        ready_queue.resume(task_id=task_id)
+                waiting_for_worker_slot = False
+                while len(in_flight) < max_workers:
+                    task_id = ready_queue.pop()
+                    if task_id is None:
+                        break
+                    if self._task_needs_processing(task_id=task_id) is False:
+                        ready_queue.complete(node_id=task_id)
+                        continue
+                    batch_key = None
+                    if batch_size > 1:
+                        batch_key = self.get_task_batch_key(task_id=task_id)
+                    if batch_key is None:
+                        if take_worker_slot(task_id=task_id) is False:
+                            ready_queue.suspend(task_id=task_id)
+                            ready_queue.resume(task_id=task_id)
+                            waiting_for_worker_slot = True
+                            break
+                        submit(task_ids=[task_id,])
+                        continue
+                    if batch_key not in open_batches:
+                        open_batches[batch_key] = (time.monotonic(), list())
+                    open_batches[batch_key][1].append(task_id)
+                    if len(open_batches[batch_key][1]) >= batch_size:
+                        if take_worker_slot(task_id=open_batches[batch_key][1][0]) is False:
+                            waiting_for_worker_slot = True
+                            break
+                        submit(task_ids=open_batches.pop(batch_key)[1])
+                nothing_in_flight = len(in_flight) == 0
+                for batch_key in list(open_batches.keys()):
+                    if len(in_flight) >= max_workers or waiting_for_worker_slot is True:
+                        break
+                    if nothing_in_flight is True or len(open_batches[batch_key][1]) >= batch_size or time.monotonic() - open_batches[batch_key][0] >= batch_linger_seconds:
+                        if take_worker_slot(task_id=open_batches[batch_key][1][0]) is False:
+                            waiting_for_worker_slot = True
+                            break
+                        submit(task_ids=open_batches.pop(batch_key)[1])
+                wait_for = list(in_flight.keys())
+                if self.worker_slots is not None:
+                    if waiting_for_worker_slot is True:
+                        wait_for.append(self.worker_slots.wake_up_future(token=run_token))
+                    else:
+                        self.worker_slots.withdraw(token=run_token)
+                if len(wait_for) == 0 and len(retry_timers) == 0:
+                    break
+                wake_up_times = list(deadlines.values())
+                if self.run_journal is not None:
+                    self.run_journal.flush_if_due()
+                    if self.run_journal.flush_due_time() is not None:
+                        wake_up_times.append(self.run_journal.flush_due_time())
+                if len(retry_timers) > 0:
+                    wake_up_times.append(retry_timers[0][0])
+                if len(wait_for) == 0:
+                    yield functools.partial(wait_for_futures, list(), max(0.0, min(wake_up_times) - time.monotonic()))
+                    continue
+                if len(open_batches) > 0:
+                    wake_up_times.append(min([ready_at for ready_at, task_ids in open_batches.values()]) + batch_linger_seconds)
+                timeout = None
+                if len(wake_up_times) > 0:
+                    timeout = max(0.0, min(wake_up_times) - time.monotonic())
+                done = yield functools.partial(wait_for_futures, wait_for, timeout)
+                for future in sorted([future for future in done if future in in_flight], key=lambda x: plan.nodes[in_flight[x][0]]):
+                    task_ids = in_flight.pop(future)
+                    deadlines.pop(future, None)
+                    delta = collect_task_results(task_ids, future)
+                    seconds = time.monotonic() - submitted_at.pop(task_ids[-1])
+                    busy_seconds += seconds
+                    retry_delay = self._calculate_retry_delay(task_ids=task_ids, command=command, context=context, delta=delta, attempts=attempts)
+                    if retry_delay is not None:
+                        for task_id in task_ids:
+                            ready_queue.suspend(task_id=task_id)
+                        heapq.heappush(retry_timers, (time.monotonic() + retry_delay, plan.nodes[task_ids[0]], task_ids))
+                        continue
+                    deltas[task_ids[-1]] = delta
+                    self.key_value_store = delta.apply(key_value_store=self.key_value_store)
+                    self._record_task_durations(task_ids=task_ids, command=command, context=context, seconds=seconds)
+                    for task_id in task_ids:
+                        self._record_successful_task_run(task_id=task_id, command=command, context=context)
+                    self._journal_completed_tasks(task_ids=task_ids, command=command, context=context, delta=delta)
+                    complete(task_ids=task_ids, failed_task_ids=[task_id for task_id in task_ids if self._task_failed(task_id=task_id, command=command, context=context) is True])
+                for future in [future for future, deadline in deadlines.items() if deadline <= time.monotonic()]:
+                    task_ids = in_flight.pop(future)
+                    deadlines.pop(future)
+                    if future.cancel() is False:
+                        abandoned_task_ids += task_ids
+                    busy_seconds += time.monotonic() - submitted_at.pop(task_ids[-1])
+                    self.logger.error('Task(s) {} timed out after {}s - the result will be discarded'.format(task_ids, self.get_task_timeout_seconds(task_ids=task_ids)))
+                    deltas.update(self._set_task_status(task_ids=task_ids, command=command, context=context, status=TaskProcessingStatus.FAILED))
+                    complete(task_ids=task_ids, failed_task_ids=task_ids)
+        except:
+            for future in in_flight:
+                future.cancel()
+            raise
+        finally:
+            if self.worker_slots is not None:
+                self.worker_slots.withdraw(token=run_token)
+        if len(self.failed_task_ids) > 0 and fail_fast is True:
+            cancelled_task_ids = list()
+            for future, task_ids in in_flight.items():
+                if future.cancel() is False:
+                    abandoned_task_ids += task_ids
+                cancelled_task_ids += task_ids
+            self.logger.error('FailFast: cancelled task(s) in progress: {}'.format(cancelled_task_ids))
+            deltas.update(self._set_task_status(task_ids=cancelled_task_ids, command=command, context=context, status=TaskProcessingStatus.CANCELLED))
+            for task_id in cancelled_task_ids:
+                completed_task_ids[task_id] = True
+            deltas.update(self._skip_remaining_tasks(plan=plan, completed_task_ids=completed_task_ids, command=command, context=context))
+        elif ready_queue.pending_count() > 0:     # pragma: no cover
+            raise Exception('Concurrent processing stopped with {} tasks that never became ready'.format(ready_queue.pending_count()))
+        self._replay_deltas_in_plan_order(initial_store=initial_store, deltas=deltas, plan_order=plan_order)
+        elapsed_seconds = time.monotonic() - run_start
+        worker_utilization = 0.0
+        if elapsed_seconds > 0:
+            worker_utilization = busy_seconds / (max_workers * elapsed_seconds)
+        self.run_statistics = {
+            'ElapsedSeconds': elapsed_seconds,
+            'BusySeconds': busy_seconds,
+            'MaxWorkers': max_workers,
+            'WorkerUtilization': worker_utilization,
+            'AbandonedTasks': len(abandoned_task_ids),
+        }
+        self.logger.info('Processed the plan in {:.3f}s with a worker utilization of {:.1%}'.format(elapsed_seconds, worker_utilization))
+
+    def _replay_deltas_in_plan_order(self, initial_store: dict, deltas: dict, plan_order: list):
+        final_store = KeyValueStore()
+        final_store.store = initial_store
+        for task_id in plan_order:
+            if task_id in deltas:
+                final_store = deltas[task_id].apply(key_value_store=final_store)
+        self.key_value_store.store = final_store.store
+
+    def _process_plan_with_thread_pool(self, plan: TaskDependencyGraph, command: str, context: str, pool: concurrent.futures.ThreadPoolExecutor=None):
+        max_workers = int(self._get_configuration_value(section='Executor', key='MaxWorkers', default=4))
+        if pool is None:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                self._process_plan_with_thread_pool(plan=plan, command=command, context=context, pool=pool)
+            except:
+                shutdown_executor(executor=pool, wait=False)
+                raise
+            shutdown_executor(executor=pool, wait=self.run_statistics.get('AbandonedTasks', 0) == 0)
+            return
+
+        def submit_tasks(task_ids: list)->concurrent.futures.Future:
+            return pool.submit(self._process_lifecycle_in_isolation, task_ids, command, context, self.key_value_store.store.snapshot())
+
+        run_steps(
+            steps=self._concurrent_plan_steps(
+                plan=plan,
+                command=command,
+                context=context,
+                max_workers=max_workers,
+                submit_tasks=submit_tasks,
+                collect_task_results=lambda task_ids, future: future.result(),
+                wait_for_futures=wait_for_first_completed,
+                batch_size=int(self._get_configuration_value(section='Executor', key='BatchSize', default=50)),
+                batch_linger_seconds=float(self._get_configuration_value(section='Executor', key='BatchLingerSeconds', default=0.0))
+            )
+        )
+
+    def _process_plan_with_process_pool(self, plan: TaskDependencyGraph, command: str, context: str):
+        """
+            Task processing runs in worker processes, each keeping a warm instance of every TaskProcessor, while hooks and
+            state persistence stay in this process. Tasks are not batched in this mode.
+        """
+        max_workers = int(self._get_configuration_value(section='Executor', key='MaxWorkers', default=4))
+        working_stores = dict()
+        cache_keys = dict()     # task_id -> result cache key of tasks whose result must be added to the cache
+
+        def submit_task(task_id: str)->concurrent.futures.Future:
+            task = self.tasks[task_id]
+            base_store = self.key_value_store.store.snapshot()
+            if task_id in self.unchanged_task_ids:
+                future = concurrent.futures.Future()
+                future.set_result(self._process_lifecycle_in_isolation(task_ids=[task_id,], command=command, context=context, base_store=base_store))
+                return future
+            working_store = KeyValueStore()
+            working_store.store = base_store.snapshot()
+            working_store = self.hooks.process_hook(
+                command=command,
+                context=context,
+                task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START,
+                key_value_store=working_store,
+                task=task,
+                task_id=task_id,
+                logger=self.logger
+            )
+            working_stores[task_id] = (base_store, working_store)
+            task_processor = self.get_task_processor_for_task(task=task)
+            if task_processor is None:
+                future = concurrent.futures.Future()
+                future.set_result(None)
+                return future
+            cache_key = self.get_task_result_cache_key(task=task, task_processor=task_processor, command=command, context=context)
+            if cache_key is not None:
+                cached_delta = self.result_cache.get(key=cache_key)
+                if cached_delta is not None:
+                    self.logger.info('Task "{}" result replayed from the result cache'.format(task_id))
+                    future = concurrent.futures.Future()
+                    future.set_result((cached_delta, dict()))
+                    return future
+                cache_keys[task_id] = cache_key
+            object_states = dict()
+            if len(self.state_persistence.get_object_state(object_identifier=task_id)) > 0:
+                object_states[task_id] = self.state_persistence.get_object_state(object_identifier=task_id)
+            return pool.submit(_process_pool_worker_process_task, build_task_processing_payload(task=task), command, context, working_store.store, object_states)
+
+        def collect_task_result(task_id: str, future: concurrent.futures.Future)->KeyValueStoreDelta:
+            if task_id in self.unchanged_task_ids:
+                return future.result()
+            task = self.tasks[task_id]
+            base_store, working_store = working_stores.pop(task_id)
+            result = future.result()
+            if result is not None:
+                worker_delta, saved_object_states = result
+                working_store = worker_delta.apply(key_value_store=working_store)
+                if len(self.task_upstream_digests) > 0:
+                    self.task_output_deltas[task_id] = worker_delta
+                if task_id in cache_keys and working_store.store.get('PROCESSING_TASK:{}:{}:{}'.format(task_id, command, context)) == TaskProcessingStatus.DONE:
+                    self.result_cache.put(key=cache_keys.pop(task_id), delta=worker_delta)
+                for object_identifier, data in saved_object_states.items():
+                    self.state_persistence.save_object_state(object_identifier=object_identifier, data=data)
+                for task_life_cycle_stage in (TaskLifecycleStage.TASK_PRE_PROCESSING_COMPLETED, TaskLifecycleStage.TASK_PROCESSING_PRE_START):
+                    working_store = self.hooks.process_hook(command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, key_value_store=working_store, task=task, task_id=task_id, logger=self.logger)
+                self._task_state_changed()
+                working_store = self.hooks.process_hook(command=command, context=context, task_life_cycle_stage=TaskLifecycleStage.TASK_PROCESSING_POST_DONE, key_value_store=working_store, task=task, task_id=task_id, logger=self.logger)
+            return build_key_value_store_delta(before=base_store, after=working_store.store)
+
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_process_pool_worker_initializer, initargs=(self.task_processor_register, self.task_processors_executors,))
+        try:
+            run_steps(
+                steps=self._concurrent_plan_steps(
+                    plan=plan,
+                    command=command,
+                    context=context,
+                    max_workers=max_workers,
+                    submit_tasks=lambda task_ids: submit_task(task_ids[0]),
+                    collect_task_results=lambda task_ids, future: collect_task_result(task_ids[0], future),
+                    wait_for_futures=wait_for_first_completed
                 )
+            )
+        except:
+            shutdown_executor(executor=pool, wait=False)
+            raise
+        shutdown_executor(executor=pool, wait=self.run_statistics.get('AbandonedTasks', 0) == 0)
+
+    async def process_context_async(self, command: str, context: str, target_identifiers: list=None, resume_run_id: str=None):
+        """
+            Processes the planned tasks on the running event loop as process_context() would in the ThreadPool mode, with at
+            most Executor.MaxConcurrency (default 64) tasks in progress. Synchronous processors, hooks and the state
+            persistence run in the default executor.
+        """
+        processing_target_identifier = build_command_identifier(command=command, context=context)
+        plan = self.plan_dependency_graph(processing_target_identifier=processing_target_identifier, target_identifiers=target_identifiers)
+        self._prepare_incremental_run(plan=plan, command=command, context=context)
+        self._reset_failure_tracking()
+        self._prepare_run_journal(plan=plan, command=command, context=context, resume_run_id=resume_run_id)
+        try:
+            await self._process_plan_async(plan=plan, command=command, context=context)
+            self._raise_if_run_failed(command=command, context=context)
+        finally:
+            self._close_run_journal()
+            await asyncio.get_running_loop().run_in_executor(None, self._flush_state)
+
+    async def _process_plan_async(self, plan: TaskDependencyGraph, command: str, context: str):
+
+        def submit_tasks(task_ids: list)->asyncio.Future:
+            return asyncio.ensure_future(run_steps_async(steps=self._lifecycle_in_isolation_steps(task_ids=task_ids, command=command, context=context, base_store=self.key_value_store.store.snapshot())))
+
+        await run_steps_async(
+            steps=self._concurrent_plan_steps(
+                plan=plan,
+                command=command,
+                context=context,
+                max_workers=int(self._get_configuration_value(section='Executor', key='MaxConcurrency', default=64)),
+                submit_tasks=submit_tasks,
+                collect_task_results=lambda task_ids, future: future.result(),
+                wait_for_futures=wait_for_first_completed_async,
+                batch_size=int(self._get_configuration_value(section='Executor', key='BatchSize', default=50)),
+                batch_linger_seconds=float(self._get_configuration_value(section='Executor', key='BatchLingerSeconds', default=0.0))
+            )
+        )
+
+    def process_context(self, command: str, context: str, target_identifiers: list=None, resume_run_id: str=None):
+        """
+            Processes all tasks qualifying for the command in the context, or only target_identifiers and the tasks they
+            depend on. Dependants of a failed task are SKIPPED. Set resume_run_id to continue a journaled run.
+        """
+        # First, build the processing identifier object
+        processing_target_identifier = build_command_identifier(command=command, context=context)
 
-                target_task_processor_id = '{}:{}'.format(task.kind, task.version)
-                if target_task_processor_id in self.task_processor_register:
-                    target_task_processor_executor_id = self.task_processor_register[target_task_processor_id]
-                    if target_task_processor_executor_id in self.task_processors_executors:
-                        target_task_processor_executor = self.task_processors_executors[target_task_processor_executor_id]
-                        if isinstance(target_task_processor_executor, TaskProcessor):                            
-                            self.key_value_store = target_task_processor_executor.task_pre_processing_check(task=task, command=command, context=context, key_value_store=self.key_value_store, call_process_task_if_check_pass=True, state_persistence=self.state_persistence)
-
-                            self.key_value_store = self.key_value_store = self.hooks.process_hook(
-                                command=command,
-                                context=context,
-                                task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_COMPLETED,
-                                key_value_store=self.key_value_store,
-                                task=task,
-                                task_id=task_id,
-                                logger=self.logger
-                            )
-
-                            self.key_value_store = self.key_value_store = self.hooks.process_hook(
-                                command=command,
-                                context=context,
-                                task_life_cycle_stage=TaskLifecycleStage.TASK_PROCESSING_PRE_START,
-                                key_value_store=self.key_value_store,
-                                task=task,
-                                task_id=task_id,
-                                logger=self.logger
-                            )
-                            
-                            self.state_persistence.persist_all_state()
-
-                            self.key_value_store = self.key_value_store = self.hooks.process_hook(
-                                command=command,
-                                context=context,
-                                task_life_cycle_stage=TaskLifecycleStage.TASK_PROCESSING_POST_DONE,
-                                key_value_store=self.key_value_store,
-                                task=task,
-                                task_id=task_id,
-                                logger=self.logger
-                            )
+        # Determine the order based on task dependencies
+        plan = self.plan_dependency_graph(processing_target_identifier=processing_target_identifier, target_identifiers=target_identifiers)
+        self._prepare_incremental_run(plan=plan, command=command, context=context)
+        self._reset_failure_tracking()
+        self._prepare_run_journal(plan=plan, command=command, context=context, resume_run_id=resume_run_id)
 
+        # Process tasks in order, with the available task processor registered for this task kind and version
+        try:
+            execution_mode = self._get_configuration_value(section='Executor', key='Mode', default='Serial')
+            if self.shared_thread_pool is not None:
+                self._process_plan_with_thread_pool(plan=plan, command=command, context=context, pool=self.shared_thread_pool)
+            elif execution_mode == 'Serial':
+                self._process_plan_serially(plan=plan, command=command, context=context)
+            elif execution_mode == 'ThreadPool':
+                self._process_plan_with_thread_pool(plan=plan, command=command, context=context)
+            elif execution_mode == 'ProcessPool':
+                self._process_plan_with_process_pool(plan=plan, command=command, context=context)
+            else:
+                raise Exception('Executor mode "{}" is not supported'.format(execution_mode))
+            self._raise_if_run_failed(command=command, context=context)
+        finally:
+            self._close_run_journal()
+            self._flush_state()
+
+    def _build_context_runner(self, pool: concurrent.futures.ThreadPoolExecutor, worker_slots: TaskWorkerSlots)->object:
+        """
+            Returns a new Tasks object that processes one context of process_contexts() in the given pool once it got one
+            of the worker_slots. It shares the registered tasks, task processors, hooks and configuration, which are
+            not changed while processing, as well as the thread safe state persistence and result cache. Everything a
+            run changes is its own, and merged back by _merge_context_runners().
+        """
+        runner = Tasks.__new__(Tasks)
+        runner.logger = self.logger
+        runner.tasks = self.tasks
+        runner.task_processors_executors = self.task_processors_executors
+        runner.task_processor_register = self.task_processor_register
+        runner.task_registration_sequence = self.task_registration_sequence
+        runner.task_name_index = self.task_name_index
+        runner.task_label_index = self.task_label_index
+        runner.dependency_graph = self.dependency_graph
+        runner.hooks = self.hooks
+        runner.configuration = self.configuration
+        runner.state_persistence = self.state_persistence
+        runner.task_run_history = self.task_run_history
+        runner.result_cache = self.result_cache
+        runner.key_value_store = KeyValueStore()
+        runner.key_value_store.store = self.key_value_store.store.snapshot()
+        runner.task_upstream_digests = dict()
+        runner.unchanged_task_ids = dict()
+        runner.task_output_deltas = dict()
+        runner.run_statistics = dict()
+        runner.failed_task_ids = dict()
+        runner.skipped_task_ids = dict()
+        runner.run_id = None
+        runner.run_journal = None
+        runner.resumed_task_ids = dict()
+        runner.shared_thread_pool = pool
+        runner.worker_slots = worker_slots
+        runner.context_key_value_stores = dict()
+        runner.tasks_since_state_flush = 0
+        runner.last_state_flush = time.monotonic()
+        return runner
+
+    def _merge_context_runners(self, runners: dict, max_workers: int, elapsed_seconds: float):
+        """
+            Keeps the store of every context, and the combined outcome and statistics of all their runs.
+        """
+        self.context_key_value_stores = dict()
+        self.unchanged_task_ids = dict()
+        self.failed_task_ids = dict()
+        self.skipped_task_ids = dict()
+        busy_seconds = 0.0
+        abandoned_tasks = 0
+        for context, runner in runners.items():
+            self.context_key_value_stores[context] = runner.key_value_store
+            self.unchanged_task_ids.update(runner.unchanged_task_ids)
+            self.failed_task_ids.update(runner.failed_task_ids)
+            self.skipped_task_ids.update(runner.skipped_task_ids)
+            busy_seconds += runner.run_statistics.get('BusySeconds', 0.0)
+            abandoned_tasks += runner.run_statistics.get('AbandonedTasks', 0)
+        worker_utilization = 0.0
+        if elapsed_seconds > 0:
+            worker_utilization = busy_seconds / (max_workers * elapsed_seconds)
+        self.run_statistics = {
+            'ElapsedSeconds': elapsed_seconds,
+            'BusySeconds': busy_seconds,
+            'MaxWorkers': max_workers,
+            'WorkerUtilization': worker_utilization,
+            'AbandonedTasks': abandoned_tasks,
+        }
+
+    def process_contexts(self, command: str, contexts: list, target_identifiers: list=None)->dict:
+        """
+            Processes the command in several contexts at the same time, sharing one pool of Executor.MaxWorkers threads, and
+            returns the KeyValueStore of every context.
+        """
+        self.build_dependency_graph()
+        max_workers = int(self._get_configuration_value(section='Executor', key='MaxWorkers', default=4))
+        errors = dict()
+        run_start = time.monotonic()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        worker_slots = TaskWorkerSlots(max_workers=max_workers)
+        runners = dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(contexts))) as coordinators:
+            futures = dict()
+            for context in contexts:
+                runners[context] = self._build_context_runner(pool=pool, worker_slots=worker_slots)
+                futures[context] = coordinators.submit(runners[context].process_context, command, context, target_identifiers)
+            for context, future in futures.items():
+                try:
+                    future.result()
+                except:
+                    errors[context] = sys.exc_info()[1]
+        self._merge_context_runners(runners=runners, max_workers=max_workers, elapsed_seconds=time.monotonic() - run_start)
+        shutdown_executor(executor=pool, wait=self.run_statistics['AbandonedTasks'] == 0)
+        if len(errors) > 0:
+            raise Exception('Processing of command "{}" failed in context(s) {}: {}'.format(command, list(errors.keys()), list(errors.values())))
+        return self.context_key_value_stores
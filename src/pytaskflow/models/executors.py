@@ -0,0 +1,109 @@
+import sys
+import time
+import asyncio
+import inspect
+import concurrent.futures
+
+
+def run_coroutine(coroutine: object)->object:
+    """
+        Runs the coroutine to completion from synchronous code. asyncio.run() fails in a thread already running an
+        event loop, so there the coroutine runs on an event loop of its own in another thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def run_steps(steps: object)->object:
+    """
+        Runs a generator of steps from synchronous code, and returns what the generator returns. Every step is a
+        callable: its result, run to completion when it is a coroutine, is sent back to the generator, and any
+        exception it raises is thrown into the generator.
+    """
+    result = None
+    error = None
+    while True:
+        try:
+            if error is None:
+                step = steps.send(result)
+            else:
+                step = steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result = None
+        error = None
+        try:
+            result = step()
+            if inspect.iscoroutine(result) is True:
+                result = run_coroutine(result)
+        except BaseException:
+            error = sys.exc_info()[1]
+
+
+async def run_steps_async(steps: object)->object:
+    """
+        Same as run_steps(), on the running event loop: async steps are awaited, and the other steps, which may
+        block, run in the default executor of the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    result = None
+    error = None
+    while True:
+        try:
+            if error is None:
+                step = steps.send(result)
+            else:
+                step = steps.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result = None
+        error = None
+        try:
+            if inspect.iscoroutinefunction(step) is True:
+                result = await step()
+            else:
+                result = await loop.run_in_executor(None, step)
+            if inspect.isawaitable(result) is True:
+                result = await result
+        except BaseException:
+            error = sys.exc_info()[1]
+
+
+def wait_for_first_completed(futures: list, timeout: float)->set:
+    """
+        Returns the futures that completed, once at least one did or the timeout passed.
+    """
+    if len(futures) == 0:
+        time.sleep(timeout)
+        return set()
+    return concurrent.futures.wait(futures, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)[0]
+
+
+async def wait_for_first_completed_async(futures: list, timeout: float)->set:
+    if len(futures) == 0:
+        await asyncio.sleep(timeout)
+        return set()
+    return (await asyncio.wait(futures, timeout=timeout, return_when=asyncio.FIRST_COMPLETED))[0]
+
+
+def shutdown_executor(executor: concurrent.futures.Executor, wait: bool=True):
+    """
+        Without waiting, tasks that did not start yet are cancelled and the caller gets control back at once. The
+        workers of a process pool are terminated, as there is no other way to stop a running task.
+    """
+    if wait is True:
+        executor.shutdown(wait=True)
+        return
+    processes = list()
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor) and executor._processes is not None:
+        processes = list(executor._processes.values())
+    if sys.version_info >= (3, 9):
+        executor.shutdown(wait=False, cancel_futures=True)
+    else:                                                   # pragma: no cover
+        executor.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
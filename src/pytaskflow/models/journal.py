@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+import pickle
+import struct
+import zlib
+
+from pytaskflow.models.logger import LoggerWrapper
+from pytaskflow.models.state_persistence import StatePersistence
+
+
+def build_task_run_journal_file_path(directory: str, run_id: str)->str:
+    return os.path.join(directory, '{}.journal'.format(run_id))
+
+
+def read_task_run_journal(file_path: str)->tuple:
+    """
+        Returns the list of records in the journal, and the length in bytes of the valid part of the file. Reading
+        stops at the first incomplete or corrupt record, which is what a crash during a write leaves behind.
+    """
+    records = list()
+    valid_length = 0
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    header_size = struct.calcsize('>II')
+    while valid_length + header_size <= len(data):
+        length, checksum = struct.unpack_from('>II', data, valid_length)
+        payload = data[valid_length + header_size:valid_length + header_size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        records.append(pickle.loads(payload))
+        valid_length += header_size + length
+    return (records, valid_length)
+
+
+class TaskRunJournal:
+
+    def __init__(self, file_path: str, group_commit_records: int=64, group_commit_seconds: float=0.5, fsync: bool=True, truncate_at: int=None, logger: LoggerWrapper=LoggerWrapper()):
+        """
+            Append-only journal of a process_context() run, with length and CRC32 framed records written in group commits.
+            To continue a journal, set truncate_at to the valid length returned by read_task_run_journal().
+        """
+        self.logger = logger
+        self.file_path = file_path
+        self.group_commit_records = group_commit_records
+        self.group_commit_seconds = group_commit_seconds
+        self.fsync = fsync
+        self.buffer = list()
+        self.oldest_buffered_record_time = None
+        self.file = open(self.file_path, 'ab')
+        if truncate_at is not None:
+            self.file.truncate(truncate_at)
+
+    def append(self, record: dict):
+        try:
+            payload = pickle.dumps(record)
+        except:
+            self.logger.warning(message='Journal record could not be serialized and was not written: {}'.format(sys.exc_info()[1]))
+            return
+        self.buffer.append(struct.pack('>II', len(payload), zlib.crc32(payload)) + payload)
+        if self.oldest_buffered_record_time is None:
+            self.oldest_buffered_record_time = time.monotonic()
+        if len(self.buffer) >= self.group_commit_records:
+            self.flush()
+        self.flush_if_due()
+
+    def flush_due_time(self)->float:
+        """
+            Returns the time.monotonic() time by which the buffered records are written, or None when none are buffered.
+        """
+        if self.oldest_buffered_record_time is None:
+            return None
+        return self.oldest_buffered_record_time + self.group_commit_seconds
+
+    def flush_if_due(self):
+        if self.oldest_buffered_record_time is not None and time.monotonic() >= self.flush_due_time():
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        self.file.write(b''.join(self.buffer))
+        self.file.flush()
+        if self.fsync is True:
+            os.fsync(self.file.fileno())
+        self.buffer = list()
+        self.oldest_buffered_record_time = None
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TaskRunHistory:
+
+    def __init__(self, state_persistence: StatePersistence, max_samples: int=10):
+        """
+            Keeps the most recent processing durations of every task, per command and context. The history is saved in
+            the state persistence under the object identifier "TASK_RUN_HISTORY:<task_id>:<command>:<context>", so it
+            survives between runs when a persistent StatePersistence implementation is used.
+        """
+        self.state_persistence = state_persistence
+        self.max_samples = max_samples
+
+    def _build_object_identifier(self, task_id: str, command: str, context: str)->str:
+        return 'TASK_RUN_HISTORY:{}:{}:{}'.format(task_id, command, context)
+
+    def record_duration(self, task_id: str, command: str, context: str, seconds: float):
+        object_identifier = self._build_object_identifier(task_id=task_id, command=command, context=context)
+        history = self.state_persistence.get_object_state(object_identifier=object_identifier)
+        durations = history.get('Durations', list())
+        durations.append(float(seconds))
+        durations = durations[-self.max_samples:]
+        self.state_persistence.save_object_state(
+            object_identifier=object_identifier,
+            data={'Durations': durations, 'AverageDuration': sum(durations) / len(durations)}
+        )
+
+    def get_average_duration(self, task_id: str, command: str, context: str)->float:
+        """
+            Returns the average of the recorded durations in seconds, or None when the task has no history.
+        """
+        history = self.state_persistence.get_object_state(object_identifier=self._build_object_identifier(task_id=task_id, command=command, context=context))
+        if 'AverageDuration' in history:
+            return history['AverageDuration']
+        return None
@@ -0,0 +1,832 @@
+import os
+import copy
+import mmap
+import tempfile
+import threading
+import heapq
+import itertools
+import weakref
+from collections.abc import Mapping, MutableMapping
+
+
+class _StoreMapping(MutableMapping):
+
+    """
+        Base of the store mappings, which keep their items in their own structures. They are not a dict: use
+        dict(mapping) where one is required, for example for json.dumps().
+    """
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __or__(self, other: object)->dict:
+        if isinstance(other, Mapping) is False:
+            return NotImplemented
+        merged = dict(self)
+        merged.update(other)
+        return merged
+
+    def __ror__(self, other: object)->dict:
+        if isinstance(other, Mapping) is False:
+            return NotImplemented
+        merged = dict(other)
+        merged.update(self)
+        return merged
+
+    def __ior__(self, other: object)->object:
+        self.update(other)
+        return self
+
+
+class _CopyOnWriteNode:
+
+    __slots__ = ('owner', 'items')
+
+    def __init__(self, owner: object, items: object):
+        self.owner = owner
+        self.items = items
+
+
+class CopyOnWriteMapping(_StoreMapping):
+
+    FAN_OUT_BITS = 6
+    FAN_OUT = 1 << FAN_OUT_BITS
+    COPIED_ON_READ_TYPES = (dict, list, set, bytearray)
+
+    def __init__(self, data: dict=None, copy_on_read: bool=False, sequence: object=None):
+        """
+            A dict-like mapping of which snapshot() takes a copy without copying the items. Keys are spread over a
+            fixed tree of 4096 buckets shared with the snapshots. The first write to a shared node after a snapshot
+            copies the nodes on the path to its key: two lists of 64 entries and the bucket, which holds about
+            len(mapping) / 4096 items.
+
+            Values are shared with the snapshots, so they must be treated as immutable: save a new value instead of
+            changing one in place. With copy_on_read, a dict, list, set or bytearray value is deep-copied the first
+            time it is read after a snapshot, and snapshot() deep-copies those read or set since the previous one, so
+            that changing them in place never changes a snapshot.
+
+            Added keys are numbered by sequence, an itertools.count() shared with the snapshots (and, given one, with
+            other mappings), which keeps their insertion order.
+        """
+        if sequence is None:
+            sequence = itertools.count(1)
+        self.copy_on_read = copy_on_read
+        self._owner = object()
+        self._root = _CopyOnWriteNode(owner=self._owner, items=[None] * self.FAN_OUT)
+        self._length = 0
+        self._sequence = sequence
+        self._order_chunks = None       # (tuple of (sequence, key), older chunks), shared with the snapshots
+        self._order_tail = list()       # (sequence, key) of the keys added since the last snapshot
+        if data is not None:
+            for key, value in data.items():
+                self[key] = value
+
+    def _bucket(self, key: object)->dict:
+        key_hash = hash(key)
+        branch = self._root.items[key_hash & (self.FAN_OUT - 1)]
+        if branch is None:
+            return None
+        bucket = branch.items[(key_hash >> self.FAN_OUT_BITS) & (self.FAN_OUT - 1)]
+        if bucket is None:
+            return None
+        return bucket.items
+
+    def _writable_bucket(self, key: object)->dict:
+        key_hash = hash(key)
+        if self._root.owner is not self._owner:
+            self._root = _CopyOnWriteNode(owner=self._owner, items=list(self._root.items))
+        branch_index = key_hash & (self.FAN_OUT - 1)
+        branch = self._root.items[branch_index]
+        if branch is None:
+            branch = _CopyOnWriteNode(owner=self._owner, items=[None] * self.FAN_OUT)
+            self._root.items[branch_index] = branch
+        elif branch.owner is not self._owner:
+            branch = _CopyOnWriteNode(owner=self._owner, items=list(branch.items))
+            self._root.items[branch_index] = branch
+        bucket_index = (key_hash >> self.FAN_OUT_BITS) & (self.FAN_OUT - 1)
+        bucket = branch.items[bucket_index]
+        if bucket is None:
+            bucket = _CopyOnWriteNode(owner=self._owner, items=dict())
+            branch.items[bucket_index] = bucket
+        elif bucket.owner is not self._owner:
+            bucket = _CopyOnWriteNode(owner=self._owner, items=dict(bucket.items))
+            branch.items[bucket_index] = bucket
+        return bucket.items
+
+    def _is_copied_on_read(self, value: object)->bool:
+        return isinstance(value, self.COPIED_ON_READ_TYPES)
+
+    def _copy_value(self, value: object)->object:
+        return copy.deepcopy(value)
+
+    def _read(self, key: object, item: tuple)->object:
+        value = item[1]
+        if self.copy_on_read is True and item[2] is not self._owner and self._is_copied_on_read(value) is True:
+            value = self._copy_value(value)
+            self._writable_bucket(key)[key] = (item[0], value, self._owner)
+        return value
+
+    def __getitem__(self, key: object)->object:
+        bucket = self._bucket(key)
+        if bucket is None:
+            raise KeyError(key)
+        return self._read(key, bucket[key])
+
+    def __contains__(self, key: object)->bool:
+        bucket = self._bucket(key)
+        return bucket is not None and key in bucket
+
+    def get(self, key: object, default: object=None)->object:
+        bucket = self._bucket(key)
+        if bucket is None or key not in bucket:
+            return default
+        return self._read(key, bucket[key])
+
+    def get_shared(self, key: object, default: object=None)->object:
+        """
+            Like get(), but never copies the value, even with copy_on_read. Do not change it.
+        """
+        bucket = self._bucket(key)
+        if bucket is None or key not in bucket:
+            return default
+        return bucket[key][1]
+
+    def __setitem__(self, key: object, value: object):
+        bucket = self._writable_bucket(key)
+        if key in bucket:
+            bucket[key] = (bucket[key][0], value, self._owner)
+            return
+        self._length += 1
+        sequence = next(self._sequence)
+        bucket[key] = (sequence, value, self._owner)
+        self._order_tail.append((sequence, key))
+
+    def __delitem__(self, key: object):
+        if key not in self:
+            raise KeyError(key)
+        del self._writable_bucket(key)[key]
+        self._length -= 1
+
+    def __iter__(self):
+        for sequence, key in self.sequenced_keys():
+            yield key
+
+    def sequenced_keys(self)->list:
+        """
+            Returns the (sequence, key) of every key in insertion order. The order is kept in chunks shared with the
+            snapshots, which still hold the keys deleted since the last call: it costs O(len(mapping) + deleted keys).
+        """
+        chunks = [self._order_tail,]
+        node = self._order_chunks
+        while node is not None:
+            chunks.append(node[0])
+            node = node[1]
+        sequenced_keys = list()
+        for chunk in reversed(chunks):
+            for sequence, key in chunk:
+                bucket = self._bucket(key)
+                if bucket is not None and key in bucket and bucket[key][0] == sequence:
+                    sequenced_keys.append((sequence, key))
+        self._order_chunks = (tuple(sequenced_keys), None)
+        self._order_tail = list()
+        return sequenced_keys
+
+    def __len__(self)->int:
+        return self._length
+
+    def clear(self):
+        self._root = _CopyOnWriteNode(owner=self._owner, items=[None] * self.FAN_OUT)
+        self._length = 0
+        self._order_chunks = None
+        self._order_tail = list()
+
+    def _shared_items(self)->dict:
+        return dict([(key, self.get_shared(key)) for key in self])
+
+    def __repr__(self)->str:
+        return repr(self._shared_items())
+
+    def __reduce__(self)->tuple:
+        return (CopyOnWriteMapping, (self._shared_items(), self.copy_on_read))
+
+    def snapshot(self)->object:
+        if len(self._order_tail) > 0:
+            self._order_chunks = (tuple(self._order_tail), self._order_chunks)
+            self._order_tail = list()
+        copied = object.__new__(type(self))
+        copied.__dict__.update(self.__dict__)
+        copied._owner = object()
+        copied._order_tail = list()
+        owner = self._owner
+        self._owner = object()      # From now on, the shared nodes are copied before being changed
+        if self.copy_on_read is True:
+            for key, item in self._referenced_items(owner=owner):
+                self._writable_bucket(key)[key] = (item[0], item[1], self._owner)
+                copied._writable_bucket(key)[key] = (item[0], self._copy_value(item[1]), copied._owner)
+        return copied
+
+    def _referenced_items(self, owner: object)->list:
+        """
+            Returns the items holding a dict, list, set or bytearray value that owner set or read, which are only in
+            the nodes owner wrote.
+        """
+        items = list()
+        if self._root.owner is not owner:
+            return items
+        for branch in self._root.items:
+            if branch is not None and branch.owner is owner:
+                for bucket in branch.items:
+                    if bucket is not None and bucket.owner is owner:
+                        for key, item in bucket.items.items():
+                            if item[2] is owner and self._is_copied_on_read(item[1]) is True:
+                                items.append((key, item))
+        return items
+
+    __copy__ = snapshot
+    copy = snapshot
+
+    def changed_buckets(self, other: object)->list:
+        """
+            Returns the (other bucket, own bucket) pairs of the buckets that are not shared with the other mapping,
+            which hold every key that may differ. Comparing snapshots of the same mapping therefore only looks at the
+            buckets written since. Buckets map keys to (insertion sequence, value, owner) tuples.
+        """
+        changed = list()
+        if self._root is other._root:
+            return changed
+        for branch_index in range(0, self.FAN_OUT):
+            own_branch = self._root.items[branch_index]
+            other_branch = other._root.items[branch_index]
+            if own_branch is other_branch:
+                continue
+            for bucket_index in range(0, self.FAN_OUT):
+                own_bucket = None
+                other_bucket = None
+                if own_branch is not None:
+                    own_bucket = own_branch.items[bucket_index]
+                if other_branch is not None:
+                    other_bucket = other_branch.items[bucket_index]
+                if own_bucket is other_bucket:
+                    continue
+                changed.append((dict() if other_bucket is None else other_bucket.items, dict() if own_bucket is None else own_bucket.items))
+        return changed
+
+
+class ShardedMapping(_StoreMapping):
+
+    def __init__(self, data: dict=None, shard_count: int=64, copy_on_read: bool=False):
+        """
+            A dict-like mapping that takes concurrent writes from many threads: keys are spread over shard_count
+            CopyOnWriteMapping shards, each guarded by its own lock. The shards number their keys from one shared
+            sequence, so iteration and deltas keep the insertion order across shards.
+
+            snapshot() and iteration hold one shard lock at a time: they only see a consistent state of the whole
+            mapping when no other thread writes meanwhile, as in the executors, which take snapshots between tasks.
+        """
+        self.shard_count = shard_count
+        self.copy_on_read = copy_on_read
+        sequence = itertools.count(1)
+        self.shards = [CopyOnWriteMapping(copy_on_read=copy_on_read, sequence=sequence) for i in range(0, shard_count)]
+        self.locks = [threading.Lock() for i in range(0, shard_count)]
+        if data is not None:
+            for key, value in data.items():
+                self[key] = value
+
+    def _shard_index(self, key: object)->int:
+        return hash(key) % self.shard_count
+
+    def __getitem__(self, key: object)->object:
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            return self.shards[shard_index][key]
+
+    def __contains__(self, key: object)->bool:
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            return key in self.shards[shard_index]
+
+    def get(self, key: object, default: object=None)->object:
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            return self.shards[shard_index].get(key, default)
+
+    def __setitem__(self, key: object, value: object):
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            self.shards[shard_index][key] = value
+
+    def __delitem__(self, key: object):
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            del self.shards[shard_index][key]
+
+    def compare_and_set(self, key: object, expected: object, value: object, expect_missing: bool=False)->bool:
+        """
+            Atomically sets the key to value when its current value equals expected (or, with expect_missing, when the
+            key does not exist). Returns True when the value was set.
+        """
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            shard = self.shards[shard_index]
+            if expect_missing is True:
+                if key in shard:
+                    return False
+            elif key not in shard or shard[key] != expected:
+                return False
+            shard[key] = value
+            return True
+
+    def __iter__(self):
+        shard_sequenced_keys = list()
+        for shard_index in range(0, self.shard_count):
+            with self.locks[shard_index]:
+                shard_sequenced_keys.append(self.shards[shard_index].sequenced_keys())
+        for sequence, key in heapq.merge(*shard_sequenced_keys):
+            yield key
+
+    def __len__(self)->int:
+        return sum([len(shard) for shard in self.shards])
+
+    def get_shared(self, key: object, default: object=None)->object:
+        shard_index = self._shard_index(key)
+        with self.locks[shard_index]:
+            return self.shards[shard_index].get_shared(key, default)
+
+    def _shared_items(self)->dict:
+        return dict([(key, self.get_shared(key)) for key in self])
+
+    def __repr__(self)->str:
+        return repr(self._shared_items())
+
+    def __reduce__(self)->tuple:
+        return (ShardedMapping, (self._shared_items(), self.shard_count, self.copy_on_read))
+
+    def clear(self):
+        for shard_index in range(0, self.shard_count):
+            with self.locks[shard_index]:
+                self.shards[shard_index].clear()
+
+    def snapshot(self)->object:
+        copied = ShardedMapping(shard_count=self.shard_count, copy_on_read=self.copy_on_read)
+        for shard_index in range(0, self.shard_count):
+            with self.locks[shard_index]:
+                copied.shards[shard_index] = self.shards[shard_index].snapshot()
+        return copied
+
+    __copy__ = snapshot
+    copy = snapshot
+
+    def changed_buckets(self, other: object)->list:
+        """
+            See CopyOnWriteMapping.changed_buckets().
+        """
+        if other.shard_count != self.shard_count:
+            return [(dict([(key, (0, value, None)) for key, value in other.items()]), dict([(key, (0, value, None)) for key, value in self.items()])),]
+        changed = list()
+        for shard_index in range(0, self.shard_count):
+            changed += self.shards[shard_index].changed_buckets(other=other.shards[shard_index])
+        return changed
+
+
+def _remove_spilled_blob_file(file: object, file_path: str):
+    file.close()
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+class SpilledBlobFile:
+
+    def __init__(self, directory: str=None):
+        """
+            Append-only file holding values spilled from a SpillingMapping, read back through a read-only memory map.
+            Space of values that are overwritten or deleted is not reclaimed until the file is closed, which also
+            removes it. The file is closed once nothing references it any more.
+        """
+        file_descriptor, self.file_path = tempfile.mkstemp(prefix='pytaskflow-', suffix='.blobs', dir=directory)
+        os.close(file_descriptor)
+        self.file = open(self.file_path, 'a+b')
+        self.size = 0
+        self.mapping = None
+        self.lock = threading.Lock()
+        self.finalizer = weakref.finalize(self, _remove_spilled_blob_file, self.file, self.file_path)
+
+    def append(self, data: bytes)->int:
+        """
+            Appends the data and returns its offset in the file.
+        """
+        with self.lock:
+            offset = self.size
+            self.file.write(data)
+            self.file.flush()
+            self.size += len(data)
+            return offset
+
+    def read(self, offset: int, length: int)->memoryview:
+        """
+            Returns a read-only memoryview of the data, without copying it.
+        """
+        if length == 0:
+            return memoryview(b'')
+        with self.lock:
+            if self.mapping is None or len(self.mapping) < offset + length:
+                # Views handed out earlier keep the previous map alive, so it is not closed here
+                self.mapping = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+            mapping = self.mapping
+        return memoryview(mapping)[offset:offset + length]
+
+    def close(self):
+        with self.lock:
+            self.mapping = None
+            self.finalizer()
+
+
+class SpilledValue:
+
+    __slots__ = ('blob_file', 'offset', 'length', 'is_text')
+
+    def __init__(self, blob_file: SpilledBlobFile, offset: int, length: int, is_text: bool):
+        self.blob_file = blob_file
+        self.offset = offset
+        self.length = length
+        self.is_text = is_text
+
+    def view(self)->memoryview:
+        return self.blob_file.read(offset=self.offset, length=self.length)
+
+    def load(self)->object:
+        if self.is_text is True:
+            return str(self.view(), 'utf-8')
+        return self.view()
+
+    def __reduce__(self)->tuple:
+        if self.is_text is True:
+            return (str, (bytes(self.view()), 'utf-8'))
+        return (bytes, (bytes(self.view()),))
+
+
+class SpillingMemoryAccount:
+
+    def __init__(self, max_memory_bytes: int=268435456):
+        """
+            Counts the bytes of the values kept in memory by a SpillingMapping and all its snapshots. A value shared by
+            several snapshots is counted once, until the last of them drops it (see InMemoryValue).
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.lock = threading.RLock()
+
+    def reserve(self, size: int)->bool:
+        """
+            Counts size more bytes and returns True, unless that would exceed max_memory_bytes.
+        """
+        with self.lock:
+            if self.memory_bytes + size > self.max_memory_bytes:
+                return False
+            self.memory_bytes += size
+            return True
+
+    def add(self, size: int):
+        with self.lock:
+            self.memory_bytes += size
+
+    def release(self, size: int):
+        with self.lock:
+            self.memory_bytes -= size
+
+
+class InMemoryValue:
+
+    __slots__ = ('value', 'size', 'memory_account')
+
+    def __init__(self, value: object, size: int, memory_account: SpillingMemoryAccount):
+        self.value = value
+        self.size = size
+        self.memory_account = memory_account
+
+    def copy(self)->object:
+        self.memory_account.add(size=self.size)
+        return InMemoryValue(value=copy.deepcopy(self.value), size=self.size, memory_account=self.memory_account)
+
+    def __del__(self):
+        self.memory_account.release(size=self.size)
+
+
+class SpillingMapping(CopyOnWriteMapping):
+
+    def __init__(self, data: dict=None, blob_file: SpilledBlobFile=None, spill_threshold_bytes: int=65536, max_memory_bytes: int=268435456, memory_account: SpillingMemoryAccount=None, copy_on_read: bool=False):
+        """
+            A CopyOnWriteMapping that keeps bytes, bytearray and str values larger than spill_threshold_bytes in the blob
+            file, as well as smaller ones once the values in memory add up to max_memory_bytes (shared by all snapshots).
+            Spilled bytes are read back as a read-only memoryview.
+        """
+        if blob_file is None:
+            blob_file = SpilledBlobFile()
+        if memory_account is None:
+            memory_account = SpillingMemoryAccount(max_memory_bytes=max_memory_bytes)
+        self.blob_file = blob_file
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.memory_account = memory_account
+        super().__init__(data=data, copy_on_read=copy_on_read)
+
+    @property
+    def max_memory_bytes(self)->int:
+        return self.memory_account.max_memory_bytes
+
+    @property
+    def memory_bytes(self)->int:
+        return self.memory_account.memory_bytes
+
+    def _is_copied_on_read(self, value: object)->bool:
+        if isinstance(value, InMemoryValue):
+            value = value.value
+        return super()._is_copied_on_read(value)
+
+    def _copy_value(self, value: object)->object:
+        if isinstance(value, InMemoryValue):
+            return value.copy()
+        return super()._copy_value(value)
+
+    def _read(self, key: object, item: tuple)->object:
+        value = super()._read(key, item)
+        if isinstance(value, SpilledValue):
+            return value.load()
+        if isinstance(value, InMemoryValue):
+            return value.value
+        return value
+
+    def get_shared(self, key: object, default: object=None)->object:
+        value = super().get_shared(key, default)
+        if isinstance(value, InMemoryValue):
+            return value.value
+        return value
+
+    def __setitem__(self, key: object, value: object):
+        data = None
+        if isinstance(value, (bytes, bytearray)):
+            data = value
+        elif isinstance(value, str):
+            data = value.encode('utf-8')
+        if data is not None and len(data) > 0:
+            if len(data) <= self.spill_threshold_bytes and self.memory_account.reserve(size=len(data)) is True:
+                value = InMemoryValue(value=value, size=len(data), memory_account=self.memory_account)
+            else:
+                value = SpilledValue(blob_file=self.blob_file, offset=self.blob_file.append(data=data), length=len(data), is_text=isinstance(value, str))
+        super().__setitem__(key, value)
+
+    def view(self, key: object)->memoryview:
+        if key not in self:
+            raise KeyError(key)
+        value = CopyOnWriteMapping.get_shared(self, key)
+        if isinstance(value, SpilledValue):
+            return value.view()
+        value = value.value
+        if isinstance(value, str):
+            return memoryview(value.encode('utf-8'))
+        return memoryview(value)
+
+    def __repr__(self)->str:
+        return repr(dict(self))
+
+    def __reduce__(self)->tuple:
+        return (CopyOnWriteMapping, (self._shared_items(), self.copy_on_read))
+
+
+class KeyValueStore:
+
+    def __init__(self, copy_on_read: bool=False):
+        """
+            With copy_on_read, nested values changed in place are isolated from the snapshots and versions of the
+            store as well, at the cost of copying them (see CopyOnWriteMapping). Otherwise, treat values as immutable.
+        """
+        self.copy_on_read = copy_on_read
+        self.store = CopyOnWriteMapping(copy_on_read=copy_on_read)
+        self.versions = dict()      # version number -> snapshot of the store, see create_version()
+        self.version_sequence = 0
+
+    @property
+    def store(self)->CopyOnWriteMapping:
+        return self._store
+
+    @store.setter
+    def store(self, store: dict):
+        if isinstance(store, (CopyOnWriteMapping, ShardedMapping)) is False:
+            store = CopyOnWriteMapping(data=store, copy_on_read=self.copy_on_read)
+        self._store = store
+
+    def save(self, key: str, value: object):
+        self.store[key] = value
+
+    def compare_and_set(self, key: str, expected: object, value: object, expect_missing: bool=False)->bool:
+        """
+            Sets the key to value when its current value equals expected (or, with expect_missing, when the key does
+            not exist) and returns True, otherwise returns False. Only a ShardedKeyValueStore does this atomically.
+        """
+        if isinstance(self.store, ShardedMapping):
+            return self.store.compare_and_set(key=key, expected=expected, value=value, expect_missing=expect_missing)
+        if expect_missing is True:
+            if key in self.store:
+                return False
+        elif key not in self.store or self.store[key] != expected:
+            return False
+        self.store[key] = value
+        return True
+
+    def namespace(self, name: str)->object:
+        """
+            Returns a view of the keys starting with "<name>:", for example the keys of one task.
+        """
+        return KeyValueStoreNamespace(key_value_store=self, name=name)
+
+    def snapshot(self)->object:
+        """
+            Returns a KeyValueStore with a snapshot of the store. Taking it does not copy the items, but the first
+            writes to either store after it copy the tree nodes they change (see CopyOnWriteMapping).
+        """
+        key_value_store = copy.copy(self)
+        key_value_store.store = self.store.snapshot()
+        key_value_store.versions = dict()
+        return key_value_store
+
+    def create_version(self)->int:
+        """
+            Keeps a snapshot of the store and returns its version number. Every bucket of the store written after it
+            is copied once while the version is kept, so it costs up to a few copies of the written buckets and their
+            64 entry branch lists, not only the changed values. Nested values changed in place are only rolled back
+            with copy_on_read (see CopyOnWriteMapping). Call release_version() when it is no longer needed.
+        """
+        self.version_sequence += 1
+        self.versions[self.version_sequence] = self.store.snapshot()
+        return self.version_sequence
+
+    def rollback(self, version: int):
+        """
+            Restores the store as it was when the version was created. The version remains available.
+        """
+        self.store = self.versions[version].snapshot()
+
+    def diff(self, from_version: int, to_version: int=None)->object:
+        """
+            Returns the changes between two versions, or between a version and the current store. Only the parts of
+            the store written in between are compared.
+        """
+        after = self.store
+        if to_version is not None:
+            after = self.versions[to_version]
+        return build_key_value_store_delta(before=self.versions[from_version], after=after)
+
+    def release_version(self, version: int):
+        self.versions.pop(version, None)
+
+
+class ShardedKeyValueStore(KeyValueStore):
+
+    def __init__(self, shard_count: int=64, copy_on_read: bool=False):
+        """
+            A KeyValueStore that can be written by many threads at the same time, see ShardedMapping. Use it when
+            task processors or hooks share the store between their own threads.
+        """
+        self.shard_count = shard_count
+        super().__init__(copy_on_read=copy_on_read)
+
+    @property
+    def store(self)->ShardedMapping:
+        return self._store
+
+    @store.setter
+    def store(self, store: dict):
+        if isinstance(store, ShardedMapping) is False:
+            store = ShardedMapping(data=store, shard_count=self.shard_count, copy_on_read=self.copy_on_read)
+        self._store = store
+
+
+class SpillingKeyValueStore(KeyValueStore):
+
+    def __init__(self, spill_threshold_bytes: int=65536, max_memory_bytes: int=268435456, directory: str=None, copy_on_read: bool=False):
+        """
+            A KeyValueStore that keeps large bytes and str values in a blob file in directory (by default the
+            temporary directory), see SpillingMapping. Call close() to remove the blob file.
+        """
+        self.blob_file = SpilledBlobFile(directory=directory)
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.memory_account = SpillingMemoryAccount(max_memory_bytes=max_memory_bytes)
+        super().__init__(copy_on_read=copy_on_read)
+
+    @property
+    def store(self)->SpillingMapping:
+        return self._store
+
+    @store.setter
+    def store(self, store: dict):
+        if isinstance(store, SpillingMapping) is False:
+            store = SpillingMapping(data=store, blob_file=self.blob_file, spill_threshold_bytes=self.spill_threshold_bytes, memory_account=self.memory_account, copy_on_read=self.copy_on_read)
+        self._store = store
+
+    def close(self):
+        self.blob_file.close()
+
+
+class KeyValueStoreNamespace(MutableMapping):
+
+    def __init__(self, key_value_store: KeyValueStore, name: str):
+        self.key_value_store = key_value_store
+        self.prefix = '{}:'.format(name)
+
+    def __getitem__(self, key: str)->object:
+        return self.key_value_store.store[self.prefix + key]
+
+    def __setitem__(self, key: str, value: object):
+        self.key_value_store.store[self.prefix + key] = value
+
+    def __delitem__(self, key: str):
+        del self.key_value_store.store[self.prefix + key]
+
+    def __iter__(self):
+        for key in self.key_value_store.store:
+            if isinstance(key, str) and key.startswith(self.prefix):
+                yield key[len(self.prefix):]
+
+    def __len__(self)->int:
+        return len(list(iter(self)))
+
+    def save(self, key: str, value: object):
+        self[key] = value
+
+    def compare_and_set(self, key: str, expected: object, value: object, expect_missing: bool=False)->bool:
+        return self.key_value_store.compare_and_set(key=self.prefix + key, expected=expected, value=value, expect_missing=expect_missing)
+
+
+class KeyValueStoreDelta:
+
+    def __init__(self):
+        self.set_values = dict()
+        self.deleted_keys = dict()  # Ordered set
+
+    def set(self, key: str, value: object):
+        self.deleted_keys.pop(key, None)
+        self.set_values[key] = value
+
+    def delete(self, key: str):
+        self.set_values.pop(key, None)
+        self.deleted_keys[key] = True
+
+    def is_empty(self)->bool:
+        if len(self.set_values) > 0 or len(self.deleted_keys) > 0:
+            return False
+        return True
+
+    def apply(self, key_value_store: KeyValueStore)->KeyValueStore:
+        for key in self.deleted_keys:
+            key_value_store.store.pop(key, None)
+        for key, value in self.set_values.items():
+            key_value_store.store[key] = value
+        return key_value_store
+
+
+def merge_key_value_store_result(key_value_store: KeyValueStore, result: object)->KeyValueStore:
+    """
+        Merges what a hook function or a task processor returned into the store it was given. The result may be the
+        store itself, another KeyValueStore replacing it, a KeyValueStoreDelta with only the keys set or deleted, or
+        None when nothing changed.
+    """
+    if result is None or result is key_value_store:
+        return key_value_store
+    if isinstance(result, KeyValueStoreDelta):
+        return result.apply(key_value_store=key_value_store)
+    if isinstance(result, KeyValueStore):
+        key_value_store.store = result.store.snapshot()
+    return key_value_store
+
+
+def build_key_value_store_delta(before: dict, after: dict)->KeyValueStoreDelta:
+    """
+        When after is a snapshot of before (see CopyOnWriteMapping), only the buckets written since are compared.
+    """
+    delta = KeyValueStoreDelta()
+    if type(before) is type(after) and isinstance(after, (CopyOnWriteMapping, ShardedMapping)):
+        compared = after.changed_buckets(other=before)
+    else:
+        compared = [(dict([(key, (0, value, None)) for key, value in before.items()]), dict([(key, (0, value, None)) for key, value in after.items()])),]
+    changes = list()
+    for before_items, after_items in compared:
+        for key, (sequence, value, owner) in after_items.items():
+            if isinstance(value, InMemoryValue):
+                value = value.value
+            if key not in before_items:
+                changes.append((sequence, key, value))
+                continue
+            before_value = before_items[key][1]
+            if isinstance(before_value, InMemoryValue):
+                before_value = before_value.value
+            if before_value is not value:
+                try:
+                    if before_value != value:
+                        changes.append((sequence, key, value))
+                except:     # pragma: no cover
+                    changes.append((sequence, key, value))
+        for key in before_items:
+            if key not in after_items:
+                delta.delete(key=key)
+    changes.sort(key=lambda x: x[0])    # Keys added by the delta keep their insertion order
+    for sequence, key, value in changes:
+        delta.set(key=key, value=value)
+    return delta
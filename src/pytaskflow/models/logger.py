@@ -0,0 +1,23 @@
+class LoggerWrapper:    # pragma: no cover
+
+    def __init__(self):
+        pass
+
+    def info(self, message: str):
+        if isinstance(message, str):
+            print(message)
+
+    def warn(self, message: str):
+        self.info(message=message)
+
+    def warning(self, message: str):
+        self.info(message=message)
+
+    def debug(self, message: str):
+        self.info(message=message)
+
+    def critical(self, message: str):
+        self.info(message=message)
+
+    def error(self, message: str):
+        self.info(message=message)
@@ -0,0 +1,397 @@
+import threading
+import heapq
+import concurrent.futures
+
+
+def parse_resource_quantity(value: object)->float:
+    """
+        Converts a resource quantity like 2, "0.5", "512M", "2G" or "2Gi" to a number. The suffixes K, M, G and T (with
+        or without a trailing "i") are multiples of 1024.
+    """
+    if isinstance(value, bool) is False and isinstance(value, (int, float)) is True:
+        return float(value)
+    multipliers = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+    quantity = '{}'.format(value).strip().upper()
+    if quantity.endswith('I'):
+        quantity = quantity[:-1]
+    multiplier = 1
+    if len(quantity) > 0 and quantity[-1] in multipliers:
+        multiplier = multipliers[quantity[-1]]
+        quantity = quantity[:-1]
+    try:
+        return float(quantity) * multiplier
+    except:
+        raise Exception('Resource quantity "{}" is not valid'.format(value))
+
+
+class TaskDependencyGraph:
+
+    def __init__(self):
+        self.nodes = dict()         # node_id -> insertion sequence, used for stable ordering
+        self.requires = dict()      # node_id -> ordered set (dict) of node_ids that must complete first
+        self.required_by = dict()   # node_id -> ordered set (dict) of node_ids waiting on node_id
+        self.missing_dependencies = dict()  # node_id -> list of ManifestName dependencies that could not be resolved
+        self.group_nodes = dict()   # node_id -> True, for virtual Label selector nodes
+        self.edges_removed_by_reduction = 0
+
+    def add_node(self, node_id: str):
+        if node_id not in self.nodes:
+            self.nodes[node_id] = len(self.nodes)
+            self.requires[node_id] = dict()
+            self.required_by[node_id] = dict()
+
+    def add_edge(self, node_id: str, required_node_id: str):
+        if node_id == required_node_id:
+            return
+        self.add_node(node_id=node_id)
+        self.add_node(node_id=required_node_id)
+        self.requires[node_id][required_node_id] = True
+        self.required_by[required_node_id][node_id] = True
+
+    def remove_edge(self, node_id: str, required_node_id: str):
+        self.requires[node_id].pop(required_node_id, None)
+        self.required_by[required_node_id].pop(node_id, None)
+
+    def edge_count(self)->int:
+        return sum([len(required) for required in self.requires.values()])
+
+    def add_group_node(self, node_id: str, required_node_ids: list):
+        """
+            A group node is a virtual node standing in for a Label selector. The group node requires every task
+            matching the selector and dependants point at the group node, so N dependants on M matching tasks need
+            N + M edges instead of N * M edges. Group nodes are never processed - they complete as soon as the last
+            task they require completes.
+        """
+        self.add_node(node_id=node_id)
+        self.group_nodes[node_id] = True
+        for required_node_id in required_node_ids:
+            self.add_edge(node_id=node_id, required_node_id=required_node_id)
+
+    def is_group_node(self, node_id: str)->bool:
+        return node_id in self.group_nodes
+
+    def topological_order(self, include_group_nodes: bool=False)->list:
+        """
+            Kahn's algorithm. Nodes that become ready at the same time are ordered by their insertion sequence, so the
+            order is stable for the same set of registered tasks.
+        """
+        order = list()
+        for wave in self.waves(include_group_nodes=include_group_nodes):
+            order += wave
+        return order
+
+    def waves(self, include_group_nodes: bool=False)->list:
+        """
+            Returns a list of waves, where each wave is a list of nodes whose requirements are all satisfied by the
+            nodes in the previous waves. Nodes in the same wave are independent of each other. Group nodes resolve in
+            the same wave as the last node they require.
+        """
+        remaining = dict()
+        current_wave = list()
+        for node_id in self.nodes:
+            remaining[node_id] = len(self.requires[node_id])
+            if remaining[node_id] == 0:
+                current_wave.append(node_id)
+        waves = list()
+        processed_count = 0
+        while len(current_wave) > 0:
+            wave = list()
+            next_wave = list()
+            index = 0
+            while index < len(current_wave):    # current_wave grows while group nodes resolve
+                node_id = current_wave[index]
+                index += 1
+                processed_count += 1
+                if include_group_nodes is True or node_id not in self.group_nodes:
+                    wave.append(node_id)
+                for waiting_node_id in self.required_by[node_id]:
+                    remaining[waiting_node_id] -= 1
+                    if remaining[waiting_node_id] == 0:
+                        if waiting_node_id in self.group_nodes:
+                            current_wave.append(waiting_node_id)
+                        else:
+                            next_wave.append(waiting_node_id)
+            if len(wave) > 0:
+                waves.append(wave)
+            next_wave.sort(key=lambda x: self.nodes[x])
+            current_wave = next_wave
+        if processed_count != len(self.nodes):
+            cycle_nodes = [node_id for node_id, count in remaining.items() if count > 0]
+            raise Exception('Circular dependency detected between tasks: {}'.format(cycle_nodes))
+        return waves
+
+    def transitive_dependants(self, node_ids: list)->list:
+        """
+            Returns the nodes that directly or indirectly require any of node_ids, in insertion sequence, without group
+            nodes.
+        """
+        found = dict()
+        pending = list(node_ids)
+        while len(pending) > 0:
+            node_id = pending.pop()
+            for waiting_node_id in self.required_by[node_id]:
+                if waiting_node_id not in found:
+                    found[waiting_node_id] = True
+                    pending.append(waiting_node_id)
+        return sorted([node_id for node_id in found if node_id not in self.group_nodes], key=lambda x: self.nodes[x])
+
+    def task_requirements(self, node_id: str)->list:
+        """
+            Returns the task nodes required by node_id, looking through any group nodes.
+        """
+        task_node_ids = dict()
+        pending = list(self.requires[node_id].keys())
+        while len(pending) > 0:
+            required_node_id = pending.pop(0)
+            if required_node_id in self.group_nodes:
+                pending += list(self.requires[required_node_id].keys())
+            else:
+                task_node_ids[required_node_id] = True
+        return list(task_node_ids.keys())
+
+    def critical_path_lengths(self, node_weights: dict)->dict:
+        """
+            Returns, for every node, the total weight of the heaviest chain of nodes starting at the node and following
+            its dependants, including the node itself. Nodes without a weight, like group nodes, weigh nothing.
+        """
+        lengths = dict()
+        for node_id in reversed(self.topological_order(include_group_nodes=True)):
+            longest_dependant_path = 0.0
+            for waiting_node_id in self.required_by[node_id]:
+                if lengths[waiting_node_id] > longest_dependant_path:
+                    longest_dependant_path = lengths[waiting_node_id]
+            lengths[node_id] = node_weights.get(node_id, 0.0) + longest_dependant_path
+        return lengths
+
+    def subgraph(self, node_ids: list)->object:
+        selected = dict.fromkeys(node_ids)
+        graph = TaskDependencyGraph()
+        for node_id in sorted(selected, key=lambda x: self.nodes[x]):
+            graph.add_node(node_id=node_id)
+            if node_id in self.group_nodes:
+                graph.group_nodes[node_id] = True
+            if node_id in self.missing_dependencies:
+                graph.missing_dependencies[node_id] = self.missing_dependencies[node_id]
+        for node_id in graph.nodes:
+            for required_node_id in self.requires[node_id]:
+                if required_node_id in selected:
+                    graph.add_edge(node_id=node_id, required_node_id=required_node_id)
+        return graph
+
+    def reversed(self)->object:
+        """
+            Returns a view of this graph with every edge pointing the other way, for teardown commands where dependants
+            must be processed before the tasks they depend on. The view shares the edge maps with this graph, so no
+            dependencies are resolved again and the cost is O(1). Do not modify either graph while the view is in use.
+        """
+        graph = TaskDependencyGraph()
+        graph.nodes = self.nodes
+        graph.requires = self.required_by
+        graph.required_by = self.requires
+        graph.missing_dependencies = self.missing_dependencies
+        graph.group_nodes = self.group_nodes
+        graph.edges_removed_by_reduction = self.edges_removed_by_reduction
+        return graph
+
+    def transitive_reduction(self)->int:
+        """
+            Removes every edge A -> C for which C is also reachable from A through another requirement of A, and returns
+            the number of edges removed.
+        """
+        bit = dict()
+        for node_id, sequence in self.nodes.items():
+            bit[node_id] = 1 << sequence
+        reachable = dict()
+        removed = 0
+        for node_id in self.topological_order(include_group_nodes=True):
+            reachable_through_requirements = 0
+            for required_node_id in self.requires[node_id]:
+                reachable_through_requirements |= reachable[required_node_id]
+            for required_node_id in list(self.requires[node_id]):
+                if reachable_through_requirements & bit[required_node_id]:
+                    self.remove_edge(node_id=node_id, required_node_id=required_node_id)
+                    removed += 1
+            node_reachable = reachable_through_requirements
+            for required_node_id in self.requires[node_id]:
+                node_reachable |= bit[required_node_id]
+            reachable[node_id] = node_reachable
+        self.edges_removed_by_reduction += removed
+        return removed
+
+
+class TaskReadyQueue:
+
+    def __init__(self, plan: TaskDependencyGraph, resource_capacities: dict=dict(), task_resource_requirements: dict=dict(), task_priorities: dict=dict(), wave_barrier: bool=False):
+        """
+            Tracks how many requirements of every planned node are still outstanding, and releases a task to the ready queue
+            when its last requirement completes. Ready tasks are returned by task_priorities, then in plan sequence, and only
+            when their resource requirements fit in resource_capacities. wave_barrier is only meant for comparison.
+        """
+        self.plan = plan
+        self.task_priorities = task_priorities
+        self.remaining = dict()
+        self.ready = list()
+        self.completed_count = 0
+        self.resource_capacities = dict()
+        for resource_name, capacity in resource_capacities.items():
+            self.resource_capacities[resource_name.lower()] = parse_resource_quantity(value=capacity)
+        self.resources_available = dict(self.resource_capacities)
+        self.task_resource_requirements = dict()
+        for task_id, requirements in task_resource_requirements.items():
+            if task_id not in plan.nodes:
+                continue
+            self.task_resource_requirements[task_id] = dict()
+            for resource_name, quantity in requirements.items():
+                resource_name = resource_name.lower()
+                if resource_name in self.resource_capacities:
+                    if quantity > self.resource_capacities[resource_name]:
+                        raise Exception('Task "{}" requires {} of resource "{}", but the configured capacity is only {}'.format(task_id, quantity, resource_name, self.resource_capacities[resource_name]))
+                    self.task_resource_requirements[task_id][resource_name] = quantity
+        self.waves = None
+        if wave_barrier is True:
+            self.waves = plan.waves()
+            self.wave_index = 0
+            self.wave_remaining = 0
+            self.completed_count = len(plan.group_nodes)
+            self._release_next_wave()
+            return
+        for node_id in plan.nodes:
+            self.remaining[node_id] = len(plan.requires[node_id])
+        for node_id in plan.nodes:
+            if self.remaining[node_id] == 0:
+                self._release(node_id=node_id)
+
+    def _release_next_wave(self):
+        while self.wave_remaining == 0 and self.wave_index < len(self.waves):
+            for node_id in self.waves[self.wave_index]:
+                self._release(node_id=node_id)
+            self.wave_remaining = len(self.waves[self.wave_index])
+            self.wave_index += 1
+
+    def _release(self, node_id: str):
+        if self.plan.is_group_node(node_id=node_id) is True:
+            self.complete(node_id=node_id)
+        else:
+            self.resume(task_id=node_id)
+
+    def _resources_fit(self, task_id: str)->bool:
+        if task_id not in self.task_resource_requirements:
+            return True
+        for resource_name, quantity in self.task_resource_requirements[task_id].items():
+            if quantity > self.resources_available[resource_name]:
+                return False
+        return True
+
+    def has_ready_tasks(self)->bool:
+        return len(self.ready) > 0
+
+    def pop(self)->str:
+        """
+            Returns the next ready task for which enough resources are available, or None.
+        """
+        skipped = list()
+        task_id = None
+        while len(self.ready) > 0:
+            entry = heapq.heappop(self.ready)
+            if self._resources_fit(task_id=entry[2]) is True:
+                task_id = entry[2]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self.ready, entry)
+        if task_id is not None and task_id in self.task_resource_requirements:
+            for resource_name, quantity in self.task_resource_requirements[task_id].items():
+                self.resources_available[resource_name] -= quantity
+        return task_id
+
+    def _release_resources(self, task_id: str):
+        if task_id in self.task_resource_requirements:
+            for resource_name, quantity in self.task_resource_requirements[task_id].items():
+                self.resources_available[resource_name] += quantity
+
+    def suspend(self, task_id: str):
+        """
+            Releases the resources held by a popped task that will be processed again later. Call resume() when the
+            task must be returned by pop() again.
+        """
+        self._release_resources(task_id=task_id)
+
+    def resume(self, task_id: str):
+        heapq.heappush(self.ready, (-self.task_priorities.get(task_id, 0), self.plan.nodes[task_id], task_id))
+
+    def complete(self, node_id: str):
+        self.completed_count += 1
+        self._release_resources(task_id=node_id)
+        if self.waves is not None:
+            self.wave_remaining -= 1
+            self._release_next_wave()
+            return
+        for waiting_node_id in self.plan.required_by[node_id]:
+            self.remaining[waiting_node_id] -= 1
+            if self.remaining[waiting_node_id] == 0:
+                self._release(node_id=waiting_node_id)
+
+    def pending_count(self)->int:
+        return len(self.plan.nodes) - self.completed_count
+
+
+class TaskWorkerSlots:
+
+    def __init__(self, max_workers: int):
+        """
+            A budget of worker slots shared by the runs of Tasks.process_contexts(). A free slot goes to the waiting run with
+            the highest priority.
+        """
+        self.lock = threading.Lock()
+        self.available = max_workers
+        self.waiting = dict()       # run token -> (priority, wake-up future)
+
+    def acquire(self, token: object, priority: float)->bool:
+        with self.lock:
+            for waiting_token, (waiting_priority, wake_up_future) in self.waiting.items():
+                if waiting_token is not token and waiting_priority > priority:
+                    self._wait(token=token, priority=priority)
+                    return False
+            if self.available == 0:
+                self._wait(token=token, priority=priority)
+                return False
+            self.available -= 1
+            self.waiting.pop(token, None)
+            self._wake_up_waiting_runs()
+            return True
+
+    def _wait(self, token: object, priority: float):
+        wake_up_future = concurrent.futures.Future()
+        if token in self.waiting and self.waiting[token][1].done() is False:
+            wake_up_future = self.waiting[token][1]
+        self.waiting[token] = (priority, wake_up_future)
+
+    def _wake_up_waiting_runs(self):
+        if self.available == 0:
+            return
+        for priority, wake_up_future in self.waiting.values():
+            if wake_up_future.done() is False:
+                wake_up_future.set_result(True)
+
+    def wake_up_future(self, token: object)->concurrent.futures.Future:
+        """
+            Returns the future that is resolved when the waiting run should try to acquire a slot again, or None when
+            the run is not waiting.
+        """
+        with self.lock:
+            if token not in self.waiting:
+                return None
+            return self.waiting[token][1]
+
+    def withdraw(self, token: object):
+        """
+            Called by a run that has no ready task left, so that it no longer holds back runs with a lower priority.
+        """
+        with self.lock:
+            if self.waiting.pop(token, None) is not None:
+                self._wake_up_waiting_runs()
+
+    def release(self):
+        with self.lock:
+            self.available += 1
+            self._wake_up_waiting_runs()
@@ -0,0 +1,81 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from pytaskflow.models.logger import LoggerWrapper
+from pytaskflow.models.key_value_store import KeyValueStoreDelta
+
+
+class TaskResultCache:
+
+    def __init__(self, max_memory_entries: int=1024, directory: str=None, max_disk_entries: int=10000, logger: LoggerWrapper=LoggerWrapper()):
+        """
+            Keeps the KeyValueStoreDelta produced by task processors, keyed by build_task_result_cache_key(). Recently
+            used results are kept in memory. When a directory is given, results are also written to disk, one pickle
+            file per result, so they survive between runs. Both tiers evict the least recently used results first.
+        """
+        self.logger = logger
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.directory = directory
+        self.memory_entries = OrderedDict()
+        self.disk_entries = OrderedDict()
+        self.lock = threading.Lock()
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            file_names = [file_name for file_name in os.listdir(self.directory) if file_name.endswith('.pickle')]
+            for file_name in sorted(file_names, key=lambda x: os.path.getmtime(os.path.join(self.directory, x))):
+                self.disk_entries[file_name[:-len('.pickle')]] = True
+
+    def _build_file_path(self, key: str)->str:
+        return os.path.join(self.directory, '{}.pickle'.format(key))
+
+    def _remember_in_memory(self, key: str, delta: KeyValueStoreDelta):
+        self.memory_entries[key] = delta
+        self.memory_entries.move_to_end(key)
+        while len(self.memory_entries) > self.max_memory_entries:
+            self.memory_entries.popitem(last=False)
+
+    def get(self, key: str)->KeyValueStoreDelta:
+        """
+            Returns the cached delta, or None.
+        """
+        with self.lock:
+            if key in self.memory_entries:
+                self.memory_entries.move_to_end(key)
+                return self.memory_entries[key]
+            if key not in self.disk_entries:
+                return None
+            try:
+                with open(self._build_file_path(key=key), 'rb') as f:
+                    delta = pickle.load(f)
+                os.utime(self._build_file_path(key=key))
+            except:     # pragma: no cover
+                self.disk_entries.pop(key, None)
+                return None
+            self.disk_entries.move_to_end(key)
+            self._remember_in_memory(key=key, delta=delta)
+            return delta
+
+    def put(self, key: str, delta: KeyValueStoreDelta):
+        with self.lock:
+            self._remember_in_memory(key=key, delta=delta)
+            if self.directory is None:
+                return
+            temporary_file_path = '{}.tmp'.format(self._build_file_path(key=key))
+            try:
+                with open(temporary_file_path, 'wb') as f:
+                    pickle.dump(delta, f)
+                os.replace(temporary_file_path, self._build_file_path(key=key))
+            except:
+                self.logger.warning(message='Result "{}" could not be written to the result cache directory - keeping it in memory only'.format(key))
+                if os.path.exists(temporary_file_path) is True:
+                    os.remove(temporary_file_path)
+                return
+            self.disk_entries[key] = True
+            self.disk_entries.move_to_end(key)
+            while len(self.disk_entries) > self.max_disk_entries:
+                evicted_key, ignored = self.disk_entries.popitem(last=False)
+                if os.path.exists(self._build_file_path(key=evicted_key)) is True:
+                    os.remove(self._build_file_path(key=evicted_key))
@@ -0,0 +1,255 @@
+import copy
+import pickle
+import sqlite3
+import threading
+
+from pytaskflow.models.logger import LoggerWrapper
+
+
+class StatePersistence:
+
+    def __init__(self, logger: LoggerWrapper=LoggerWrapper(), configuration: dict=dict()):
+        """
+            save_object_state() records which objects changed, and persist_all_state() passes only those to
+            persist_object_states(). Implementations for long term state storage override
+            retrieve_all_state_from_persistence() and persist_object_states(). Both may be called from several threads.
+        """
+        self.logger = logger
+        self.dirty_object_identifiers = dict()     # Ordered set of the objects saved since the last persist_all_state()
+        self.dirty_lock = threading.Lock()         # Guards dirty_object_identifiers
+        self.persist_lock = threading.RLock()      # Held by persist_all_state(), so that an older object state is never written after a newer one
+        self.state_cache = self.retrieve_all_state_from_persistence()
+        self.configuration = configuration
+
+    def retrieve_all_state_from_persistence(self)->dict:
+        self.logger.warning(message='StatePersistence.retrieve_all_state_from_persistence() NOT IMPLEMENTED. Override this function in your own class for long term state storage.')
+        return dict()
+
+    def get_object_state(self, object_identifier: str)->dict:
+        if object_identifier in self.state_cache:
+            return copy.deepcopy(self.state_cache[object_identifier])
+        return dict()
+
+    def save_object_state(self, object_identifier: str, data: dict):
+        data = copy.deepcopy(data)
+        with self.dirty_lock:
+            self.state_cache[object_identifier] = data
+            self.dirty_object_identifiers[object_identifier] = True
+
+    def persist_all_state(self):
+        with self.persist_lock:
+            with self.dirty_lock:
+                dirty_object_identifiers = self.dirty_object_identifiers
+                self.dirty_object_identifiers = dict()
+                object_states = dict()
+                for object_identifier in dirty_object_identifiers:
+                    object_states[object_identifier] = self.state_cache[object_identifier]
+            if len(object_states) == 0:
+                return
+            try:
+                self.persist_object_states(object_states=object_states)
+            except:
+                with self.dirty_lock:
+                    for object_identifier in dirty_object_identifiers:
+                        self.dirty_object_identifiers[object_identifier] = True
+                raise
+
+    def persist_object_states(self, object_states: dict):
+        """
+            Writes the objects changed since the previous call, given as object_identifier -> data.
+        """
+        self.logger.warning(message='StatePersistence.persist_all_state() NOT IMPLEMENTED. Override this function in your own class for long term state storage.')
+
+    def wait_until_durable(self, timeout: float=None):
+        """
+            Returns once everything persisted so far is durable. persist_all_state() is synchronous here, so there is
+            nothing to wait for.
+        """
+        pass
+
+
+class SqliteStatePersistence(StatePersistence):
+
+    def __init__(self, database_path: str, logger: LoggerWrapper=LoggerWrapper(), configuration: dict=dict(), batch_size: int=1000, synchronous: str='NORMAL'):
+        """
+            State persistence in a SQLite database in WAL mode, with one pickled row per object. Objects are read lazily
+            and written in batches of batch_size. Call close() to write the remaining objects.
+        """
+        self.database_path = database_path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(database_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous={}'.format(synchronous))
+        self.connection.execute('CREATE TABLE IF NOT EXISTS object_states (object_identifier TEXT PRIMARY KEY, data BLOB NOT NULL)')
+        super().__init__(logger=logger, configuration=configuration)
+
+    def retrieve_all_state_from_persistence(self)->dict:
+        return dict()   # Objects are read when first needed
+
+    def get_object_state(self, object_identifier: str)->dict:
+        with self.persist_lock:
+            if object_identifier not in self.state_cache:
+                row = self.connection.execute('SELECT data FROM object_states WHERE object_identifier = ?', (object_identifier,)).fetchone()
+                if row is None:
+                    return dict()
+                self.state_cache[object_identifier] = pickle.loads(row[0])
+            return copy.deepcopy(self.state_cache[object_identifier])
+
+    def save_object_state(self, object_identifier: str, data: dict):
+        with self.persist_lock:
+            super().save_object_state(object_identifier=object_identifier, data=data)
+            if len(self.dirty_object_identifiers) >= self.batch_size:
+                self.persist_all_state()
+
+    def persist_all_state(self):
+        with self.persist_lock:
+            super().persist_all_state()
+
+    def persist_object_states(self, object_states: dict):
+        rows = [(object_identifier, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)) for object_identifier, data in object_states.items()]
+        self.connection.execute('BEGIN')
+        try:
+            self.connection.executemany('INSERT OR REPLACE INTO object_states (object_identifier, data) VALUES (?, ?)', rows)
+            self.connection.execute('COMMIT')
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        with self.persist_lock:
+            self.persist_all_state()
+            self.connection.close()
+
+
+class BackgroundStatePersistence(StatePersistence):
+
+    def __init__(self, state_persistence: StatePersistence, group_commit_objects: int=1000, group_commit_seconds: float=0.05, logger: LoggerWrapper=LoggerWrapper(), configuration: dict=dict()):
+        """
+            Moves the writes of another StatePersistence to a background thread, which commits the saved objects in groups.
+            wait_until_durable() returns once everything saved before the call is committed. close() does not close the
+            wrapped state_persistence.
+        """
+        self.state_persistence = state_persistence
+        self.group_commit_objects = group_commit_objects
+        self.group_commit_seconds = group_commit_seconds
+        self.condition = threading.Condition()
+        self.queued_object_states = dict()      # object_identifier -> data, waiting for the writer
+        self.committing_object_states = dict()  # object_identifier -> data, being committed by the writer
+        self.saved_sequence = 0                 # Number of save_object_state() calls
+        self.durable_sequence = 0               # Number of save_object_state() calls committed
+        self.commit_requested = False
+        self.commit_error = None
+        self.closed = False
+        super().__init__(logger=logger, configuration=configuration)
+        self.writer_thread = threading.Thread(target=self._write_object_states, name='BackgroundStatePersistence', daemon=True)
+        self.writer_thread.start()
+
+    def retrieve_all_state_from_persistence(self)->dict:
+        return dict()   # Reads are passed to the wrapped state persistence
+
+    def get_object_state(self, object_identifier: str)->dict:
+        with self.condition:
+            for object_states in (self.queued_object_states, self.committing_object_states):
+                if object_identifier in object_states:
+                    return copy.deepcopy(object_states[object_identifier])
+        return self.state_persistence.get_object_state(object_identifier=object_identifier)
+
+    def save_object_state(self, object_identifier: str, data: dict):
+        data = copy.deepcopy(data)
+        with self.condition:
+            if self.closed is True:
+                raise Exception('BackgroundStatePersistence is closed')
+            self.queued_object_states[object_identifier] = data
+            self.saved_sequence += 1
+            if len(self.queued_object_states) >= self.group_commit_objects:
+                self.condition.notify_all()
+
+    def persist_all_state(self):
+        with self.condition:
+            self.commit_requested = True
+            self.condition.notify_all()
+
+    def wait_until_durable(self, timeout: float=None):
+        with self.condition:
+            target_sequence = self.saved_sequence
+            if self.durable_sequence >= target_sequence:
+                return
+            self.commit_error = None
+            self.commit_requested = True
+            self.condition.notify_all()
+            if self.condition.wait_for(lambda: self.durable_sequence >= target_sequence or self.commit_error is not None, timeout=timeout) is False:
+                raise TimeoutError('State not durable after {} seconds'.format(timeout))
+            if self.durable_sequence < target_sequence:
+                raise self.commit_error
+
+    def _commit_wanted(self)->bool:
+        return self.closed is True or self.commit_requested is True or len(self.queued_object_states) >= self.group_commit_objects
+
+    def _write_object_states(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(self._commit_wanted, timeout=self.group_commit_seconds)
+                if len(self.queued_object_states) == 0:
+                    self.commit_requested = False
+                    self.durable_sequence = self.saved_sequence
+                    self.condition.notify_all()
+                    if self.closed is True:
+                        return
+                    continue
+                self.committing_object_states = self.queued_object_states
+                self.queued_object_states = dict()
+                self.commit_requested = False
+                target_sequence = self.saved_sequence
+            try:
+                for object_identifier, data in self.committing_object_states.items():
+                    self.state_persistence.save_object_state(object_identifier=object_identifier, data=data)
+                self.state_persistence.persist_all_state()
+                self.state_persistence.wait_until_durable()
+                commit_error = None
+            except Exception as e:
+                self.logger.error(message='State commit failed, retrying: {}'.format(e))
+                commit_error = e
+            with self.condition:
+                if commit_error is None:
+                    self.durable_sequence = target_sequence
+                else:
+                    for object_identifier, data in self.committing_object_states.items():
+                        if object_identifier not in self.queued_object_states:
+                            self.queued_object_states[object_identifier] = data
+                    self.commit_error = commit_error
+                self.committing_object_states = dict()
+                self.condition.notify_all()
+                if commit_error is not None:
+                    if self.closed is True:
+                        return
+                    self.condition.wait(timeout=self.group_commit_seconds)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.writer_thread.join()
+        if len(self.queued_object_states) > 0:
+            self.logger.error(message='BackgroundStatePersistence closed with {} objects not committed'.format(len(self.queued_object_states)))
+
+
+class ProcessPoolWorkerStatePersistence(StatePersistence):
+
+    def __init__(self, object_states: dict=dict(), logger: LoggerWrapper=LoggerWrapper()):
+        """
+            State persistence inside a process pool worker. It holds only the state shipped with the task, and records
+            every saved object so that the parent process can persist it.
+        """
+        self.saved_object_states = dict()
+        self.object_states = object_states
+        super().__init__(logger=logger, configuration=dict())
+
+    def retrieve_all_state_from_persistence(self)->dict:
+        return copy.deepcopy(self.object_states)
+
+    def save_object_state(self, object_identifier: str, data: dict):
+        super().save_object_state(object_identifier=object_identifier, data=data)
+        self.saved_object_states[object_identifier] = copy.deepcopy(data)
+
+    def persist_all_state(self):
+        pass
@@ -5,6 +5,15 @@ sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src")
 print('sys.path={}'.format(sys.path))
 
 import unittest
+import time
+import asyncio
+import tempfile
+import pickle
+import threading
+import sqlite3
+import gc
+import json
+from collections.abc import MutableMapping
 
 from pytaskflow.models.Task import *
 
@@ -535,7 +544,7 @@ class TestClassTaskProcessor(unittest.TestCase):    # pragma: no cover
         self.assertIsNotNone(key_value_store)
         self.assertIsInstance(key_value_store, KeyValueStore)
         self.assertIsNotNone(key_value_store.store)
-        self.assertIsInstance(key_value_store.store, dict)
+        self.assertIsInstance(key_value_store.store, MutableMapping)
         self.assertEqual(len(key_value_store.store), 1)
         self.assertTrue('Processor1:Processed:{}:Success'.format(t1.task_id) in key_value_store.store)
         self.assertTrue(key_value_store.store['Processor1:Processed:{}:Success'.format(t1.task_id)], 'key_value_store.store={}'.format(key_value_store.store))
@@ -579,7 +588,7 @@ class TestClassTaskProcessor(unittest.TestCase):    # pragma: no cover
         self.assertIsNotNone(key_value_store)
         self.assertIsInstance(key_value_store, KeyValueStore)
         self.assertIsNotNone(key_value_store.store)
-        self.assertIsInstance(key_value_store.store, dict)
+        self.assertIsInstance(key_value_store.store, MutableMapping)
         self.assertEqual(len(key_value_store.store), 1)
         self.assertTrue('Processor1:Processed:{}:Success'.format(t1.task_id) in key_value_store.store)
         self.assertFalse(key_value_store.store['Processor1:Processed:{}:Success'.format(t1.task_id)])
@@ -624,7 +633,7 @@ class TestClassTaskProcessor(unittest.TestCase):    # pragma: no cover
         self.assertIsNotNone(key_value_store)
         self.assertIsInstance(key_value_store, KeyValueStore)
         self.assertIsNotNone(key_value_store.store)
-        self.assertIsInstance(key_value_store.store, dict)
+        self.assertIsInstance(key_value_store.store, MutableMapping)
         self.assertEqual(len(key_value_store.store), 1)
         self.assertTrue(expected_key in key_value_store.store)
         self.assertEqual(key_value_store.store[expected_key], 1)
@@ -666,7 +675,7 @@ class TestClassTaskProcessor(unittest.TestCase):    # pragma: no cover
         self.assertIsNotNone(key_value_store)
         self.assertIsInstance(key_value_store, KeyValueStore)
         self.assertIsNotNone(key_value_store.store)
-        self.assertIsInstance(key_value_store.store, dict)
+        self.assertIsInstance(key_value_store.store, MutableMapping)
         self.assertEqual(len(key_value_store.store), 2)
         self.assertTrue(expected_key in key_value_store.store)
         self.assertEqual(key_value_store.store[expected_key], 2, 'key_value_store={}'.format(key_value_store.store))
@@ -677,7 +686,7 @@ class TestClassTaskProcessor(unittest.TestCase):    # pragma: no cover
         self.assertIsNotNone(key_value_store)
         self.assertIsInstance(key_value_store, KeyValueStore)
         self.assertIsNotNone(key_value_store.store)
-        self.assertIsInstance(key_value_store.store, dict)
+        self.assertIsInstance(key_value_store.store, MutableMapping)
         self.assertEqual(len(key_value_store.store), 2)
         self.assertTrue(expected_key in key_value_store.store)
         self.assertEqual(key_value_store.store[expected_key], 2, 'key_value_store={}'.format(key_value_store.store))
@@ -2355,6 +2364,2263 @@ class TestFunctionBuildContextualIdentifiers(unittest.TestCase):    # pragma: no
             self.assertTrue(identifier.is_contextual_identifier)
 
 
+
+def build_task_metadata(name: str, labels: dict=dict(), name_dependencies: list=list(), label_dependencies: list=list(), environments: list=['c1', 'c2'])->dict:
+    metadata = {
+        "identifiers": [
+            {
+                "type": "ManifestName",
+                "key": name
+            },
+        ],
+        "contextualIdentifiers": [
+            {
+                "type": "ExecutionScope",
+                "key": "INCLUDE",
+                "contexts": [
+                    {
+                        "type": "Environment",
+                        "names": environments
+                    }
+                ]
+            }
+        ],
+        "dependencies": []
+    }
+    for label_key, label_value in labels.items():
+        metadata['identifiers'].append({"type": "Label", "key": label_key, "value": label_value})
+    if len(name_dependencies) > 0:
+        metadata['dependencies'].append(
+            {
+                "identifierType": "ManifestName",
+                "identifiers": [{"key": dependency_name} for dependency_name in name_dependencies]
+            }
+        )
+    if len(label_dependencies) > 0:
+        metadata['dependencies'].append(
+            {
+                "identifierType": "Label",
+                "identifiers": [{"key": label_key, "value": label_value} for label_key, label_value in label_dependencies]
+            }
+        )
+    return metadata
+
+
+def build_hooks(function_impl: object, name: str='hook1')->Hooks:
+    hooks = Hooks()
+    hooks.register_hook(hook=Hook(name=name, commands=['command1',], contexts=['c1',], task_life_cycle_stages=TaskLifecycleStages(), function_impl=function_impl, logger=TestLogger()))
+    return hooks
+
+
+def build_tasks(processors: list, task_definitions: list, configuration: dict=None, hooks: Hooks=None, state_persistence: StatePersistence=None, key_value_store: KeyValueStore=None)->Tasks:
+    """
+        Each task definition is a (kind, spec, metadata) tuple.
+    """
+    if configuration is None:
+        configuration = dict()
+    if hooks is None:
+        hooks = Hooks()
+    if state_persistence is None:
+        state_persistence = StatePersistence(logger=TestLogger())
+    if key_value_store is None:
+        key_value_store = KeyValueStore()
+    tasks = Tasks(logger=TestLogger(), key_value_store=key_value_store, hooks=hooks, state_persistence=state_persistence, configuration=configuration)
+    for processor in processors:
+        tasks.register_task_processor(processor=processor)
+    for kind, spec, metadata in task_definitions:
+        tasks.add_task(task=Task(kind=kind, version='v1', spec=spec, metadata=metadata, logger=tasks.logger))
+    return tasks
+
+
+class TestClassTaskDependencyGraph(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def test_topological_order_and_waves_1(self):
+        graph = TaskDependencyGraph()
+        graph.add_edge(node_id='a', required_node_id='b')
+        graph.add_edge(node_id='b', required_node_id='c')
+        graph.add_node(node_id='d')
+        self.assertEqual(graph.topological_order(), ['c', 'd', 'b', 'a'])
+        self.assertEqual(graph.waves(), [['c', 'd'], ['b'], ['a']])
+
+    def test_circular_dependency_throws_exception_1(self):
+        graph = TaskDependencyGraph()
+        graph.add_edge(node_id='a', required_node_id='b')
+        graph.add_edge(node_id='b', required_node_id='a')
+        with self.assertRaises(Exception):
+            graph.topological_order()
+
+    def test_transitive_reduction_1(self):
+        graph = TaskDependencyGraph()
+        graph.add_edge(node_id='a', required_node_id='b')
+        graph.add_edge(node_id='a', required_node_id='c')
+        graph.add_edge(node_id='b', required_node_id='c')
+        graph.add_edge(node_id='a', required_node_id='d')
+        graph.add_edge(node_id='c', required_node_id='d')
+        self.assertEqual(graph.edge_count(), 5)
+        removed = graph.transitive_reduction()
+        self.assertEqual(removed, 2)
+        self.assertEqual(graph.edge_count(), 3)
+        self.assertEqual(graph.edges_removed_by_reduction, 2)
+        self.assertEqual(list(graph.requires['a'].keys()), ['b'])
+        self.assertEqual(graph.topological_order(), ['d', 'c', 'b', 'a'])
+
+
+class TestClassTasksPlanner(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict=dict())->Tasks:
+        return build_tasks(
+            processors=[Processor1(),],
+            task_definitions=[
+                ('Processor1', {}, build_task_metadata(name='app', name_dependencies=['db', 'base'])),
+                ('Processor1', {}, build_task_metadata(name='db', label_dependencies=[('tier', 'base')])),
+                ('Processor1', {}, build_task_metadata(name='base', labels={'tier': 'base'})),
+            ],
+            configuration=configuration
+        )
+
+    def test_order_respects_transitive_dependencies_1(self):
+        tasks = self._build_tasks()
+        order = tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+        self.assertEqual(order, ['base', 'db', 'app'])
+        self.assertEqual(tasks.build_dependency_graph().edge_count(), 3)
+
+    def test_planner_transitive_reduction_1(self):
+        tasks = self._build_tasks(configuration={'Planner': {'TransitiveReduction': True}})
+        order = tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+        self.assertEqual(order, ['base', 'db', 'app'])
+        graph = tasks.build_dependency_graph()
+        self.assertEqual(graph.edge_count(), 2)
+        self.assertEqual(graph.edges_removed_by_reduction, 1)
+        self.assertTrue('[LOG] INFO: Transitive reduction removed 1 of 3 dependency edges' in tasks.logger.info_lines)
+
+    def test_dependency_graph_cache_reset_on_add_task_1(self):
+        tasks = self._build_tasks()
+        graph = tasks.build_dependency_graph()
+        self.assertIs(graph, tasks.build_dependency_graph())
+        tasks.add_task(task=Task(kind='Processor1', version='v1', spec={}, metadata=build_task_metadata(name='extra', label_dependencies=[('tier', 'base')]), logger=tasks.logger))
+        self.assertIsNot(graph, tasks.build_dependency_graph())
+        self.assertEqual(len(tasks.build_dependency_graph().nodes), 4)
+
+
+class TestClassTasksPlannerLabelGroupNodes(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict=dict())->Tasks:
+        task_definitions = [('Processor1', {}, build_task_metadata(name=name, label_dependencies=[('tier', 'db')])) for name in ('app1', 'app2')]
+        task_definitions += [('Processor1', {}, build_task_metadata(name=name, labels={'tier': 'db'})) for name in ('db1', 'db2', 'db3')]
+        return build_tasks(processors=[Processor1(),], task_definitions=task_definitions, configuration=configuration)
+
+    def test_label_group_node_reduces_edges_1(self):
+        tasks = self._build_tasks()
+        graph = tasks.build_dependency_graph()
+        self.assertTrue(graph.is_group_node(node_id='LABEL_GROUP:tier:db'))
+        self.assertEqual(graph.edge_count(), 5)
+        self.assertEqual(graph.task_requirements(node_id='app1'), ['db1', 'db2', 'db3'])
+        order = tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+        self.assertEqual(order, ['db1', 'db2', 'db3', 'app1', 'app2'])
+        plan = tasks.plan_dependency_graph(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+        self.assertEqual(plan.waves(), [['db1', 'db2', 'db3'], ['app1', 'app2']])
+        self.assertEqual(plan.waves(include_group_nodes=True), [['db1', 'db2', 'db3', 'LABEL_GROUP:tier:db'], ['app1', 'app2']])
+
+    def test_label_group_node_disabled_1(self):
+        tasks = self._build_tasks(configuration={'Planner': {'LabelGroupNodes': False}})
+        graph = tasks.build_dependency_graph()
+        self.assertEqual(len(graph.group_nodes), 0)
+        self.assertEqual(graph.edge_count(), 6)
+
+    def test_label_group_node_not_used_when_task_matches_own_selector_1(self):
+        tasks = self._build_tasks()
+        tasks.add_task(task=Task(kind='Processor1', version='v1', spec={}, metadata=build_task_metadata(name='db4', labels={'tier': 'db'}, label_dependencies=[('tier', 'db')]), logger=tasks.logger))
+        order = tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+        self.assertEqual(order.index('db4'), 3)
+        self.assertEqual(len(order), 6)
+
+    def test_label_group_node_member_out_of_scope_throws_exception_1(self):
+        tasks = self._build_tasks()
+        tasks.add_task(task=Task(kind='Processor1', version='v1', spec={}, metadata=build_task_metadata(name='db4', labels={'tier': 'db'}, environments=['c2',]), logger=tasks.logger))
+        with self.assertRaises(Exception):
+            tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+
+
+class TestClassTasksTargetedPlanning(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self)->Tasks:
+        return build_tasks(
+            processors=[Processor1(),],
+            task_definitions=[
+                ('Processor1', {}, build_task_metadata(name='unrelated')),
+                ('Processor1', {}, build_task_metadata(name='app', name_dependencies=['db'])),
+                ('Processor1', {}, build_task_metadata(name='db', label_dependencies=[('tier', 'base')])),
+                ('Processor1', {}, build_task_metadata(name='base1', labels={'tier': 'base'})),
+                ('Processor1', {}, build_task_metadata(name='base2', labels={'tier': 'base'})),
+                ('Processor1', {}, build_task_metadata(name='other', labels={'tier': 'other'}, environments=['c2',])),
+            ]
+        )
+
+    def test_targeted_order_by_name_1(self):
+        tasks = self._build_tasks()
+        order = tasks.calculate_current_task_order(
+            processing_target_identifier=build_command_identifier(command='command1', context='c1'),
+            target_identifiers=[Identifier(identifier_type='ManifestName', key='app'),]
+        )
+        self.assertEqual(order, ['base1', 'base2', 'db', 'app'])
+        self.assertIsNone(tasks.dependency_graph, 'Targeted planning must not build the full dependency graph')
+
+    def test_targeted_order_by_name_with_cached_graph_1(self):
+        tasks = self._build_tasks()
+        tasks.build_dependency_graph()
+        order = tasks.calculate_current_task_order(
+            processing_target_identifier=build_command_identifier(command='command1', context='c1'),
+            target_identifiers=[Identifier(identifier_type='ManifestName', key='db'),]
+        )
+        self.assertEqual(order, ['base1', 'base2', 'db'])
+
+    def test_targeted_order_by_label_and_out_of_scope_selection_1(self):
+        tasks = self._build_tasks()
+        order = tasks.calculate_current_task_order(
+            processing_target_identifier=build_command_identifier(command='command1', context='c1'),
+            target_identifiers=[Identifier(identifier_type='Label', key='tier', val='base'), Identifier(identifier_type='Label', key='tier', val='other'),]
+        )
+        self.assertEqual(order, ['base1', 'base2'])
+
+    def test_targeted_process_context_1(self):
+        tasks = self._build_tasks()
+        key_value_store = tasks.key_value_store
+        tasks.process_context(command='command1', context='c1', target_identifiers=[Identifier(identifier_type='ManifestName', key='db'),])
+        self.assertTrue('PROCESSING_TASK:db:command1:c1' in key_value_store.store)
+        self.assertTrue('PROCESSING_TASK:base1:command1:c1' in key_value_store.store)
+        self.assertFalse('PROCESSING_TASK:app:command1:c1' in key_value_store.store)
+        self.assertFalse('PROCESSING_TASK:unrelated:command1:c1' in key_value_store.store)
+
+
+class TestClassTasksReverseOrderPlanning(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self)->Tasks:
+        return build_tasks(
+            processors=[Processor1(),],
+            task_definitions=[
+                ('Processor1', {}, build_task_metadata(name='app1', label_dependencies=[('tier', 'db')])),
+                ('Processor1', {}, build_task_metadata(name='app2', label_dependencies=[('tier', 'db')])),
+                ('Processor1', {}, build_task_metadata(name='db1', labels={'tier': 'db'}, name_dependencies=['base'])),
+                ('Processor1', {}, build_task_metadata(name='db2', labels={'tier': 'db'}, name_dependencies=['base'])),
+                ('Processor1', {}, build_task_metadata(name='base')),
+            ],
+            configuration={'Planner': {'ReverseOrderCommands': ['command2',]}}
+        )
+
+    def test_forward_and_reverse_order_1(self):
+        tasks = self._build_tasks()
+        forward_waves = tasks.calculate_current_task_waves(processing_target_identifier=build_command_identifier(command='command1', context='c1'))
+        self.assertEqual(forward_waves, [['base'], ['db1', 'db2'], ['app1', 'app2']])
+        graph = tasks.build_dependency_graph()
+        reverse_waves = tasks.calculate_current_task_waves(processing_target_identifier=build_command_identifier(command='command2', context='c1'))
+        self.assertEqual(reverse_waves, [['app1', 'app2'], ['db1', 'db2'], ['base']])
+        self.assertIs(graph, tasks.build_dependency_graph(), 'Reverse planning must re-use the cached dependency graph')
+        order = tasks.calculate_current_task_order(processing_target_identifier=build_command_identifier(command='command2', context='c1'))
+        self.assertEqual(order, ['app1', 'app2', 'db1', 'db2', 'base'])
+
+    def test_reverse_order_process_context_1(self):
+        tasks = self._build_tasks()
+        tasks.process_context(command='command2', context='c1')
+        processing_keys = [key for key in tasks.key_value_store.store if key.startswith('PROCESSING_TASK:')]
+        self.assertEqual(processing_keys, ['PROCESSING_TASK:{}:command2:c1'.format(task_id) for task_id in ('app1', 'app2', 'db1', 'db2', 'base')])
+
+
+class SleepProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='SleepProcessor', kind_versions=['v1'], supported_commands=['command1', 'command2'], logger=TestLogger())
+        self.events = list()
+        self.barrier = None
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        self.events.append(('start', task.task_id, time.monotonic()))
+        if self.barrier is not None and task.spec.get('barrier', False) is True:
+            self.barrier.wait()
+        time.sleep(float(task.spec.get('sleep', 0.0)))
+        key_value_store.save(key='SleepProcessor:Processed:{}'.format(task.task_id), value=True)
+        key_value_store.save(key='SleepProcessor:LastProcessed', value=task.task_id)
+        self.events.append(('end', task.task_id, time.monotonic()))
+        return key_value_store
+
+
+class TestClassTasksThreadPoolExecutor(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict, hooks: Hooks=None)->Tasks:
+        return build_tasks(
+            processors=[SleepProcessor(),],
+            task_definitions=[
+                ('SleepProcessor', {'sleep': 0.3, 'barrier': True}, build_task_metadata(name='slow1', labels={'tier': 'db'})),
+                ('SleepProcessor', {'sleep': 0.1, 'barrier': True}, build_task_metadata(name='slow2', labels={'tier': 'db'})),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='app', label_dependencies=[('tier', 'db')])),
+            ],
+            configuration=configuration,
+            hooks=hooks
+        )
+
+    def test_independent_tasks_run_concurrently_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4}})
+        key_value_store = tasks.key_value_store
+        processor = tasks.task_processors_executors['SleepProcessor:v1']
+        processor.barrier = threading.Barrier(2, timeout=10)
+        tasks.process_context(command='command1', context='c1')
+        self.assertFalse(processor.barrier.broken, 'slow1 and slow2 must be in progress at the same time')
+        events = [(event[0], event[1]) for event in processor.events]
+        self.assertEqual(events[-2:], [('start', 'app'), ('end', 'app')])
+        for task_id in ('slow1', 'slow2', 'app'):
+            self.assertEqual(key_value_store.store['PROCESSING_TASK:{}:command1:c1'.format(task_id)], 2)
+            self.assertTrue(key_value_store.store['SleepProcessor:Processed:{}'.format(task_id)])
+
+    def test_results_match_serial_processing_1(self):
+        serial_tasks = self._build_tasks(configuration=dict())
+        serial_tasks.process_context(command='command1', context='c1')
+        concurrent_tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 2}})
+        concurrent_tasks.process_context(command='command1', context='c1')
+        self.assertEqual(list(serial_tasks.key_value_store.store.items()), list(concurrent_tasks.key_value_store.store.items()))
+        self.assertEqual(concurrent_tasks.key_value_store.store['SleepProcessor:LastProcessed'], 'app')
+
+    def test_hooks_fire_for_every_task_1(self):
+        logger = TestLogger()
+        hooks = Hooks()
+        hooks.register_hook(
+            hook=Hook(
+                name='test_hook_1',
+                commands=['command1',],
+                contexts=['c1',],
+                task_life_cycle_stages=TaskLifecycleStages(),
+                function_impl=hook_function_test_1,
+                logger=logger
+            )
+        )
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 3}}, hooks=hooks)
+        tasks.process_context(command='command1', context='c1')
+        for task_id in ('slow1', 'slow2', 'app'):
+            for lifecycle_stage in (TaskLifecycleStage.TASK_PRE_PROCESSING_START, TaskLifecycleStage.TASK_PRE_PROCESSING_COMPLETED, TaskLifecycleStage.TASK_PROCESSING_PRE_START, TaskLifecycleStage.TASK_PROCESSING_POST_DONE):
+                self.assertTrue('test_hook_1:{}:command1:c1:{}'.format(task_id, lifecycle_stage) in tasks.key_value_store.store)
+
+    def test_hook_exception_is_raised_1(self):
+        hooks = Hooks()
+        required_task_life_cycle_stages = TaskLifecycleStages(init_default_stages=False)
+        required_task_life_cycle_stages.register_lifecycle_stage(task_life_cycle_stage=TaskLifecycleStage.TASK_PROCESSING_POST_DONE)
+        hooks.register_hook(
+            hook=Hook(
+                name='failing_hook',
+                commands=['command1',],
+                contexts=['c1',],
+                task_life_cycle_stages=required_task_life_cycle_stages,
+                function_impl=hook_function_always_throw_exception,
+                logger=TestLogger()
+            )
+        )
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 2}}, hooks=hooks)
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1')
+
+    def test_unsupported_executor_mode_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'Magic'}})
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1')
+
+
+class CountingProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='CountingProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+        self.call_count = 0
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        self.call_count += 1
+        key_value_store.save(key='CountingProcessor:{}:CallCount'.format(task.task_id), value=self.call_count)
+        key_value_store.save(key='CountingProcessor:{}:ProcessId'.format(task.task_id), value=os.getpid())
+        key_value_store.save(key='CountingProcessor:{}:Spec'.format(task.task_id), value=task.spec)
+        state_persistence.save_object_state(object_identifier=task.task_id, data={'ResourcesCreated': True})
+        return key_value_store
+
+
+class TestClassTasksProcessPoolExecutor(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def test_process_pool_1(self):
+        tasks = build_tasks(
+            processors=[CountingProcessor(),],
+            task_definitions=[
+                ('CountingProcessor', {'Field1': 'value1'}, build_task_metadata(name='t1')),
+                ('CountingProcessor', {'Field1': 'value2'}, build_task_metadata(name='t2', name_dependencies=['t1'])),
+                ('CountingProcessor', {'Field1': 'value3'}, build_task_metadata(name='t3', name_dependencies=['t2'])),
+            ],
+            configuration={'Executor': {'Mode': 'ProcessPool', 'MaxWorkers': 1}}
+        )
+        key_value_store = tasks.key_value_store
+        tasks.process_context(command='command1', context='c1')
+        for task_id, expected_call_count, expected_spec in (('t1', 1, {'field1': 'value1'}), ('t2', 2, {'field1': 'value2'}), ('t3', 3, {'field1': 'value3'})):
+            self.assertEqual(key_value_store.store['PROCESSING_TASK:{}:command1:c1'.format(task_id)], 2)
+            self.assertEqual(key_value_store.store['CountingProcessor:{}:CallCount'.format(task_id)], expected_call_count, 'The worker must keep a warm processor instance')
+            self.assertNotEqual(key_value_store.store['CountingProcessor:{}:ProcessId'.format(task_id)], os.getpid())
+            self.assertEqual(key_value_store.store['CountingProcessor:{}:Spec'.format(task_id)], expected_spec)
+            self.assertEqual(tasks.state_persistence.get_object_state(object_identifier=task_id), {'ResourcesCreated': True})
+        self.assertEqual(tasks.task_processors_executors['CountingProcessor:v1'].call_count, 0)
+
+    def test_task_processing_payload_1(self):
+        task = Task(kind='CountingProcessor', version='v1', spec={'Field1': 'value1'}, metadata=build_task_metadata(name='t1', labels={'l1': 'lv1'}), logger=TestLogger())
+        payload = build_task_processing_payload(task=task)
+        rebuilt_task = build_task_from_processing_payload(payload=payload, logger=TestLogger())
+        self.assertEqual(rebuilt_task.task_id, 't1')
+        self.assertEqual(rebuilt_task.task_checksum, task.task_checksum)
+        self.assertEqual(rebuilt_task.identifiers.to_metadata_dict(), task.identifiers.to_metadata_dict())
+        self.assertTrue('contextualIdentifiers' in rebuilt_task.identifiers.to_metadata_dict())
+        payload['Identifiers'] = dict()
+        with self.assertRaises(Exception):
+            build_task_from_processing_payload(payload=payload, logger=TestLogger())
+        payload['Identifiers'] = task.identifiers.to_metadata_dict()
+        payload['Spec'] = {'field1': 'changed'}
+        with self.assertRaises(Exception):
+            build_task_from_processing_payload(payload=payload, logger=TestLogger())
+
+
+class AsyncSleepProcessor(AsyncTaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='AsyncSleepProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+        self.in_progress = 0
+        self.max_in_progress = 0
+
+    async def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        self.in_progress += 1
+        self.max_in_progress = max(self.max_in_progress, self.in_progress)
+        await asyncio.sleep(float(task.spec.get('sleep', 0.0)))
+        self.in_progress -= 1
+        key_value_store.save(key='AsyncSleepProcessor:Processed:{}'.format(task.task_id), value=True)
+        return key_value_store
+
+
+async def async_hook_function_test_1(
+    hook_name:str,
+    task:Task,
+    key_value_store:KeyValueStore,
+    command:str,
+    context:str,
+    task_life_cycle_stage:int,
+    extra_parameters:dict,
+    logger:LoggerWrapper
+):
+    await asyncio.sleep(0)
+    return hook_function_test_1(hook_name=hook_name, task=task, key_value_store=key_value_store, command=command, context=context, task_life_cycle_stage=task_life_cycle_stage, extra_parameters=extra_parameters, logger=logger)
+
+
+class ThreadRecordingStatePersistence(StatePersistence):
+
+    def __init__(self):
+        super().__init__(logger=TestLogger())
+        self.persisting_threads = list()
+
+    def persist_all_state(self):
+        self.persisting_threads.append(threading.current_thread())
+        super().persist_all_state()
+
+
+class TestClassTasksAsyncExecution(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict=dict(), sleep: float=0.2, state_persistence: StatePersistence=None)->Tasks:
+        task_definitions = [('AsyncSleepProcessor', {'sleep': sleep}, build_task_metadata(name='async{}'.format(i), labels={'tier': 'async'})) for i in range(0, 20)]
+        task_definitions.append(('Processor1', {}, build_task_metadata(name='sync', label_dependencies=[('tier', 'async')])))
+        return build_tasks(
+            processors=[AsyncSleepProcessor(), Processor1()],
+            task_definitions=task_definitions,
+            configuration=configuration,
+            hooks=build_hooks(function_impl=async_hook_function_test_1, name='async_hook'),
+            state_persistence=state_persistence
+        )
+
+    def test_process_context_async_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'MaxConcurrency': 10}})
+        key_value_store = tasks.key_value_store
+        asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        processor = tasks.task_processors_executors['AsyncSleepProcessor:v1']
+        self.assertEqual(processor.max_in_progress, 10)
+        for i in range(0, 20):
+            self.assertEqual(key_value_store.store['PROCESSING_TASK:async{}:command1:c1'.format(i)], 2)
+            self.assertTrue(key_value_store.store['AsyncSleepProcessor:Processed:async{}'.format(i)])
+            self.assertTrue(key_value_store.store['async_hook:async{}:command1:c1:{}'.format(i, TaskLifecycleStage.TASK_PROCESSING_POST_DONE)])
+        self.assertEqual(key_value_store.store['PROCESSING_TASK:sync:command1:c1'], 2)
+        self.assertTrue(key_value_store.store['Processor1:Processed:sync:Success'])
+
+    def test_async_processor_and_hook_in_serial_mode_1(self):
+        tasks = self._build_tasks(sleep=0.0)
+        tasks.process_context(command='command1', context='c1')
+        self.assertTrue(tasks.key_value_store.store['AsyncSleepProcessor:Processed:async0'])
+        self.assertTrue(tasks.key_value_store.store['async_hook:async0:command1:c1:{}'.format(TaskLifecycleStage.TASK_PRE_PROCESSING_START)])
+
+    def test_async_processor_and_hook_inside_running_event_loop_1(self):
+        tasks = self._build_tasks(sleep=0.0)
+
+        async def process_context():
+            tasks.process_context(command='command1', context='c1')
+
+        asyncio.run(process_context())
+        self.assertTrue(tasks.key_value_store.store['AsyncSleepProcessor:Processed:async0'])
+        self.assertTrue(tasks.key_value_store.store['async_hook:async0:command1:c1:{}'.format(TaskLifecycleStage.TASK_PROCESSING_POST_DONE)])
+
+    def test_state_persisted_outside_the_event_loop_1(self):
+        state_persistence = ThreadRecordingStatePersistence()
+        tasks = self._build_tasks(sleep=0.0, state_persistence=state_persistence)
+        asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        self.assertGreater(len(state_persistence.persisting_threads), 0)
+        self.assertFalse(threading.main_thread() in state_persistence.persisting_threads)
+        self.assertEqual(tasks.run_statistics['MaxWorkers'], 64)
+
+
+def max_overlapping_tasks(events: list)->int:
+    overlapping = 0
+    max_overlapping = 0
+    for event in sorted(events, key=lambda x: (x[2], 0 if x[0] == 'end' else 1)):
+        if event[0] == 'start':
+            overlapping += 1
+        else:
+            overlapping -= 1
+        max_overlapping = max(max_overlapping, overlapping)
+    return max_overlapping
+
+
+class TestClassTasksResourceAwareScheduling(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict, resources: dict, task_count: int=4)->Tasks:
+        task_definitions = list()
+        for i in range(0, task_count):
+            metadata = build_task_metadata(name='t{}'.format(i))
+            metadata['resources'] = resources
+            task_definitions.append(('SleepProcessor', {'sleep': 0.05}, metadata))
+        return build_tasks(processors=[SleepProcessor(),], task_definitions=task_definitions, configuration=configuration)
+
+    def test_parse_resource_quantity_1(self):
+        self.assertEqual(parse_resource_quantity(value=2), 2.0)
+        self.assertEqual(parse_resource_quantity(value='0.5'), 0.5)
+        self.assertEqual(parse_resource_quantity(value='512M'), 512.0 * 1024 * 1024)
+        self.assertEqual(parse_resource_quantity(value='2Gi'), 2.0 * 1024 * 1024 * 1024)
+        with self.assertRaises(Exception):
+            parse_resource_quantity(value='lots')
+
+    def test_task_resource_requirements_1(self):
+        metadata = build_task_metadata(name='t1')
+        metadata['resources'] = {'api-x': 1, 'memory': '2G'}
+        task = Task(kind='SleepProcessor', version='v1', spec={}, metadata=metadata, logger=TestLogger())
+        self.assertEqual(task.resource_requirements, {'api-x': 1.0, 'memory': 2.0 * 1024 * 1024 * 1024})
+
+    def test_exclusive_resource_never_overlaps_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4, 'ResourceCapacities': {'api-x': 1}}}, resources={'api-x': 1})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(max_overlapping_tasks(events=tasks.task_processors_executors['SleepProcessor:v1'].events), 1)
+        for i in range(0, 4):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:t{}:command1:c1'.format(i)], 2)
+
+    def test_memory_capacity_limits_concurrency_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4, 'ResourceCapacities': {'memory': '4G'}}}, resources={'memory': '2G'})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(max_overlapping_tasks(events=tasks.task_processors_executors['SleepProcessor:v1'].events), 2)
+
+    def test_mixed_case_resource_capacity_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4, 'ResourceCapacities': {'DB': 1}}}, resources={'Db': 1})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(max_overlapping_tasks(events=tasks.task_processors_executors['SleepProcessor:v1'].events), 1)
+
+    def test_unconfigured_resource_is_not_limited_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4}}, resources={'api-x': 1})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(max_overlapping_tasks(events=tasks.task_processors_executors['SleepProcessor:v1'].events), 4)
+
+    def test_requirement_above_capacity_throws_exception_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'ResourceCapacities': {'memory': '1G'}}}, resources={'memory': '2G'}, task_count=1)
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1')
+
+
+class TestClassTasksCriticalPathScheduling(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict=dict())->Tasks:
+        if len(configuration) == 0:
+            configuration = {'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 1}}
+        return build_tasks(
+            processors=[SleepProcessor(),],
+            task_definitions=[
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='independent')),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='chain1')),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='chain2', name_dependencies=['chain1'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='chain3', name_dependencies=['chain2'])),
+            ],
+            configuration=configuration
+        )
+
+    def _started_task_ids(self, tasks: Tasks)->list:
+        return [event[1] for event in tasks.task_processors_executors['SleepProcessor:v1'].events if event[0] == 'start']
+
+    def test_critical_path_lengths_1(self):
+        graph = TaskDependencyGraph()
+        graph.add_edge(node_id='b', required_node_id='a')
+        graph.add_edge(node_id='c', required_node_id='b')
+        graph.add_node(node_id='d')
+        lengths = graph.critical_path_lengths(node_weights={'a': 1.0, 'b': 2.0, 'c': 3.0, 'd': 4.0})
+        self.assertEqual(lengths, {'a': 6.0, 'b': 5.0, 'c': 3.0, 'd': 4.0})
+
+    def test_task_run_history_1(self):
+        history = TaskRunHistory(state_persistence=StatePersistence(logger=TestLogger()), max_samples=2)
+        self.assertIsNone(history.get_average_duration(task_id='t1', command='command1', context='c1'))
+        for seconds in (1.0, 2.0, 4.0):
+            history.record_duration(task_id='t1', command='command1', context='c1', seconds=seconds)
+        self.assertEqual(history.get_average_duration(task_id='t1', command='command1', context='c1'), 3.0)
+        self.assertIsNone(history.get_average_duration(task_id='t1', command='command1', context='c2'))
+
+    def test_graph_depth_used_without_history_1(self):
+        tasks = self._build_tasks()
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._started_task_ids(tasks=tasks)[0], 'chain1')
+
+    def test_historical_durations_used_1(self):
+        tasks = self._build_tasks()
+        tasks.task_run_history.record_duration(task_id='independent', command='command1', context='c1', seconds=10.0)
+        for task_id in ('chain1', 'chain2', 'chain3'):
+            tasks.task_run_history.record_duration(task_id=task_id, command='command1', context='c1', seconds=1.0)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._started_task_ids(tasks=tasks), ['independent', 'chain1', 'chain2', 'chain3'])
+
+    def test_critical_path_scheduling_disabled_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 1, 'CriticalPathScheduling': False}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._started_task_ids(tasks=tasks)[0], 'independent')
+
+    def test_durations_recorded_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'Serial'}})
+        tasks.process_context(command='command1', context='c1')
+        for task_id in ('independent', 'chain1', 'chain2', 'chain3'):
+            self.assertIsNotNone(tasks.task_run_history.get_average_duration(task_id=task_id, command='command1', context='c1'))
+        tasks = self._build_tasks(configuration={'Executor': {'RecordTaskDurations': False}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertIsNone(tasks.task_run_history.get_average_duration(task_id='chain1', command='command1', context='c1'))
+
+
+class BatchProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='BatchProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+        self.batches = list()
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        raise Exception('Only batches expected')
+
+    def process_tasks_batch(self, tasks: list, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        self.batches.append([task.task_id for task in tasks])
+        time.sleep(max([float(task.spec.get('sleep', 0.0)) for task in tasks]))
+        for task in tasks:
+            key_value_store.save(key='BatchProcessor:Processed:{}'.format(task.task_id), value=len(tasks))
+        return key_value_store
+
+
+class TestClassTasksBatchProcessing(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict, hooks: Hooks=None, gated_task_count: int=0, batch_sleep: float=0.0)->Tasks:
+        """
+            The last gated_task_count of b0 to b4 depend on "gate", and "app" depends on all of them.
+        """
+        task_definitions = [('SleepProcessor', {'sleep': 0.05}, build_task_metadata(name='gate'))]
+        for i in range(0, 5):
+            name_dependencies = list()
+            if i >= 5 - gated_task_count:
+                name_dependencies = ['gate',]
+            task_definitions.append(('BatchProcessor', {'sleep': batch_sleep}, build_task_metadata(name='b{}'.format(i), labels={'tier': 'batch'}, name_dependencies=name_dependencies)))
+        task_definitions.append(('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='app', label_dependencies=[('tier', 'batch')])))
+        return build_tasks(processors=[BatchProcessor(), SleepProcessor()], task_definitions=task_definitions, configuration=configuration, hooks=hooks)
+
+    def test_supports_batch_processing_1(self):
+        self.assertTrue(BatchProcessor().supports_batch_processing())
+        self.assertFalse(SleepProcessor().supports_batch_processing())
+        self.assertFalse(AsyncSleepProcessor().supports_batch_processing())
+
+    def test_serial_batches_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'BatchSize': 2}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.task_processors_executors['BatchProcessor:v1'].batches, [['b0', 'b1'], ['b2', 'b3'], ['b4']])
+        for i in range(0, 5):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:b{}:command1:c1'.format(i)], 2)
+        self.assertEqual(tasks.key_value_store.store['SleepProcessor:LastProcessed'], 'app')
+
+    def test_hooks_fire_for_every_task_in_batch_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool'}}, hooks=build_hooks(function_impl=hook_function_test_1))
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.task_processors_executors['BatchProcessor:v1'].batches, [['b0', 'b1', 'b2', 'b3', 'b4']])
+        for i in range(0, 5):
+            self.assertEqual(tasks.key_value_store.store['BatchProcessor:Processed:b{}'.format(i)], 5)
+            for stage in range(3, 7):
+                self.assertTrue('hook1:b{}:command1:c1:{}'.format(i, stage) in tasks.key_value_store.store)
+
+    def test_batch_duration_is_split_over_its_tasks_1(self):
+        for mode in ('Serial', 'ThreadPool'):
+            tasks = self._build_tasks(configuration={'Executor': {'Mode': mode}}, batch_sleep=0.05)
+            start = time.monotonic()
+            tasks.process_context(command='command1', context='c1')
+            elapsed = time.monotonic() - start
+            self.assertEqual(tasks.task_processors_executors['BatchProcessor:v1'].batches, [['b0', 'b1', 'b2', 'b3', 'b4']], mode)
+            durations = [tasks.task_run_history.get_average_duration(task_id='b{}'.format(i), command='command1', context='c1') for i in range(0, 5)]
+            self.assertEqual(len(set(durations)), 1, mode)
+            self.assertTrue(sum(durations) <= elapsed, mode)
+
+    def test_batch_linger_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'BatchLingerSeconds': 0.0}}, gated_task_count=2)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.task_processors_executors['BatchProcessor:v1'].batches, [['b0', 'b1', 'b2'], ['b3', 'b4']])
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'BatchLingerSeconds': 2.0}}, gated_task_count=2)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.task_processors_executors['BatchProcessor:v1'].batches, [['b0', 'b1', 'b2', 'b3', 'b4']])
+        self.assertEqual(tasks.key_value_store.store['SleepProcessor:LastProcessed'], 'app')
+
+    def test_async_batches_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'BatchSize': 2}})
+        asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        self.assertEqual(tasks.task_processors_executors['BatchProcessor:v1'].batches, [['b0', 'b1'], ['b2', 'b3'], ['b4']])
+        for i in range(0, 5):
+            self.assertEqual(tasks.key_value_store.store['BatchProcessor:Processed:b{}'.format(i)], 2 if i < 4 else 1)
+        self.assertEqual(tasks.key_value_store.store['SleepProcessor:LastProcessed'], 'app')
+
+
+class ReadingProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='ReadingProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        key_value_store.save(key='ReadingProcessor:{}'.format(task.task_id), value=key_value_store.store.get(task.spec['read']))
+        return key_value_store
+
+
+class TestClassTasksIncrementalExecution(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, state_persistence: StatePersistence, configuration: dict, b_sleep: float=0.0)->Tasks:
+        return build_tasks(
+            processors=[SleepProcessor(),],
+            task_definitions=[
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='a')),
+                ('SleepProcessor', {'sleep': b_sleep}, build_task_metadata(name='b', name_dependencies=['a'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='c', name_dependencies=['b'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='d')),
+            ],
+            configuration=configuration,
+            hooks=build_hooks(function_impl=hook_function_test_1),
+            state_persistence=state_persistence
+        )
+
+    def _processed_task_ids(self, tasks: Tasks)->list:
+        return sorted([event[1] for event in tasks.task_processors_executors['SleepProcessor:v1'].events if event[0] == 'start'])
+
+    def _run_incremental(self, mode: str):
+        state_persistence = StatePersistence(logger=TestLogger())
+        configuration = {'Executor': {'Mode': mode, 'Incremental': True}}
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['a', 'b', 'c', 'd'])
+
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), list())
+        for task_id in ('a', 'b', 'c', 'd'):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:{}:command1:c1'.format(task_id)], TaskProcessingStatus.UNCHANGED)
+            self.assertTrue('hook1:{}:command1:c1:6'.format(task_id) in tasks.key_value_store.store)
+            self.assertTrue(tasks.key_value_store.store['SleepProcessor:Processed:{}'.format(task_id)])
+
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration, b_sleep=0.01)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['b', 'c'])
+        self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:a:command1:c1'], TaskProcessingStatus.UNCHANGED)
+        self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:c:command1:c1'], TaskProcessingStatus.DONE)
+
+    def test_incremental_serial_1(self):
+        self._run_incremental(mode='Serial')
+
+    def test_incremental_thread_pool_1(self):
+        self._run_incremental(mode='ThreadPool')
+
+    def test_unchanged_task_outputs_are_restored_1(self):
+        for mode in ('Serial', 'ThreadPool', 'ProcessPool'):
+            state_persistence = StatePersistence(logger=TestLogger())
+            configuration = {'Executor': {'Mode': mode, 'Incremental': True}}
+            for reader_spec in ({'read': 'SleepProcessor:Processed:a'}, {'read': 'SleepProcessor:Processed:a', 'changed': True}):
+                tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration)
+                tasks.register_task_processor(processor=ReadingProcessor())
+                tasks.add_task(task=Task(kind='ReadingProcessor', version='v1', spec=reader_spec, metadata=build_task_metadata(name='reader', name_dependencies=['a']), logger=tasks.logger))
+                tasks.process_context(command='command1', context='c1')
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:a:command1:c1'], TaskProcessingStatus.UNCHANGED, mode)
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:reader:command1:c1'], TaskProcessingStatus.DONE, mode)
+            self.assertEqual(tasks.key_value_store.store['ReadingProcessor:reader'], True, mode)
+
+    def test_run_records_are_plain_json_data_1(self):
+        state_persistence = StatePersistence(logger=TestLogger())
+        self._build_tasks(state_persistence=state_persistence, configuration={'Executor': {'Incremental': True}}).process_context(command='command1', context='c1')
+        run_record = state_persistence.get_object_state(object_identifier='TASK_RUN_RECORD:a:command1:c1')
+        self.assertEqual(json.loads(json.dumps(run_record)), run_record)
+        self.assertTrue(run_record['SetValues']['SleepProcessor:Processed:a'])
+        self.assertEqual(run_record['DeletedKeys'], list())
+
+    def test_oversized_task_outputs_are_processed_again_1(self):
+        state_persistence = StatePersistence(logger=TestLogger())
+        configuration = {'Executor': {'Incremental': True, 'IncrementalMaxOutputBytes': 8}}
+        self._build_tasks(state_persistence=state_persistence, configuration=configuration).process_context(command='command1', context='c1')
+        self.assertFalse('SetValues' in state_persistence.get_object_state(object_identifier='TASK_RUN_RECORD:a:command1:c1'))
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['a', 'b', 'c', 'd'])
+
+    def test_incremental_other_context_not_skipped_1(self):
+        state_persistence = StatePersistence(logger=TestLogger())
+        configuration = {'Executor': {'Incremental': True}}
+        self._build_tasks(state_persistence=state_persistence, configuration=configuration).process_context(command='command1', context='c1')
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration)
+        tasks.process_context(command='command1', context='c2')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['a', 'b', 'c', 'd'])
+
+    def test_unchanged_task_hooks_disabled_1(self):
+        state_persistence = StatePersistence(logger=TestLogger())
+        configuration = {'Executor': {'Incremental': True, 'UnchangedTaskHooks': False}}
+        self._build_tasks(state_persistence=state_persistence, configuration=configuration).process_context(command='command1', context='c1')
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=configuration)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:a:command1:c1'], TaskProcessingStatus.UNCHANGED)
+        self.assertFalse('hook1:a:command1:c1:6' in tasks.key_value_store.store)
+
+    def test_not_incremental_processes_everything_1(self):
+        state_persistence = StatePersistence(logger=TestLogger())
+        self._build_tasks(state_persistence=state_persistence, configuration={'Executor': {'Incremental': True}}).process_context(command='command1', context='c1')
+        tasks = self._build_tasks(state_persistence=state_persistence, configuration=dict())
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['a', 'b', 'c', 'd'])
+
+
+class CachingProcessor(TaskProcessor):
+
+    def __init__(self, processor_version: str='1'):
+        super().__init__(kind='CachingProcessor', kind_versions=['v1'], supported_commands=['command1', 'command2'], logger=TestLogger(), cacheable_commands=['command2',], processor_version=processor_version)
+        self.processed_task_ids = list()
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        self.processed_task_ids.append(task.task_id)
+        key_value_store.save(key='CachingProcessor:{}:{}'.format(task.task_id, command), value={'context': context})
+        return key_value_store
+
+
+class TestClassTasksResultCache(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict=dict(), processor_version: str='1')->Tasks:
+        return build_tasks(
+            processors=[CachingProcessor(processor_version=processor_version),],
+            task_definitions=[
+                ('CachingProcessor', {'a': 1}, build_task_metadata(name='t1')),
+                ('CachingProcessor', {'a': 2}, build_task_metadata(name='t2', name_dependencies=['t1'])),
+            ],
+            configuration=configuration
+        )
+
+    def _run(self, tasks: Tasks, command: str)->list:
+        """
+            Processes the command with a new KeyValueStore and returns the tasks the processor was called for.
+        """
+        tasks.key_value_store = KeyValueStore()
+        tasks.task_processors_executors['CachingProcessor:v1'].processed_task_ids = list()
+        tasks.process_context(command=command, context='c1')
+        for task_id in ('t1', 't2'):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:{}:{}:c1'.format(task_id, command)], TaskProcessingStatus.DONE)
+            self.assertEqual(tasks.key_value_store.store['CachingProcessor:{}:{}'.format(task_id, command)], {'context': 'c1'})
+        return tasks.task_processors_executors['CachingProcessor:v1'].processed_task_ids
+
+    def test_cacheable_command_replayed_1(self):
+        for mode in ('Serial', 'ThreadPool'):
+            tasks = self._build_tasks(configuration={'Executor': {'Mode': mode}})
+            self.assertEqual(self._run(tasks=tasks, command='command2'), ['t1', 't2'])
+            self.assertEqual(self._run(tasks=tasks, command='command2'), list())
+            self.assertEqual(self._run(tasks=tasks, command='command1'), ['t1', 't2'])
+            self.assertEqual(self._run(tasks=tasks, command='command1'), ['t1', 't2'])
+
+    def test_result_cache_disabled_1(self):
+        tasks = self._build_tasks(configuration={'ResultCache': {'Enabled': False}})
+        self._run(tasks=tasks, command='command2')
+        self.assertEqual(self._run(tasks=tasks, command='command2'), ['t1', 't2'])
+
+    def test_disk_tier_and_processor_version_1(self):
+        with tempfile.TemporaryDirectory() as directory:
+            configuration = {'ResultCache': {'Directory': directory}}
+            self.assertEqual(self._run(tasks=self._build_tasks(configuration=configuration), command='command2'), ['t1', 't2'])
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(self._run(tasks=self._build_tasks(configuration=configuration), command='command2'), list())
+            self.assertEqual(self._run(tasks=self._build_tasks(configuration=configuration, processor_version='2'), command='command2'), ['t1', 't2'])
+
+    def test_lru_eviction_1(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TaskResultCache(max_memory_entries=2, directory=directory, max_disk_entries=2, logger=TestLogger())
+            for key in ('k1', 'k2', 'k3'):
+                delta = KeyValueStoreDelta()
+                delta.set(key=key, value=True)
+                cache.put(key=key, delta=delta)
+            self.assertEqual(list(cache.memory_entries.keys()), ['k2', 'k3'])
+            self.assertIsNone(cache.get(key='k1'))
+            self.assertEqual(sorted(os.listdir(directory)), ['k2.pickle', 'k3.pickle'])
+            cache = TaskResultCache(max_memory_entries=2, directory=directory, max_disk_entries=2, logger=TestLogger())
+            self.assertEqual(cache.get(key='k2').set_values, {'k2': True})
+
+
+class TestClassTasksWaveBarrier(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict)->Tasks:
+        return build_tasks(
+            processors=[SleepProcessor(),],
+            task_definitions=[
+                ('SleepProcessor', {'sleep': 0.3}, build_task_metadata(name='straggler')),
+                ('SleepProcessor', {'sleep': 0.02}, build_task_metadata(name='quick')),
+                ('SleepProcessor', {'sleep': 0.02}, build_task_metadata(name='after_quick', name_dependencies=['quick'])),
+            ],
+            configuration=configuration
+        )
+
+    def _event_time(self, tasks: Tasks, event_type: str, task_id: str)->float:
+        return [event[2] for event in tasks.task_processors_executors['SleepProcessor:v1'].events if event[0] == event_type and event[1] == task_id][0]
+
+    def test_dependant_starts_before_straggler_completes_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool'}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertTrue(self._event_time(tasks=tasks, event_type='start', task_id='after_quick') < self._event_time(tasks=tasks, event_type='end', task_id='straggler'))
+        self.assertEqual(tasks.run_statistics['MaxWorkers'], 4)
+        self.assertTrue(0.0 < tasks.run_statistics['WorkerUtilization'] <= 1.0)
+
+    def test_wave_barrier_waits_for_straggler_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'WaveBarrier': True}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertTrue(self._event_time(tasks=tasks, event_type='start', task_id='after_quick') >= self._event_time(tasks=tasks, event_type='end', task_id='straggler'))
+        self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:after_quick:command1:c1'], TaskProcessingStatus.DONE)
+
+    def test_wave_barrier_ready_queue_with_group_nodes_1(self):
+        graph = TaskDependencyGraph()
+        graph.add_node(node_id='a')
+        graph.add_node(node_id='b')
+        graph.add_group_node(node_id='group', required_node_ids=['a', 'b'])
+        graph.add_edge(node_id='c', required_node_id='group')
+        ready_queue = TaskReadyQueue(plan=graph, wave_barrier=True)
+        self.assertEqual(ready_queue.pop(), 'a')
+        self.assertEqual(ready_queue.pop(), 'b')
+        self.assertIsNone(ready_queue.pop())
+        ready_queue.complete(node_id='a')
+        self.assertIsNone(ready_queue.pop())
+        ready_queue.complete(node_id='b')
+        self.assertEqual(ready_queue.pop(), 'c')
+        ready_queue.complete(node_id='c')
+        self.assertEqual(ready_queue.pending_count(), 0)
+
+
+class FailingProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='FailingProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        raise Exception('Forced failure of task "{}"'.format(task.task_id))
+
+
+class BlockingProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='BlockingProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+        self.release = threading.Event()
+        self.finished_task_ids = list()
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        self.release.wait(timeout=30)
+        self.finished_task_ids.append(task.task_id)
+        return key_value_store
+
+
+class TestClassTasksFailurePropagation(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict)->Tasks:
+        return build_tasks(
+            processors=[SleepProcessor(), FailingProcessor()],
+            task_definitions=[
+                ('FailingProcessor', {}, build_task_metadata(name='broken')),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='dependant1', name_dependencies=['broken'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='dependant2', name_dependencies=['dependant1'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='independent1')),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='independent2')),
+            ],
+            configuration=configuration
+        )
+
+    def _status(self, tasks: Tasks, task_id: str)->int:
+        return tasks.key_value_store.store.get('PROCESSING_TASK:{}:command1:c1'.format(task_id))
+
+    def test_transitive_dependants_1(self):
+        graph = TaskDependencyGraph()
+        graph.add_group_node(node_id='group', required_node_ids=['a', 'b'])
+        graph.add_edge(node_id='c', required_node_id='group')
+        graph.add_edge(node_id='d', required_node_id='c')
+        graph.add_node(node_id='e')
+        self.assertEqual(graph.transitive_dependants(node_ids=['a',]), ['c', 'd'])
+        self.assertEqual(graph.transitive_dependants(node_ids=['e',]), list())
+
+    def test_dependants_of_failed_task_are_skipped_1(self):
+        for mode in ('Serial', 'ThreadPool', 'ProcessPool'):
+            tasks = self._build_tasks(configuration={'Executor': {'Mode': mode}})
+            tasks.process_context(command='command1', context='c1')
+            self.assertEqual(self._status(tasks=tasks, task_id='broken'), TaskProcessingStatus.FAILED, mode)
+            self.assertEqual(self._status(tasks=tasks, task_id='dependant1'), TaskProcessingStatus.SKIPPED, mode)
+            self.assertEqual(self._status(tasks=tasks, task_id='dependant2'), TaskProcessingStatus.SKIPPED, mode)
+            self.assertEqual(self._status(tasks=tasks, task_id='independent1'), TaskProcessingStatus.DONE, mode)
+            self.assertEqual(self._status(tasks=tasks, task_id='independent2'), TaskProcessingStatus.DONE, mode)
+            self.assertEqual(list(tasks.failed_task_ids.keys()), ['broken'])
+            self.assertEqual(list(tasks.skipped_task_ids.keys()), ['dependant1', 'dependant2'])
+            self.assertFalse('SleepProcessor:Processed:dependant1' in tasks.key_value_store.store)
+
+    def test_fail_fast_1(self):
+        for mode in ('Serial', 'ThreadPool'):
+            tasks = self._build_tasks(configuration={'Executor': {'Mode': mode, 'MaxWorkers': 1, 'FailFast': True, 'CriticalPathScheduling': False}})
+            with self.assertRaises(Exception):
+                tasks.process_context(command='command1', context='c1')
+            self.assertEqual(self._status(tasks=tasks, task_id='broken'), TaskProcessingStatus.FAILED, mode)
+            for task_id in ('dependant1', 'dependant2', 'independent1', 'independent2'):
+                self.assertEqual(self._status(tasks=tasks, task_id=task_id), TaskProcessingStatus.SKIPPED, mode)
+            self.assertEqual(len(tasks.task_processors_executors['SleepProcessor:v1'].events), 0)
+
+    def test_fail_fast_async_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'FailFast': True}})
+        with self.assertRaises(Exception):
+            asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        self.assertEqual(self._status(tasks=tasks, task_id='broken'), TaskProcessingStatus.FAILED)
+        self.assertEqual(self._status(tasks=tasks, task_id='dependant2'), TaskProcessingStatus.SKIPPED)
+
+    def test_task_timeout_1(self):
+        metadata = build_task_metadata(name='slow')
+        metadata['timeoutSeconds'] = 0.05
+        tasks = build_tasks(
+            processors=[SleepProcessor(),],
+            task_definitions=[
+                ('SleepProcessor', {'sleep': 0.3}, metadata),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='after_slow', name_dependencies=['slow'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='quick')),
+            ],
+            configuration={'Executor': {'Mode': 'ThreadPool', 'TaskTimeoutSeconds': 5}}
+        )
+        self.assertEqual(tasks.get_task_timeout_seconds(task_ids=['slow',]), 0.05)
+        self.assertEqual(tasks.get_task_timeout_seconds(task_ids=['quick',]), 5)
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._status(tasks=tasks, task_id='slow'), TaskProcessingStatus.FAILED)
+        self.assertEqual(self._status(tasks=tasks, task_id='after_slow'), TaskProcessingStatus.SKIPPED)
+        self.assertEqual(self._status(tasks=tasks, task_id='quick'), TaskProcessingStatus.DONE)
+        self.assertFalse('SleepProcessor:Processed:slow' in tasks.key_value_store.store)
+
+    def test_timeout_does_not_wait_for_running_task_1(self):
+        tasks = build_tasks(processors=[BlockingProcessor(),], task_definitions=[('BlockingProcessor', {}, build_task_metadata(name='blocked'))], configuration={'Executor': {'Mode': 'ThreadPool', 'TaskTimeoutSeconds': 0.2}})
+        tasks.process_context(command='command1', context='c1')
+        processor = tasks.task_processors_executors['BlockingProcessor:v1']
+        self.assertEqual(processor.finished_task_ids, list())
+        processor.release.set()
+        self.assertEqual(self._status(tasks=tasks, task_id='blocked'), TaskProcessingStatus.FAILED)
+        self.assertEqual(tasks.run_statistics['AbandonedTasks'], 1)
+
+    def test_fail_fast_does_not_wait_for_running_task_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4, 'FailFast': True}})
+        tasks.register_task_processor(processor=BlockingProcessor())
+        tasks.add_task(task=Task(kind='BlockingProcessor', version='v1', spec={}, metadata=build_task_metadata(name='blocked'), logger=tasks.logger))
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1')
+        processor = tasks.task_processors_executors['BlockingProcessor:v1']
+        self.assertEqual(processor.finished_task_ids, list())
+        processor.release.set()
+        self.assertEqual(self._status(tasks=tasks, task_id='blocked'), TaskProcessingStatus.CANCELLED)
+
+    def test_process_pool_timeout_terminates_worker_1(self):
+        tasks = build_tasks(processors=[SleepProcessor(),], task_definitions=[('SleepProcessor', {'sleep': 60}, build_task_metadata(name='slow'))], configuration={'Executor': {'Mode': 'ProcessPool', 'MaxWorkers': 1, 'TaskTimeoutSeconds': 0.2}})
+        start = time.monotonic()
+        tasks.process_context(command='command1', context='c1')
+        self.assertTrue(time.monotonic() - start < 30)
+        self.assertEqual(self._status(tasks=tasks, task_id='slow'), TaskProcessingStatus.FAILED)
+
+    def test_task_timeout_async_1(self):
+        tasks = build_tasks(processors=[AsyncSleepProcessor(),], task_definitions=[('AsyncSleepProcessor', {'sleep': 60}, build_task_metadata(name='slow'))], configuration={'Executor': {'TaskTimeoutSeconds': 0.05}})
+        start = time.monotonic()
+        asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        self.assertTrue(time.monotonic() - start < 30)
+        self.assertEqual(self._status(tasks=tasks, task_id='slow'), TaskProcessingStatus.FAILED)
+
+
+class FlakyProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='FlakyProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+        self.attempts = dict()
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        if task.task_id not in self.attempts:
+            self.attempts[task.task_id] = list()
+        self.attempts[task.task_id].append(time.monotonic())
+        if len(self.attempts[task.task_id]) <= int(task.spec['failures']):
+            if task.spec['exception'] == 'ConnectionError':
+                raise ConnectionResetError('Connection reset on attempt {}'.format(len(self.attempts[task.task_id])))
+            raise ValueError('Invalid value')
+        key_value_store.save(key='FlakyProcessor:Attempts:{}'.format(task.task_id), value=len(self.attempts[task.task_id]))
+        return key_value_store
+
+
+class TestClassTasksRetryPolicies(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict, exception: str='ConnectionError', retry_policy: dict=None)->Tasks:
+        metadata = build_task_metadata(name='flaky')
+        if retry_policy is not None:
+            metadata['retryPolicy'] = retry_policy
+        return build_tasks(
+            processors=[FlakyProcessor(), SleepProcessor()],
+            task_definitions=[
+                ('FlakyProcessor', {'failures': 2, 'exception': exception}, metadata),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='after_flaky', name_dependencies=['flaky'])),
+                ('SleepProcessor', {'sleep': 0.05}, build_task_metadata(name='other')),
+            ],
+            configuration=configuration
+        )
+
+    def _status(self, tasks: Tasks, task_id: str)->int:
+        return tasks.key_value_store.store.get('PROCESSING_TASK:{}:command1:c1'.format(task_id))
+
+    def test_retry_policy_1(self):
+        retry_policy = build_task_retry_policy(data={'MaxAttempts': 3, 'BackoffSeconds': 1, 'BackoffMultiplier': 2, 'MaxBackoffSeconds': 3, 'Jitter': 0, 'RetryableExceptions': ['ConnectionError',]})
+        connection_error = describe_task_processing_exception(exception=ConnectionResetError('reset'))
+        self.assertTrue(retry_policy.should_retry(attempt=1, error=connection_error))
+        self.assertFalse(retry_policy.should_retry(attempt=3, error=connection_error))
+        self.assertFalse(retry_policy.should_retry(attempt=1, error=describe_task_processing_exception(exception=ValueError('invalid'))))
+        self.assertEqual([retry_policy.calculate_delay(attempt=attempt) for attempt in (1, 2, 3)], [1.0, 2.0, 3.0])
+        self.assertTrue(0.5 <= TaskRetryPolicy(backoff_seconds=1, jitter=0.5).calculate_delay(attempt=1) <= 1.0)
+        self.assertEqual(TaskRetryPolicy().max_attempts, 1)
+
+    def test_retry_does_not_block_other_tasks_1(self):
+        for mode in ('Serial', 'ThreadPool'):
+            tasks = self._build_tasks(configuration={'Executor': {'Mode': mode, 'MaxWorkers': 1}}, retry_policy={'maxAttempts': 3, 'backoffSeconds': 0.1, 'jitter': 0, 'retryableExceptions': ['ConnectionError',]})
+            tasks.process_context(command='command1', context='c1')
+            self.assertEqual(self._status(tasks=tasks, task_id='flaky'), TaskProcessingStatus.DONE, mode)
+            self.assertEqual(self._status(tasks=tasks, task_id='after_flaky'), TaskProcessingStatus.DONE, mode)
+            self.assertEqual(tasks.key_value_store.store['FlakyProcessor:Attempts:flaky'], 3, mode)
+            self.assertFalse('PROCESSING_TASK_ERROR:flaky:command1:c1' in tasks.key_value_store.store, mode)
+            attempt_times = tasks.task_processors_executors['FlakyProcessor:v1'].attempts['flaky']
+            self.assertTrue(attempt_times[1] - attempt_times[0] >= 0.1, mode)
+            self.assertTrue(attempt_times[2] - attempt_times[1] >= 0.2, mode)
+            other_end = [event[2] for event in tasks.task_processors_executors['SleepProcessor:v1'].events if event[0] == 'end' and event[1] == 'other'][0]
+            self.assertTrue(other_end < attempt_times[1], mode)
+
+    def test_retry_policy_per_kind_1(self):
+        for mode in ('Serial', 'ThreadPool'):
+            tasks = self._build_tasks(configuration={'Executor': {'Mode': mode}, 'RetryPolicies': {'FlakyProcessor': {'MaxAttempts': 3, 'BackoffSeconds': 0.01}}})
+            tasks.process_context(command='command1', context='c1')
+            self.assertEqual(self._status(tasks=tasks, task_id='flaky'), TaskProcessingStatus.DONE, mode)
+            self.assertEqual(tasks.key_value_store.store['FlakyProcessor:Attempts:flaky'], 3, mode)
+
+    def test_retry_async_1(self):
+        tasks = self._build_tasks(configuration={'RetryPolicies': {'FlakyProcessor': {'MaxAttempts': 3, 'BackoffSeconds': 0.01}}})
+        asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        self.assertEqual(self._status(tasks=tasks, task_id='flaky'), TaskProcessingStatus.DONE)
+        self.assertEqual(self._status(tasks=tasks, task_id='after_flaky'), TaskProcessingStatus.DONE)
+        history = tasks.state_persistence.get_object_state(object_identifier=tasks.task_run_history._build_object_identifier(task_id='flaky', command='command1', context='c1'))
+        self.assertEqual(len(history['Durations']), 1, 'Only the successful attempt is recorded')
+
+    def test_not_retryable_exception_1(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool'}}, exception='ValueError', retry_policy={'maxAttempts': 3, 'backoffSeconds': 0.01, 'retryableExceptions': ['ConnectionError',]})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._status(tasks=tasks, task_id='flaky'), TaskProcessingStatus.FAILED)
+        self.assertEqual(self._status(tasks=tasks, task_id='after_flaky'), TaskProcessingStatus.SKIPPED)
+        self.assertEqual(len(tasks.task_processors_executors['FlakyProcessor:v1'].attempts['flaky']), 1)
+        self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK_ERROR:flaky:command1:c1']['ExceptionTypes'][0], 'ValueError')
+
+
+class JournalReadingProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='JournalReadingProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    def _read_journal_records(self, directory: str)->list:
+        records = list()
+        for file_name in os.listdir(directory):
+            records += read_task_run_journal(file_path=os.path.join(directory, file_name))[0]
+        return records
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        deadline = time.monotonic() + 10
+        while True:
+            records = self._read_journal_records(directory=task.spec['directory'])
+            record_types = [record['Type'] for record in records]
+            completed_task_ids = list()
+            for record in records:
+                if record['Type'] == 'TasksCompleted':
+                    completed_task_ids += record['TaskIds']
+            if task.spec['wait_for_task_id'] in completed_task_ids or task.spec['wait_for_task_id'] is None or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        key_value_store.save(key='JournalReadingProcessor:RecordTypes:{}'.format(task.task_id), value=record_types)
+        return key_value_store
+
+
+class TestClassTasksRunJournal(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+        self.directory = tempfile.mkdtemp()
+        self.flaky_processor = FlakyProcessor()
+
+    def _build_tasks(self, configuration: dict, first_task_sleep: float=0.0)->Tasks:
+        """
+            The "flaky" task fails the first time it is processed.
+        """
+        configuration['Journal'] = {'Directory': self.directory, 'Fsync': False}
+        return build_tasks(
+            processors=[SleepProcessor(), self.flaky_processor],
+            task_definitions=[
+                ('SleepProcessor', {'sleep': first_task_sleep}, build_task_metadata(name='first')),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='second', name_dependencies=['first'])),
+                ('FlakyProcessor', {'failures': 1, 'exception': 'ValueError'}, build_task_metadata(name='flaky', name_dependencies=['second'])),
+                ('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='last', name_dependencies=['flaky'])),
+            ],
+            configuration=configuration
+        )
+
+    def _processed_task_ids(self, tasks: Tasks)->list:
+        return [task_id for event, task_id, timestamp in tasks.task_processors_executors['SleepProcessor:v1'].events if event == 'start']
+
+    def _interrupted_run(self, configuration: dict)->str:
+        tasks = self._build_tasks(configuration=configuration)
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1')
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['first', 'second'])
+        return tasks.run_id
+
+    def _assert_resumed(self, tasks: Tasks):
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['last'])
+        self.assertEqual(list(tasks.resumed_task_ids.keys()), ['first', 'second'])
+        for task_id in ('first', 'second', 'flaky', 'last'):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:{}:command1:c1'.format(task_id)], TaskProcessingStatus.DONE)
+        self.assertTrue(tasks.key_value_store.store['SleepProcessor:Processed:first'])
+        self.assertTrue(tasks.key_value_store.store['SleepProcessor:Processed:second'])
+        self.assertEqual(tasks.key_value_store.store['FlakyProcessor:Attempts:flaky'], 2)
+
+    def test_resume_serial_run_skips_completed_tasks(self):
+        run_id = self._interrupted_run(configuration={'Executor': {'FailFast': True}})
+        tasks = self._build_tasks(configuration={'Executor': {'FailFast': True}})
+        tasks.process_context(command='command1', context='c1', resume_run_id=run_id)
+        self._assert_resumed(tasks=tasks)
+        records, valid_length = read_task_run_journal(file_path=build_task_run_journal_file_path(directory=self.directory, run_id=run_id))
+        self.assertEqual([record['Type'] for record in records], ['RunStarted', 'TasksCompleted', 'TasksCompleted', 'RunResumed', 'TasksCompleted', 'TasksCompleted'])
+
+    def test_resume_thread_pool_run_skips_completed_tasks(self):
+        configuration = {'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 2, 'FailFast': True}}
+        run_id = self._interrupted_run(configuration=dict(configuration))
+        tasks = self._build_tasks(configuration=dict(configuration))
+        tasks.process_context(command='command1', context='c1', resume_run_id=run_id)
+        self._assert_resumed(tasks=tasks)
+
+    def test_resume_async_run_skips_completed_tasks(self):
+        run_id = self._interrupted_run(configuration={'Executor': {'FailFast': True}})
+        tasks = self._build_tasks(configuration={'Executor': {'FailFast': True}})
+        asyncio.run(tasks.process_context_async(command='command1', context='c1', resume_run_id=run_id))
+        self._assert_resumed(tasks=tasks)
+
+    def test_resume_ignores_torn_journal_tail(self):
+        run_id = self._interrupted_run(configuration={'Executor': {'FailFast': True}})
+        file_path = build_task_run_journal_file_path(directory=self.directory, run_id=run_id)
+        records, valid_length = read_task_run_journal(file_path=file_path)
+        with open(file_path, 'r+b') as f:
+            f.truncate(valid_length - 3)
+        records, valid_length = read_task_run_journal(file_path=file_path)
+        self.assertEqual(len(records), 2)
+        tasks = self._build_tasks(configuration={'Executor': {'FailFast': True}})
+        tasks.process_context(command='command1', context='c1', resume_run_id=run_id)
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['second', 'last'])
+        records, valid_length = read_task_run_journal(file_path=file_path)
+        self.assertEqual(os.path.getsize(file_path), valid_length)
+        self.assertEqual([record['Type'] for record in records], ['RunStarted', 'TasksCompleted', 'RunResumed', 'TasksCompleted', 'TasksCompleted', 'TasksCompleted'])
+
+    def test_resume_processes_changed_tasks_and_their_dependants_again(self):
+        run_id = self._interrupted_run(configuration={'Executor': {'FailFast': True}})
+        tasks = self._build_tasks(configuration={'Executor': {'FailFast': True}}, first_task_sleep=0.01)
+        tasks.process_context(command='command1', context='c1', resume_run_id=run_id)
+        self.assertEqual(self._processed_task_ids(tasks=tasks), ['first', 'second', 'last'])
+        self.assertEqual(len(tasks.resumed_task_ids), 0)
+
+    def test_resume_with_other_command_or_without_journal_raises_exception(self):
+        run_id = self._interrupted_run(configuration={'Executor': {'FailFast': True}})
+        tasks = self._build_tasks(configuration={'Executor': {'FailFast': True}})
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c2', resume_run_id=run_id)
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1', resume_run_id='unknown')
+        tasks.configuration.pop('Journal')
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1', resume_run_id=run_id)
+
+    def test_run_started_is_written_before_the_first_task(self):
+        task_definitions = [('JournalReadingProcessor', {'directory': self.directory, 'wait_for_task_id': None}, build_task_metadata(name='reader'))]
+        tasks = build_tasks(processors=[JournalReadingProcessor(),], task_definitions=task_definitions, configuration={'Journal': {'Directory': self.directory, 'Fsync': False, 'GroupCommitSeconds': 60}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.key_value_store.store['JournalReadingProcessor:RecordTypes:reader'], ['RunStarted'])
+
+    def test_due_records_are_written_while_tasks_are_running(self):
+        task_definitions = [
+            ('JournalReadingProcessor', {'directory': self.directory, 'wait_for_task_id': None}, build_task_metadata(name='quick')),
+            ('JournalReadingProcessor', {'directory': self.directory, 'wait_for_task_id': 'quick'}, build_task_metadata(name='waiting')),
+        ]
+        tasks = build_tasks(processors=[JournalReadingProcessor(),], task_definitions=task_definitions, configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 2}, 'Journal': {'Directory': self.directory, 'Fsync': False, 'GroupCommitSeconds': 0.05}})
+        tasks.process_context(command='command1', context='c1')
+        self.assertEqual(tasks.key_value_store.store['JournalReadingProcessor:RecordTypes:waiting'], ['RunStarted', 'TasksCompleted'])
+
+    def test_journal_group_commit(self):
+        file_path = os.path.join(self.directory, 'group-commit.journal')
+        journal = TaskRunJournal(file_path=file_path, group_commit_records=3, group_commit_seconds=60.0, fsync=True)
+        journal.append(record={'Type': 'RunStarted'})
+        journal.append(record={'Type': 'TasksCompleted'})
+        self.assertEqual(os.path.getsize(file_path), 0)
+        journal.append(record={'Type': 'TasksCompleted'})
+        records, valid_length = read_task_run_journal(file_path=file_path)
+        self.assertEqual(len(records), 3)
+        journal.append(record={'Type': 'TasksCompleted'})
+        journal.close()
+        records, valid_length = read_task_run_journal(file_path=file_path)
+        self.assertEqual(len(records), 4)
+
+
+class TestClassTasksMultipleContexts(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict)->Tasks:
+        task_definitions = [('SleepProcessor', {'sleep': 0.05}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 4)]
+        task_definitions.append(('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='only-c1', name_dependencies=['task-0'], environments=['c1'])))
+        tasks = build_tasks(processors=[SleepProcessor(),], task_definitions=task_definitions, configuration=configuration)
+        tasks.key_value_store.save(key='Initial', value=True)
+        return tasks
+
+    def test_contexts_are_processed_with_isolated_stores(self):
+        tasks = self._build_tasks(configuration={'Executor': {'MaxWorkers': 4}})
+        key_value_stores = tasks.process_contexts(command='command1', contexts=['c1', 'c2'])
+        self.assertEqual(list(key_value_stores.keys()), ['c1', 'c2'])
+        for context in ('c1', 'c2'):
+            store = key_value_stores[context].store
+            self.assertTrue(store['Initial'])
+            for i in range(0, 4):
+                self.assertEqual(store['PROCESSING_TASK:task-{}:command1:{}'.format(i, context)], TaskProcessingStatus.DONE)
+            for other_context in ('c1', 'c2'):
+                if other_context != context:
+                    self.assertFalse('PROCESSING_TASK:task-0:command1:{}'.format(other_context) in store)
+        self.assertEqual(key_value_stores['c1'].store['PROCESSING_TASK:only-c1:command1:c1'], TaskProcessingStatus.DONE)
+        self.assertFalse('SleepProcessor:Processed:only-c1' in key_value_stores['c2'].store)
+        self.assertFalse('PROCESSING_TASK:task-0:command1:c1' in tasks.key_value_store.store)
+
+    def test_contexts_flush_one_shared_state_persistence(self):
+        state_persistence = RecordingStatePersistence()
+        configuration = {'Executor': {'MaxWorkers': 4, 'RecordTaskDurations': False}, 'StatePersistence': {'FlushPolicy': 'Batched', 'FlushEveryTasks': 2, 'FlushIntervalSeconds': 60}}
+        contexts = ['c1', 'c2', 'c3', 'c4']
+        task_definitions = [('StateSavingProcessor', {'objects': 50}, build_task_metadata(name='task-{}'.format(i), environments=contexts)) for i in range(0, 6)]
+        tasks = build_tasks(processors=[StateSavingProcessor(),], task_definitions=task_definitions, configuration=configuration, state_persistence=state_persistence)
+        tasks.process_contexts(command='command1', contexts=contexts)
+        persisted_object_identifiers = set()
+        for batch in state_persistence.persisted_batches:
+            persisted_object_identifiers.update(batch)
+        self.assertEqual(len(state_persistence.dirty_object_identifiers), 0)
+        self.assertEqual(persisted_object_identifiers, set('task-{}:{}'.format(i, j) for i in range(0, 6) for j in range(0, 50)))
+
+    def test_contexts_share_the_concurrency_budget(self):
+        tasks = self._build_tasks(configuration={'Executor': {'MaxWorkers': 3}})
+        tasks.process_contexts(command='command1', contexts=['c1', 'c2'])
+        self.assertEqual(max_overlapping_tasks(events=tasks.task_processors_executors['SleepProcessor:v1'].events), 3)
+
+    def test_timeout_counts_from_task_start(self):
+        contexts = ['c1', 'c2', 'c3', 'c4']
+        tasks = build_tasks(processors=[SleepProcessor(),], task_definitions=[('SleepProcessor', {'sleep': 0.2}, build_task_metadata(name='task-0', environments=contexts))], configuration={'Executor': {'MaxWorkers': 1, 'TaskTimeoutSeconds': 0.5}})
+        key_value_stores = tasks.process_contexts(command='command1', contexts=contexts)
+        for context in contexts:
+            self.assertEqual(key_value_stores[context].store['PROCESSING_TASK:task-0:command1:{}'.format(context)], TaskProcessingStatus.DONE, context)
+        self.assertEqual(max_overlapping_tasks(events=tasks.task_processors_executors['SleepProcessor:v1'].events), 1)
+
+    def test_worker_slots_go_to_the_highest_priority(self):
+        worker_slots = TaskWorkerSlots(max_workers=1)
+        self.assertTrue(worker_slots.acquire(token='run1', priority=1))
+        self.assertFalse(worker_slots.acquire(token='run2', priority=1))
+        self.assertFalse(worker_slots.acquire(token='run3', priority=5))
+        wake_up_future = worker_slots.wake_up_future(token='run2')
+        self.assertFalse(wake_up_future.done())
+        worker_slots.release()
+        self.assertTrue(wake_up_future.done())
+        self.assertFalse(worker_slots.acquire(token='run2', priority=1))
+        self.assertTrue(worker_slots.acquire(token='run3', priority=5))
+        self.assertIsNone(worker_slots.wake_up_future(token='run3'))
+        worker_slots.release()
+        self.assertTrue(worker_slots.acquire(token='run2', priority=1))
+        worker_slots.withdraw(token='run2')
+        self.assertIsNone(worker_slots.wake_up_future(token='run2'))
+
+    def test_failure_in_one_context_does_not_stop_other_contexts(self):
+        tasks = self._build_tasks(configuration={'Executor': {'MaxWorkers': 4, 'FailFast': True}})
+        tasks.register_task_processor(processor=FailingProcessor())
+        tasks.add_task(task=Task(kind='FailingProcessor', version='v1', spec={}, metadata=build_task_metadata(name='broken', environments=['c2']), logger=tasks.logger))
+        with self.assertRaises(Exception) as context_manager:
+            tasks.process_contexts(command='command1', contexts=['c1', 'c2'])
+        self.assertTrue('c2' in str(context_manager.exception))
+        self.assertEqual(tasks.context_key_value_stores['c1'].store['PROCESSING_TASK:only-c1:command1:c1'], TaskProcessingStatus.DONE)
+        self.assertEqual(tasks.context_key_value_stores['c2'].store['PROCESSING_TASK:broken:command1:c2'], TaskProcessingStatus.FAILED)
+        self.assertEqual(list(tasks.failed_task_ids.keys()), ['broken'])
+
+    def test_context_runners_keep_their_own_run_state(self):
+        tasks = self._build_tasks(configuration={'Executor': {'MaxWorkers': 4}})
+        tasks.build_dependency_graph()
+        runners = [tasks._build_context_runner(pool=None, worker_slots=None) for i in range(0, 2)]
+        for field_name in ('run_statistics', 'failed_task_ids', 'skipped_task_ids', 'task_output_deltas', 'unchanged_task_ids', 'task_upstream_digests', 'resumed_task_ids', 'context_key_value_stores'):
+            self.assertFalse(getattr(runners[0], field_name) is getattr(runners[1], field_name), field_name)
+            self.assertFalse(getattr(runners[0], field_name) is getattr(tasks, field_name), field_name)
+        self.assertFalse(runners[0].key_value_store.store is runners[1].key_value_store.store)
+        self.assertTrue(runners[0].tasks is tasks.tasks)
+        tasks.process_contexts(command='command1', contexts=['c1', 'c2'])
+        self.assertEqual(tasks.run_statistics['AbandonedTasks'], 0)
+        self.assertTrue(tasks.run_statistics['BusySeconds'] > 0)
+
+
+class TestClassCopyOnWriteMapping(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def test_dict_like_api(self):
+        mapping = CopyOnWriteMapping(data={'b': 2, 'a': 1})
+        mapping['c'] = 3
+        mapping['b'] = 20
+        self.assertEqual(len(mapping), 3)
+        self.assertEqual(list(mapping.keys()), ['b', 'a', 'c'], 'Keys must be iterated in insertion order')
+        self.assertEqual(mapping, {'a': 1, 'b': 20, 'c': 3})
+        self.assertTrue('a' in mapping)
+        self.assertEqual(mapping.get('x', 'default'), 'default')
+        self.assertEqual(mapping.pop('a'), 1)
+        with self.assertRaises(KeyError):
+            mapping['a']
+        with self.assertRaises(KeyError):
+            del mapping['a']
+        mapping.clear()
+        self.assertEqual(len(mapping), 0)
+        self.assertEqual(list(mapping.items()), [])
+
+    def test_snapshot_is_isolated_and_shares_unchanged_buckets(self):
+        mapping = CopyOnWriteMapping(data=dict([('key-{}'.format(i), i) for i in range(0, 10000)]))
+        snapshot = mapping.snapshot()
+        mapping['key-1'] = 'changed'
+        mapping['new-key'] = True
+        del snapshot['key-2']
+        self.assertEqual(snapshot['key-1'], 1)
+        self.assertFalse('new-key' in snapshot)
+        self.assertEqual(mapping['key-2'], 2)
+        self.assertEqual(len(mapping), 10001)
+        self.assertEqual(len(snapshot), 9999)
+        self.assertEqual(len(mapping.changed_buckets(other=snapshot)), 3)
+        delta = build_key_value_store_delta(before=snapshot, after=mapping)
+        self.assertEqual(delta.set_values, {'key-1': 'changed', 'new-key': True, 'key-2': 2})
+        self.assertEqual(len(delta.deleted_keys), 0)
+
+    def test_pickle_and_key_value_store_snapshot(self):
+        key_value_store = KeyValueStore(copy_on_read=True)
+        key_value_store.store = {'a': [1, 2]}
+        self.assertIsInstance(key_value_store.store, CopyOnWriteMapping)
+        copied_store = key_value_store.snapshot()
+        copied_store.save(key='b', value=True)
+        self.assertFalse('b' in key_value_store.store)
+        copied_store.store['a'].append(3)
+        self.assertEqual(key_value_store.store['a'], [1, 2])
+        restored = pickle.loads(pickle.dumps(copied_store.store))
+        self.assertIsInstance(restored, CopyOnWriteMapping)
+        self.assertTrue(restored.copy_on_read)
+        self.assertEqual(list(restored.items()), [('a', [1, 2, 3]), ('b', True)])
+
+    def test_values_are_shared_without_copy_on_read(self):
+        for mapping in (CopyOnWriteMapping(data={'a': {'items': [1]}}), ShardedMapping(data={'a': {'items': [1]}})):
+            snapshot = mapping.snapshot()
+            self.assertIs(mapping['a'], snapshot['a'])
+            mapping['a'] = {'items': [1, 2]}
+            self.assertEqual(snapshot['a'], {'items': [1]})
+
+    def test_insertion_order_is_kept_across_snapshots(self):
+        mapping = CopyOnWriteMapping(data={'a': 1, 'b': 2, 'c': 3})
+        snapshot = mapping.snapshot()
+        del mapping['a']
+        mapping['d'] = 4
+        mapping['a'] = 5
+        mapping['b'] = 6
+        snapshot['e'] = 7
+        self.assertEqual(list(mapping.keys()), ['b', 'c', 'd', 'a'])
+        self.assertEqual(list(snapshot.keys()), ['a', 'b', 'c', 'e'])
+        for i in range(0, 3):
+            mapping = mapping.snapshot()
+            mapping['snapshot-{}'.format(i)] = i
+        self.assertEqual(list(mapping.keys()), ['b', 'c', 'd', 'a', 'snapshot-0', 'snapshot-1', 'snapshot-2'])
+        self.assertEqual(list(mapping.keys()), ['b', 'c', 'd', 'a', 'snapshot-0', 'snapshot-1', 'snapshot-2'])
+
+    def test_hooks_do_not_copy_the_store(self):
+        seen_values = list()
+
+        def hook_function(hook_name: str, task: object, key_value_store: KeyValueStore, command: str, context: str, task_life_cycle_stage: int, extra_parameters: dict, logger: LoggerWrapper):
+            seen_values.append(key_value_store.store['large'])
+            key_value_store.save(key='{}:{}'.format(hook_name, task_life_cycle_stage), value=True)
+            return key_value_store
+
+        hooks = Hooks()
+        hooks.register_hook(hook=Hook(name='hook1', commands=['command1',], contexts=['c1',], task_life_cycle_stages=TaskLifecycleStages(), function_impl=hook_function, logger=TestLogger()))
+        key_value_store = KeyValueStore()
+        large_value = tuple(range(0, 100000))
+        key_value_store.save(key='large', value=large_value)
+        for stage in (TaskLifecycleStage.TASK_PRE_PROCESSING_START, TaskLifecycleStage.TASK_PROCESSING_POST_DONE):
+            key_value_store = hooks.process_hook(command='command1', context='c1', task_life_cycle_stage=stage, key_value_store=key_value_store, task_id='t1')
+        self.assertEqual(len(seen_values), 2)
+        for value in seen_values:
+            self.assertIs(value, large_value)
+        self.assertTrue(key_value_store.store['hook1:{}'.format(TaskLifecycleStage.TASK_PROCESSING_POST_DONE)])
+
+    def test_nested_values_are_not_shared_with_snapshots(self):
+        for mapping in (CopyOnWriteMapping(data={'a': {'items': [1]}, 'b': 2}, copy_on_read=True), ShardedMapping(data={'a': {'items': [1]}, 'b': 2}, copy_on_read=True)):
+            snapshot = mapping.snapshot()
+            mapping['a']['items'].append(2)
+            self.assertEqual(snapshot['a'], {'items': [1]})
+            self.assertEqual(mapping['a'], {'items': [1, 2]})
+            delta = build_key_value_store_delta(before=snapshot, after=mapping)
+            self.assertEqual(delta.set_values, {'a': {'items': [1, 2]}})
+            self.assertEqual(len(delta.deleted_keys), 0)
+            snapshot['b']
+            self.assertTrue(build_key_value_store_delta(before=mapping, after=mapping.snapshot()).is_empty())
+
+    def test_store_is_a_mutable_mapping(self):
+        for key_value_store in (KeyValueStore(), ShardedKeyValueStore(), SpillingKeyValueStore()):
+            key_value_store.save(key='a', value={'b': [1, 2]})
+            key_value_store.save(key='c', value='text')
+            self.assertIsInstance(key_value_store.store, MutableMapping)
+            self.assertEqual(json.loads(json.dumps(dict(key_value_store.store))), {'a': {'b': [1, 2]}, 'c': 'text'})
+            self.assertEqual({**key_value_store.store}, {'a': {'b': [1, 2]}, 'c': 'text'})
+            self.assertEqual(key_value_store.store, {'a': {'b': [1, 2]}, 'c': 'text'})
+            del key_value_store.store['a']
+            del key_value_store.store['c']
+            self.assertEqual(dict(key_value_store.store), dict())
+            self.assertFalse(key_value_store.store)
+
+
+class DeltaProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='DeltaProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStoreDelta:
+        delta = KeyValueStoreDelta()
+        delta.set(key='DeltaProcessor:Processed:{}'.format(task.task_id), value=True)
+        delta.delete(key='DeltaProcessor:Obsolete:{}'.format(task.task_id))
+        return delta
+
+
+class AsyncDeltaProcessor(AsyncTaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='AsyncDeltaProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    async def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStoreDelta:
+        delta = KeyValueStoreDelta()
+        delta.set(key='AsyncDeltaProcessor:Processed:{}'.format(task.task_id), value=True)
+        return delta
+
+
+def delta_hook_function(hook_name: str, task: object, key_value_store: KeyValueStore, command: str, context: str, task_life_cycle_stage: int, extra_parameters: dict, logger: LoggerWrapper)->KeyValueStoreDelta:
+    delta = KeyValueStoreDelta()
+    delta.set(key='{}:{}:{}'.format(hook_name, task.task_id, task_life_cycle_stage), value=True)
+    return delta
+
+
+class TestClassTasksDeltaResults(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _build_tasks(self, configuration: dict)->Tasks:
+        task_definitions = [('DeltaProcessor', {}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 3)]
+        task_definitions.append(('AsyncDeltaProcessor', {}, build_task_metadata(name='async-task', name_dependencies=['task-0'])))
+        tasks = build_tasks(processors=[DeltaProcessor(), AsyncDeltaProcessor()], task_definitions=task_definitions, configuration=configuration, hooks=build_hooks(function_impl=delta_hook_function))
+        for i in range(0, 3):
+            tasks.key_value_store.save(key='DeltaProcessor:Obsolete:task-{}'.format(i), value=True)
+        return tasks
+
+    def _assert_deltas_merged(self, tasks: Tasks):
+        store = tasks.key_value_store.store
+        for i in range(0, 3):
+            task_id = 'task-{}'.format(i)
+            self.assertEqual(store['PROCESSING_TASK:{}:command1:c1'.format(task_id)], TaskProcessingStatus.DONE)
+            self.assertTrue(store['DeltaProcessor:Processed:{}'.format(task_id)])
+            self.assertFalse('DeltaProcessor:Obsolete:{}'.format(task_id) in store)
+            self.assertTrue(store['hook1:{}:{}'.format(task_id, TaskLifecycleStage.TASK_PROCESSING_POST_DONE)])
+        self.assertTrue(store['AsyncDeltaProcessor:Processed:async-task'])
+        self.assertEqual(store['PROCESSING_TASK:async-task:command1:c1'], TaskProcessingStatus.DONE)
+
+    def test_deltas_merged_in_serial_mode(self):
+        tasks = self._build_tasks(configuration=dict())
+        tasks.process_context(command='command1', context='c1')
+        self._assert_deltas_merged(tasks=tasks)
+
+    def test_deltas_merged_in_thread_pool_mode(self):
+        tasks = self._build_tasks(configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 3}})
+        tasks.process_context(command='command1', context='c1')
+        self._assert_deltas_merged(tasks=tasks)
+
+    def test_deltas_merged_in_async_mode(self):
+        tasks = self._build_tasks(configuration=dict())
+        asyncio.run(tasks.process_context_async(command='command1', context='c1'))
+        self._assert_deltas_merged(tasks=tasks)
+
+    def test_merge_key_value_store_result(self):
+        key_value_store = KeyValueStore()
+        key_value_store.save(key='a', value=1)
+        self.assertIs(merge_key_value_store_result(key_value_store=key_value_store, result=None), key_value_store)
+        replacement = KeyValueStore()
+        replacement.save(key='b', value=2)
+        key_value_store = merge_key_value_store_result(key_value_store=key_value_store, result=replacement)
+        self.assertEqual(key_value_store.store, {'b': 2})
+        replacement.save(key='c', value=3)
+        self.assertFalse('c' in key_value_store.store)
+
+
+class TestClassShardedKeyValueStore(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def test_concurrent_compare_and_set(self):
+        key_value_store = ShardedKeyValueStore(shard_count=8)
+        key_value_store.save(key='counter', value=0)
+
+        def increment(thread_number: int):
+            for i in range(0, 200):
+                while True:
+                    current = key_value_store.store['counter']
+                    if key_value_store.compare_and_set(key='counter', expected=current, value=current + 1) is True:
+                        break
+                key_value_store.save(key='thread-{}:{}'.format(thread_number, i), value=True)
+
+        threads = [threading.Thread(target=increment, args=(thread_number,)) for thread_number in range(0, 16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(key_value_store.store['counter'], 16 * 200)
+        self.assertEqual(len(key_value_store.store), 16 * 200 + 1)
+        self.assertFalse(key_value_store.compare_and_set(key='counter', expected=0, value=1))
+        self.assertFalse(key_value_store.compare_and_set(key='counter', expected=None, value=1, expect_missing=True))
+        self.assertTrue(key_value_store.compare_and_set(key='other', expected=None, value=1, expect_missing=True))
+
+    def test_namespaces(self):
+        for key_value_store in (KeyValueStore(), ShardedKeyValueStore()):
+            task_namespace = key_value_store.namespace(name='task1')
+            task_namespace.save(key='status', value='created')
+            key_value_store.save(key='task2:status', value='pending')
+            self.assertEqual(key_value_store.store['task1:status'], 'created')
+            self.assertEqual(dict(task_namespace), {'status': 'created'})
+            self.assertTrue(task_namespace.compare_and_set(key='status', expected='created', value='ready'))
+            self.assertFalse(task_namespace.compare_and_set(key='status', expected='created', value='ready'))
+            del task_namespace['status']
+            self.assertEqual(len(task_namespace), 0)
+            self.assertEqual(len(key_value_store.store), 1)
+
+    def test_snapshot_and_delta(self):
+        key_value_store = ShardedKeyValueStore()
+        for i in range(0, 1000):
+            key_value_store.save(key='key-{}'.format(i), value=i)
+        snapshot = key_value_store.snapshot()
+        self.assertIsInstance(snapshot, ShardedKeyValueStore)
+        snapshot.save(key='key-1', value='changed')
+        self.assertEqual(key_value_store.store['key-1'], 1)
+        delta = build_key_value_store_delta(before=key_value_store.store, after=snapshot.store)
+        self.assertEqual(delta.set_values, {'key-1': 'changed'})
+        restored = pickle.loads(pickle.dumps(snapshot.store))
+        self.assertIsInstance(restored, ShardedMapping)
+        self.assertEqual(restored['key-1'], 'changed')
+
+    def test_insertion_order_across_shards(self):
+        mapping = ShardedMapping(shard_count=8)
+        keys = ['key-{}'.format(i) for i in range(0, 100)]
+        for key in keys:
+            mapping[key] = True
+        self.assertEqual(list(mapping), keys)
+        snapshot = mapping.snapshot()
+        for key in reversed(keys[:10]):
+            del snapshot[key]
+            snapshot[key] = False
+        self.assertEqual(list(snapshot), keys[10:] + list(reversed(keys[:10])))
+        delta = build_key_value_store_delta(before=mapping, after=snapshot)
+        self.assertEqual(list(delta.set_values.keys()), list(reversed(keys[:10])))
+
+    def test_snapshot_holds_one_shard_lock_at_a_time(self):
+
+        class SignallingLock:
+
+            def __init__(self):
+                self.lock = threading.Lock()
+                self.waiting = threading.Event()
+
+            def acquire(self):
+                self.waiting.set()
+                return self.lock.acquire()
+
+            def release(self):
+                self.lock.release()
+
+            def __enter__(self):
+                self.acquire()
+                return self
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                self.release()
+
+        mapping = ShardedMapping(data={'a': 1}, shard_count=4)
+        last_lock = SignallingLock()
+        mapping.locks[3] = last_lock
+        last_lock.lock.acquire()
+        snapshot_thread = threading.Thread(target=mapping.snapshot)
+        snapshot_thread.start()
+        last_lock.waiting.wait(timeout=5)
+        key = [key for key in ('key-{}'.format(i) for i in range(0, 100)) if mapping._shard_index(key) == 0][0]
+        writer_thread = threading.Thread(target=mapping.__setitem__, args=(key, True))
+        writer_thread.start()
+        writer_thread.join(timeout=5)
+        writer_blocked = writer_thread.is_alive()
+        last_lock.lock.release()
+        snapshot_thread.join()
+        writer_thread.join()
+        self.assertFalse(writer_blocked)
+        self.assertTrue(mapping[key])
+
+    def test_tasks_with_sharded_key_value_store(self):
+        task_definitions = [('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 8)]
+        tasks = build_tasks(processors=[SleepProcessor(),], task_definitions=task_definitions, configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4}}, key_value_store=ShardedKeyValueStore())
+        tasks.process_context(command='command1', context='c1')
+        self.assertIsInstance(tasks.key_value_store, ShardedKeyValueStore)
+        self.assertIsInstance(tasks.key_value_store.store, ShardedMapping)
+        for i in range(0, 8):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:task-{}:command1:c1'.format(i)], TaskProcessingStatus.DONE)
+
+
+class BlobProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='BlobProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        key_value_store.save(key='BlobProcessor:Manifest:{}'.format(task.task_id), value='{}\n'.format(task.task_id) * int(task.spec['lines']))
+        return key_value_store
+
+
+class TestClassSpillingKeyValueStore(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+        self.directory = tempfile.mkdtemp()
+
+    def test_blob_files_removed_once_unreferenced(self):
+        mapping = SpillingMapping(data={'large': b'x' * 1000}, blob_file=SpilledBlobFile(directory=self.directory), spill_threshold_bytes=100)
+        snapshot = mapping.snapshot()
+        restored = pickle.loads(pickle.dumps(snapshot))
+        key_value_store = SpillingKeyValueStore(spill_threshold_bytes=100, directory=self.directory)
+        key_value_store.save(key='large', value=b'y' * 1000)
+        key_value_store = key_value_store.snapshot()
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        del mapping, snapshot, key_value_store
+        gc.collect()
+        self.assertEqual(os.listdir(self.directory), list())
+        self.assertEqual(restored['large'], b'x' * 1000)
+
+    def test_large_values_spill_to_disk(self):
+        key_value_store = SpillingKeyValueStore(spill_threshold_bytes=100, directory=self.directory)
+        key_value_store.save(key='small', value=b'small')
+        key_value_store.save(key='large-bytes', value=b'x' * 1000)
+        key_value_store.save(key='large-text', value='y' * 1000)
+        key_value_store.save(key='object', value={'large': 'z' * 1000})
+        self.assertEqual(key_value_store.store['small'], b'small')
+        large_bytes = key_value_store.store['large-bytes']
+        self.assertIsInstance(large_bytes, memoryview)
+        self.assertTrue(large_bytes.readonly)
+        self.assertEqual(large_bytes, b'x' * 1000)
+        self.assertEqual(key_value_store.store['large-text'], 'y' * 1000)
+        self.assertEqual(bytes(key_value_store.store.view('large-text')), b'y' * 1000)
+        self.assertEqual(key_value_store.store['object'], {'large': 'z' * 1000})
+        self.assertEqual(key_value_store.store.memory_bytes, 5)
+        self.assertEqual(key_value_store.blob_file.size, 2000)
+        key_value_store.close()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_memory_cap(self):
+        key_value_store = SpillingKeyValueStore(spill_threshold_bytes=100, max_memory_bytes=250, directory=self.directory)
+        for i in range(0, 5):
+            key_value_store.save(key='value-{}'.format(i), value=bytes([i]) * 100)
+        self.assertEqual(key_value_store.store.memory_bytes, 200)
+        self.assertEqual(key_value_store.blob_file.size, 300)
+        del key_value_store.store['value-0']
+        key_value_store.save(key='value-5', value=b'5' * 100)
+        self.assertEqual(key_value_store.store.memory_bytes, 200)
+        for i in range(1, 5):
+            self.assertEqual(key_value_store.store['value-{}'.format(i)], bytes([i]) * 100)
+        key_value_store.close()
+
+    def test_memory_cap_is_in_bytes_and_shared_by_snapshots(self):
+        key_value_store = SpillingKeyValueStore(spill_threshold_bytes=100, max_memory_bytes=250, directory=self.directory)
+        key_value_store.save(key='text', value='\u00e9' * 50)
+        self.assertEqual(key_value_store.store.memory_bytes, 100)
+        snapshot = key_value_store.snapshot()
+        snapshot.save(key='value-1', value=b'1' * 100)
+        key_value_store.save(key='value-2', value=b'2' * 100)
+        self.assertEqual(key_value_store.store.memory_bytes, 200)
+        self.assertEqual(key_value_store.blob_file.size, 100)
+        self.assertEqual(key_value_store.store['value-2'], b'2' * 100)
+        del snapshot.store['text']
+        self.assertEqual(key_value_store.store.memory_bytes, 200)
+        snapshot = None
+        self.assertEqual(key_value_store.store.memory_bytes, 100)
+        self.assertEqual(key_value_store.store['text'], '\u00e9' * 50)
+        key_value_store.close()
+
+    def test_snapshots_and_pickle(self):
+        key_value_store = SpillingKeyValueStore(spill_threshold_bytes=10, directory=self.directory)
+        key_value_store.save(key='blob', value=b'b' * 100)
+        snapshot = key_value_store.snapshot()
+        snapshot.save(key='blob', value=b'c' * 100)
+        self.assertEqual(key_value_store.store['blob'], b'b' * 100)
+        self.assertEqual(snapshot.store['blob'], b'c' * 100)
+        delta = build_key_value_store_delta(before=key_value_store.store, after=snapshot.store)
+        self.assertEqual(list(delta.set_values.keys()), ['blob'])
+        restored = pickle.loads(pickle.dumps(snapshot.store))
+        self.assertEqual(restored['blob'], b'c' * 100)
+        self.assertIsInstance(restored['blob'], bytes)
+        restored_delta = pickle.loads(pickle.dumps(delta))
+        self.assertEqual(restored_delta.set_values['blob'], b'c' * 100)
+        key_value_store.close()
+
+    def test_tasks_with_spilling_key_value_store(self):
+        key_value_store = SpillingKeyValueStore(spill_threshold_bytes=1000, directory=self.directory)
+        task_definitions = [('BlobProcessor', {'lines': 1000}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 4)]
+        tasks = build_tasks(processors=[BlobProcessor(),], task_definitions=task_definitions, configuration={'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 4}}, key_value_store=key_value_store)
+        tasks.process_context(command='command1', context='c1')
+        self.assertIsInstance(tasks.key_value_store.store, SpillingMapping)
+        for i in range(0, 4):
+            self.assertEqual(tasks.key_value_store.store['BlobProcessor:Manifest:task-{}'.format(i)], 'task-{}\n'.format(i) * 1000)
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:task-{}:command1:c1'.format(i)], TaskProcessingStatus.DONE)
+        self.assertTrue(key_value_store.blob_file.size >= 4 * 7000)
+        self.assertTrue(tasks.key_value_store.store.memory_bytes < 1000)
+        key_value_store.close()
+
+
+def failing_after_change_hook_function(hook_name: str, task: object, key_value_store: KeyValueStore, command: str, context: str, task_life_cycle_stage: int, extra_parameters: dict, logger: LoggerWrapper):
+    key_value_store.save(key='{}:Partial:{}'.format(hook_name, task.task_id), value=True)
+    if task.task_id == 'task-2':
+        raise Exception('Hook failure')
+    return key_value_store
+
+
+def failing_after_nested_change_hook_function(hook_name: str, task: object, key_value_store: KeyValueStore, command: str, context: str, task_life_cycle_stage: int, extra_parameters: dict, logger: LoggerWrapper):
+    key_value_store.store['existing']['items'].append(task.task_id)
+    raise Exception('Hook failure')
+
+
+class TestClassKeyValueStoreVersions(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def test_create_version_diff_and_rollback(self):
+        for key_value_store in (KeyValueStore(), ShardedKeyValueStore(shard_count=4)):
+            key_value_store.save(key='a', value=1)
+            version_1 = key_value_store.create_version()
+            key_value_store.save(key='a', value=2)
+            key_value_store.save(key='b', value=True)
+            version_2 = key_value_store.create_version()
+            del key_value_store.store['a']
+            self.assertEqual(key_value_store.diff(from_version=version_1, to_version=version_2).set_values, {'a': 2, 'b': True})
+            delta = key_value_store.diff(from_version=version_2)
+            self.assertEqual(list(delta.deleted_keys.keys()), ['a'])
+            key_value_store.rollback(version=version_1)
+            self.assertEqual(dict(key_value_store.store), {'a': 1})
+            key_value_store.save(key='c', value=3)
+            key_value_store.rollback(version=version_1)
+            self.assertEqual(dict(key_value_store.store), {'a': 1})
+            key_value_store.rollback(version=version_2)
+            self.assertEqual(dict(key_value_store.store), {'a': 2, 'b': True})
+            key_value_store.release_version(version=version_1)
+            key_value_store.release_version(version=version_2)
+            self.assertEqual(len(key_value_store.versions), 0)
+
+    def test_rollback_undoes_nested_changes(self):
+        for key_value_store in (KeyValueStore(copy_on_read=True), ShardedKeyValueStore(shard_count=4, copy_on_read=True), SpillingKeyValueStore(copy_on_read=True)):
+            key_value_store.save(key='a', value={'items': [1]})
+            key_value_store.save(key='b', value=bytearray(b'ab'))
+            held_value = key_value_store.store['a']
+            version = key_value_store.create_version()
+            key_value_store.store['a']['items'].append(2)
+            key_value_store.store['b'].extend(b'cd')
+            self.assertEqual(key_value_store.diff(from_version=version).set_values, {'a': {'items': [1, 2]}, 'b': bytearray(b'abcd')})
+            key_value_store.rollback(version=version)
+            self.assertEqual(dict(key_value_store.store), {'a': {'items': [1]}, 'b': bytearray(b'ab')})
+            held_value['items'].append(3)
+            key_value_store.rollback(version=version)
+            self.assertEqual(key_value_store.store['a'], {'items': [1]})
+            key_value_store.release_version(version=version)
+
+    def test_failed_hook_leaves_store_unchanged(self):
+        hook = Hook(name='hook1', commands=['command1',], contexts=['c1',], task_life_cycle_stages=TaskLifecycleStages(), function_impl=failing_after_change_hook_function, logger=TestLogger())
+        key_value_store = KeyValueStore()
+        key_value_store.save(key='existing', value=True)
+        task = Task(kind='SleepProcessor', version='v1', spec={}, metadata=build_task_metadata(name='task-2'), logger=TestLogger())
+        with self.assertRaises(Exception):
+            hook.process_hook(command='command1', context='c1', task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START, key_value_store=key_value_store, task=task, task_id=task.task_id)
+        self.assertEqual(dict(key_value_store.store), {'existing': True})
+
+    def test_failed_hook_leaves_nested_values_unchanged(self):
+        hook = Hook(name='hook1', commands=['command1',], contexts=['c1',], task_life_cycle_stages=TaskLifecycleStages(), function_impl=failing_after_nested_change_hook_function, logger=TestLogger())
+        key_value_store = KeyValueStore(copy_on_read=True)
+        key_value_store.save(key='existing', value={'items': [1]})
+        task = Task(kind='SleepProcessor', version='v1', spec={}, metadata=build_task_metadata(name='task-2'), logger=TestLogger())
+        with self.assertRaises(Exception):
+            hook.process_hook(command='command1', context='c1', task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START, key_value_store=key_value_store, task=task, task_id=task.task_id)
+        self.assertEqual(dict(key_value_store.store), {'existing': {'items': [1]}})
+
+    def test_failed_hook_undoes_its_stage_from_one_snapshot(self):
+        snapshot_count = [0,]
+
+        class CountingMapping(CopyOnWriteMapping):
+
+            def snapshot(self)->object:
+                snapshot_count[0] += 1
+                return super().snapshot()
+
+        hooks = Hooks()
+        for hook_name in ('hook1', 'hook2'):
+            hooks.register_hook(hook=Hook(name=hook_name, commands=['command1',], contexts=['c1',], task_life_cycle_stages=TaskLifecycleStages(), function_impl=failing_after_change_hook_function, logger=TestLogger()))
+        for task_name, expected_store in (('task-1', {'existing': True, 'hook1:Partial:task-1': True, 'hook2:Partial:task-1': True}), ('task-2', {'existing': True})):
+            snapshot_count[0] = 0
+            key_value_store = KeyValueStore()
+            key_value_store.store = CountingMapping(data={'existing': True})
+            task = Task(kind='SleepProcessor', version='v1', spec={}, metadata=build_task_metadata(name=task_name), logger=TestLogger())
+            try:
+                hooks.process_hook(command='command1', context='c1', task_life_cycle_stage=TaskLifecycleStage.TASK_PRE_PROCESSING_START, key_value_store=key_value_store, task=task, task_id=task.task_id)
+            except Exception:
+                self.assertEqual(task_name, 'task-2')
+            self.assertEqual(dict(key_value_store.store), expected_store)
+            self.assertEqual(snapshot_count[0], 1)
+
+    def test_store_rolled_back_to_before_the_failed_task(self):
+        task_definitions = [('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='task-{}'.format(i), name_dependencies=['task-{}'.format(i - 1)] if i > 0 else list())) for i in range(0, 4)]
+        tasks = build_tasks(processors=[SleepProcessor(),], task_definitions=task_definitions, hooks=build_hooks(function_impl=failing_after_change_hook_function))
+        with self.assertRaises(Exception):
+            tasks.process_context(command='command1', context='c1')
+        store = tasks.key_value_store.store
+        for task_id in ('task-0', 'task-1'):
+            self.assertEqual(store['PROCESSING_TASK:{}:command1:c1'.format(task_id)], TaskProcessingStatus.DONE)
+        for task_id in ('task-2', 'task-3'):
+            self.assertFalse('PROCESSING_TASK:{}:command1:c1'.format(task_id) in store)
+            self.assertFalse('hook1:Partial:{}'.format(task_id) in store)
+        self.assertEqual(len(tasks.key_value_store.versions), 0)
+
+
+class TestClassSqliteStatePersistence(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+        self.database_path = os.path.join(tempfile.mkdtemp(), 'state.db')
+
+    def test_objects_persisted_and_read_lazily(self):
+        state_persistence = SqliteStatePersistence(database_path=self.database_path, logger=TestLogger())
+        self.assertEqual(state_persistence.connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        data = {'ResourcesCreated': True, 'Items': [1, 2]}
+        state_persistence.save_object_state(object_identifier='task1', data=data)
+        data['Items'].append(3)
+        self.assertEqual(state_persistence.get_object_state(object_identifier='task1'), {'ResourcesCreated': True, 'Items': [1, 2]})
+        state_persistence.get_object_state(object_identifier='task1')['Items'].append(4)
+        self.assertEqual(state_persistence.get_object_state(object_identifier='task1')['Items'], [1, 2])
+        state_persistence.persist_all_state()
+        state_persistence.close()
+        state_persistence = SqliteStatePersistence(database_path=self.database_path, logger=TestLogger())
+        self.assertEqual(len(state_persistence.state_cache), 0)
+        self.assertEqual(state_persistence.get_object_state(object_identifier='task1'), {'ResourcesCreated': True, 'Items': [1, 2]})
+        self.assertEqual(state_persistence.get_object_state(object_identifier='unknown'), dict())
+        self.assertEqual(list(state_persistence.state_cache.keys()), ['task1'])
+        state_persistence.close()
+
+    def test_batched_writes(self):
+        state_persistence = SqliteStatePersistence(database_path=self.database_path, logger=TestLogger(), batch_size=10)
+        for i in range(0, 25):
+            state_persistence.save_object_state(object_identifier='object-{}'.format(i), data={'i': i})
+        self.assertEqual(len(state_persistence.dirty_object_identifiers), 5)
+        reader = sqlite3.connect(self.database_path)
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM object_states').fetchone()[0], 20)
+        state_persistence.close()
+        self.assertEqual(reader.execute('SELECT COUNT(*) FROM object_states').fetchone()[0], 25)
+        reader.close()
+
+    def test_incremental_run_with_sqlite_state_persistence(self):
+        for run in range(0, 2):
+            state_persistence = SqliteStatePersistence(database_path=self.database_path, logger=TestLogger())
+            task_definitions = [('SleepProcessor', {'sleep': 0.0}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 3)]
+            tasks = build_tasks(processors=[SleepProcessor(),], task_definitions=task_definitions, configuration={'Executor': {'Incremental': True}}, state_persistence=state_persistence)
+            tasks.process_context(command='command1', context='c1')
+            state_persistence.close()
+            if run == 0:
+                self.assertEqual(len(tasks.unchanged_task_ids), 0)
+            else:
+                self.assertEqual(list(tasks.unchanged_task_ids.keys()), ['task-0', 'task-1', 'task-2'])
+
+
+class RecordingStatePersistence(StatePersistence):
+
+    def __init__(self):
+        self.persisted_batches = list()
+        super().__init__(logger=TestLogger())
+
+    def retrieve_all_state_from_persistence(self)->dict:
+        return dict()
+
+    def persist_object_states(self, object_states: dict):
+        self.persisted_batches.append(sorted(object_states.keys()))
+
+
+class BlockingRecordingStatePersistence(StatePersistence):
+
+    def __init__(self):
+        self.persisted_object_states = list()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        super().__init__(logger=TestLogger())
+
+    def retrieve_all_state_from_persistence(self)->dict:
+        return dict()
+
+    def persist_object_states(self, object_states: dict):
+        if self.entered.is_set() is False:
+            self.entered.set()
+            self.release.wait(timeout=10)
+        self.persisted_object_states.append(object_states)
+
+
+class StateSavingProcessor(TaskProcessor):
+
+    def __init__(self):
+        super().__init__(kind='StateSavingProcessor', kind_versions=['v1'], supported_commands=['command1',], logger=TestLogger())
+
+    def process_task(self, task: Task, command: str, context: str='default', key_value_store: KeyValueStore=KeyValueStore(), state_persistence: StatePersistence=StatePersistence())->KeyValueStore:
+        for i in range(0, int(task.spec['objects'])):
+            state_persistence.save_object_state(object_identifier='{}:{}'.format(task.task_id, i), data={'Index': i})
+        return key_value_store
+
+
+class TestClassStatePersistenceFlushPolicies(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def _run(self, state_persistence_configuration: dict, mode: str='Serial')->RecordingStatePersistence:
+        state_persistence = RecordingStatePersistence()
+        configuration = {'Executor': {'Mode': mode, 'RecordTaskDurations': False}, 'StatePersistence': state_persistence_configuration}
+        task_definitions = [('CountingProcessor', {}, build_task_metadata(name='task-{}'.format(i), name_dependencies=['task-{}'.format(i - 1)] if i > 0 else list())) for i in range(0, 10)]
+        tasks = build_tasks(processors=[CountingProcessor(),], task_definitions=task_definitions, configuration=configuration, state_persistence=state_persistence)
+        tasks.process_context(command='command1', context='c1')
+        return state_persistence
+
+    def test_dirty_tracking(self):
+        state_persistence = RecordingStatePersistence()
+        state_persistence.save_object_state(object_identifier='a', data={'v': 1})
+        state_persistence.save_object_state(object_identifier='b', data={'v': 1})
+        state_persistence.save_object_state(object_identifier='a', data={'v': 2})
+        state_persistence.persist_all_state()
+        state_persistence.persist_all_state()
+        state_persistence.save_object_state(object_identifier='b', data={'v': 2})
+        state_persistence.persist_all_state()
+        self.assertEqual(state_persistence.persisted_batches, [['a', 'b'], ['b']])
+
+    def test_every_task_policy(self):
+        state_persistence = self._run(state_persistence_configuration=dict())
+        self.assertEqual(state_persistence.persisted_batches, [['task-{}'.format(i)] for i in range(0, 10)])
+
+    def test_batched_policy(self):
+        state_persistence = self._run(state_persistence_configuration={'FlushPolicy': 'Batched', 'FlushEveryTasks': 4, 'FlushIntervalSeconds': 60})
+        self.assertEqual([len(batch) for batch in state_persistence.persisted_batches], [4, 4, 2])
+
+    def test_concurrent_flushes_write_objects_in_order(self):
+        state_persistence = BlockingRecordingStatePersistence()
+        state_persistence.save_object_state(object_identifier='a', data={'v': 1})
+        first_flush = threading.Thread(target=state_persistence.persist_all_state)
+        first_flush.start()
+        self.assertTrue(state_persistence.entered.wait(timeout=10))
+        state_persistence.save_object_state(object_identifier='a', data={'v': 2})
+        second_flush = threading.Thread(target=state_persistence.persist_all_state)
+        second_flush.start()
+        second_flush.join(timeout=0.2)
+        state_persistence.release.set()
+        first_flush.join()
+        second_flush.join()
+        self.assertEqual(state_persistence.persisted_object_states, [{'a': {'v': 1}}, {'a': {'v': 2}}])
+
+    def test_every_task_policy_with_concurrent_saves(self):
+        state_persistence = RecordingStatePersistence()
+        configuration = {'Executor': {'Mode': 'ThreadPool', 'MaxWorkers': 8, 'RecordTaskDurations': False}, 'StatePersistence': {'FlushPolicy': 'EveryTask'}}
+        task_definitions = [('StateSavingProcessor', {'objects': 200}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 16)]
+        tasks = build_tasks(processors=[StateSavingProcessor(),], task_definitions=task_definitions, configuration=configuration, state_persistence=state_persistence)
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(0.000001)
+        try:
+            tasks.process_context(command='command1', context='c1')
+        finally:
+            sys.setswitchinterval(switch_interval)
+        persisted_object_identifiers = list()
+        for batch in state_persistence.persisted_batches:
+            persisted_object_identifiers += batch
+        self.assertEqual(len(state_persistence.dirty_object_identifiers), 0)
+        self.assertEqual(sorted(set(persisted_object_identifiers)), sorted('task-{}:{}'.format(i, j) for i in range(0, 16) for j in range(0, 200)))
+        for i in range(0, 16):
+            self.assertEqual(tasks.key_value_store.store['PROCESSING_TASK:task-{}:command1:c1'.format(i)], TaskProcessingStatus.DONE)
+
+    def test_end_of_run_policy(self):
+        for mode in ('Serial', 'ThreadPool'):
+            state_persistence = self._run(state_persistence_configuration={'FlushPolicy': 'EndOfRun'}, mode=mode)
+            self.assertEqual(len(state_persistence.persisted_batches), 1)
+            self.assertEqual(len(state_persistence.persisted_batches[0]), 10)
+
+
+class SlowRecordingStatePersistence(RecordingStatePersistence):
+
+    def __init__(self, delay: float=0.01, fail_commits: int=0):
+        self.delay = delay
+        self.fail_commits = fail_commits
+        self.durable_object_states = dict()
+        super().__init__()
+
+    def persist_object_states(self, object_states: dict):
+        time.sleep(self.delay)
+        if self.fail_commits > 0:
+            self.fail_commits -= 1
+            raise Exception('Commit failed')
+        super().persist_object_states(object_states=object_states)
+        self.durable_object_states.update(copy.deepcopy(object_states))
+
+
+class TestClassBackgroundStatePersistence(unittest.TestCase):    # pragma: no cover
+
+    def setUp(self):
+        print()
+        print('-'*80)
+
+    def test_saves_are_coalesced_and_durable_after_barrier(self):
+        backend = SlowRecordingStatePersistence()
+        state_persistence = BackgroundStatePersistence(state_persistence=backend, group_commit_seconds=0.01, logger=TestLogger())
+        for i in range(0, 100):
+            state_persistence.save_object_state(object_identifier='counter', data={'value': i})
+            self.assertEqual(state_persistence.get_object_state(object_identifier='counter'), {'value': i})
+        state_persistence.wait_until_durable()
+        self.assertEqual(backend.durable_object_states['counter'], {'value': 99})
+        self.assertLess(len(backend.persisted_batches), 100)
+        self.assertEqual(state_persistence.get_object_state(object_identifier='counter'), {'value': 99})
+        state_persistence.close()
+
+    def test_saved_data_is_copied(self):
+        backend = SlowRecordingStatePersistence()
+        state_persistence = BackgroundStatePersistence(state_persistence=backend, logger=TestLogger())
+        data = {'value': 1}
+        state_persistence.save_object_state(object_identifier='a', data=data)
+        data['value'] = 2
+        state_persistence.close()
+        self.assertEqual(backend.durable_object_states['a'], {'value': 1})
+        with self.assertRaises(Exception):
+            state_persistence.save_object_state(object_identifier='a', data=data)
+
+    def test_failed_commit_raises_at_barrier_and_is_retried(self):
+        backend = SlowRecordingStatePersistence(fail_commits=1)
+        state_persistence = BackgroundStatePersistence(state_persistence=backend, group_commit_seconds=0.01, logger=TestLogger())
+        state_persistence.save_object_state(object_identifier='a', data={'value': 1})
+        with self.assertRaises(Exception):
+            state_persistence.wait_until_durable()
+        state_persistence.wait_until_durable()
+        self.assertEqual(backend.durable_object_states['a'], {'value': 1})
+        state_persistence.close()
+
+    def test_run_completion_waits_for_durability(self):
+        for mode in ('Serial', 'ThreadPool'):
+            for durability_barrier in ('EndOfRun', 'Flush'):
+                backend = SlowRecordingStatePersistence(delay=0.02)
+                state_persistence = BackgroundStatePersistence(state_persistence=backend, group_commit_seconds=1.0, logger=TestLogger())
+                configuration = {'Executor': {'Mode': mode, 'RecordTaskDurations': False}, 'StatePersistence': {'DurabilityBarrier': durability_barrier}}
+                task_definitions = [('CountingProcessor', {}, build_task_metadata(name='task-{}'.format(i))) for i in range(0, 10)]
+                tasks = build_tasks(processors=[CountingProcessor(),], task_definitions=task_definitions, configuration=configuration, state_persistence=state_persistence)
+                tasks.process_context(command='command1', context='c1')
+                self.assertEqual(sorted(backend.durable_object_states.keys()), sorted(tasks.tasks.keys()))
+                if durability_barrier == 'Flush' and mode == 'Serial':
+                    self.assertEqual(len(backend.persisted_batches), 10)
+                state_persistence.close()
+
+
 if __name__ == '__main__':
     unittest.main()
 